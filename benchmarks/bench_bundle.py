@@ -0,0 +1,91 @@
+"""
+Benchmark of the bundle loader, against the content and metadata folders written by `ContentMetadataLoader`.
+
+Writes a synthetic corpus of Markdown exercise sheets as folders and as bundles of each format, then measures
+the size of each, the latency of reading single documents from the bundles, and the size of a delta bundle
+after a few documents changed.
+
+Usage:
+    python benchmarks/bench_bundle.py [--n 5000] [--changed 50] [--reads 500]
+"""
+
+import os
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+from pathlib import Path
+
+from rag_etl.config import CONFIG
+from rag_etl.loaders import BundleLoader, ContentMetadataLoader
+from rag_etl.utils.bundles import BUNDLE_FORMATS, BundleReader
+
+from bench_sqlite_index import write_corpus, timed
+
+
+def folder_size(path):
+    return sum(os.path.getsize(os.path.join(folder, name)) for folder, _, names in os.walk(path) for name in names)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n', type=int, default=5000, help="Number of documents")
+    parser.add_argument('--changed', type=int, default=50, help="Number of documents changed before the delta bundle")
+    parser.add_argument('--reads', type=int, default=500, help="Number of single document reads")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    course_info = {'course_id': 'BENCH-101'}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # The loaders hash files with the cache utilities, which require a cache folder
+        CONFIG['CACHE_DIR'] = str(Path(tmp) / 'cache')
+        Path(CONFIG['CACHE_DIR']).mkdir()
+
+        # Content files are mirrored relative to the output folder, as for a course dump inside it
+        output_path = Path(tmp) / 'output'
+        corpus_path = output_path / 'moodle'
+        corpus_path.mkdir(parents=True)
+        resources = write_corpus(corpus_path, args.n, rng)
+
+        bundles_path = Path(tmp) / 'bundles'
+        print(f"Documents: {args.n}")
+
+        for fmt in BUNDLE_FORMATS:
+            bundle_path = bundles_path / f"corpus.{fmt}"
+            write = timed(lambda: BundleLoader(str(output_path), course_info, str(bundle_path)).load(resources))
+
+            reader = BundleReader(bundle_path)
+            names = [name for name in reader.names() if name.startswith('content/')]
+            latencies = []
+            for name in rng.sample(names, args.reads):
+                start = time.perf_counter()
+                reader.read(name)
+                latencies.append((time.perf_counter() - start) * 1000)
+            latencies.sort()
+
+            print(
+                f"{fmt:8s} write {write:.2f}s, {bundle_path.stat().st_size / 1e6:.1f}MB, "
+                f"read p50 {statistics.median(latencies):.3f}ms, p95 {latencies[int(len(latencies) * 0.95)]:.3f}ms"
+            )
+
+        for resource in rng.sample(resources, args.changed):
+            with open(resource.path, 'a', encoding='utf-8') as f:
+                f.write("\n## Appendix\n\nOne more remark.\n")
+
+        delta_path = bundles_path / 'delta.tar.zst'
+        write = timed(lambda: BundleLoader(str(output_path), course_info, str(delta_path), delta_from=str(bundles_path / 'corpus.tar.zst')).load(resources))
+        print(f"Delta bundle ({args.changed} changed): write {write:.2f}s, {delta_path.stat().st_size / 1e3:.0f}kB")
+
+        # Written last, since the loader rewrites the resource paths
+        folders = timed(lambda: ContentMetadataLoader(str(output_path), course_info).load(resources))
+        files = sum(len(names) for _, _, names in os.walk(output_path / 'content')) + sum(len(names) for _, _, names in os.walk(output_path / 'metadata'))
+        size = folder_size(output_path / 'content') + folder_size(output_path / 'metadata')
+        print(f"Folders  write {folders:.2f}s, {size / 1e6:.1f}MB in {files} files")
+
+
+if __name__ == '__main__':
+    main()
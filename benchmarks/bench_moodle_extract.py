@@ -0,0 +1,59 @@
+"""
+Benchmark of `MoodleExtractor` over a synthetic Moodle dump, for every parser backend and pool configuration.
+
+Usage:
+    python benchmarks/bench_moodle_extract.py [--sections 100] [--resources-per-section 30] [--workers 8]
+"""
+
+import time
+import argparse
+import tempfile
+
+from pathlib import Path
+
+from rag_etl.config import CONFIG
+
+from synthetic_moodle import generate_moodle_dump
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sections', type=int, default=100)
+    parser.add_argument('--resources-per-section', type=int, default=30)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--parsers', nargs='+', default=['html.parser', 'lxml', 'selectolax'])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # The extraction index imports the cache utilities, which require a cache folder
+        CONFIG['CACHE_DIR'] = str(Path(tmp) / 'cache')
+        Path(CONFIG['CACHE_DIR']).mkdir()
+
+        # Imported here, once the configuration points to the temporary cache folder
+        from rag_etl.extractors import MoodleExtractor
+
+        dump_path = generate_moodle_dump(tmp, args.sections, args.resources_per_section)
+
+        configurations = [('sequential', None, False), ('threads', args.workers, False), ('processes', args.workers, True)]
+
+        print(f"{args.sections * args.resources_per_section} resources")
+        print(f"{'parser':<14}{'pool':<12}{'seconds':>10}")
+
+        reference = None
+        for parser_name in args.parsers:
+            for pool_name, max_workers, use_processes in configurations:
+                extractor = MoodleExtractor(dump_path, parser=parser_name, max_workers=max_workers, use_processes=use_processes, incremental=False)
+
+                start = time.perf_counter()
+                resources = extractor.extract()
+                elapsed = time.perf_counter() - start
+
+                # All configurations must extract the same resources
+                reference = reference or resources
+                assert resources == reference, f"{parser_name}/{pool_name} extracted different resources"
+
+                print(f"{parser_name:<14}{pool_name:<12}{elapsed:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark of corpus analytics over the Parquet dataset written by `ParquetLoader`, against the metadata JSON
+files written by `ContentMetadataLoader` plus the Markdown content files.
+
+The analysis counts resources by type, subtype and week, with their mean length in characters.
+
+Usage:
+    python benchmarks/bench_parquet.py [--n 20000]
+"""
+
+import json
+import random
+import argparse
+import tempfile
+
+from collections import defaultdict
+from pathlib import Path
+
+from rag_etl.config import CONFIG
+from rag_etl.loaders import ContentMetadataLoader, ParquetLoader
+
+from bench_sqlite_index import write_corpus, timed
+
+
+TYPE_SUBTYPES = [('practice', 'homework'), ('exam', 'previous_year_exam'), ('lecture', 'slides'), ('practice', 'solution')]
+
+
+def analyse_json(output_path):
+    """Counts and mean lengths by (type, subtype, week), from the metadata and content files."""
+
+    stats = defaultdict(lambda: [0, 0])
+    for metadata_path in (Path(output_path) / 'metadata').glob('*.json'):
+        for document in json.loads(metadata_path.read_text(encoding='utf-8'))['documents']:
+            chars = len((Path(output_path) / document['path']).read_text(encoding='utf-8'))
+            key = (document['type'], document['subtype'], document['week'])
+            stats[key][0] += 1
+            stats[key][1] += chars
+
+    return {key: (count, total / count) for key, (count, total) in stats.items()}
+
+
+def analyse_parquet(dataset_path):
+    """Same as `analyse_json`, reading only the needed columns of the Parquet dataset."""
+    import pyarrow.dataset as ds
+
+    table = ds.dataset(dataset_path, partitioning='hive').to_table(columns=['type', 'subtype', 'week', 'chars'])
+    grouped = table.group_by(['type', 'subtype', 'week']).aggregate([('chars', 'count'), ('chars', 'mean')])
+
+    return {(row['type'], row['subtype'], row['week']): (row['chars_count'], row['chars_mean']) for row in grouped.to_pylist()}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n', type=int, default=20000, help="Number of resources")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    course_info = {'course_id': 'BENCH-101', 'course_title': "Benchmark course"}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # The loaders hash files with the cache utilities, which require a cache folder
+        CONFIG['CACHE_DIR'] = str(Path(tmp) / 'cache')
+        Path(CONFIG['CACHE_DIR']).mkdir()
+
+        # Content files are mirrored relative to the output folder, as for a course dump inside it
+        output_path = Path(tmp) / 'output'
+        corpus_path = output_path / 'moodle'
+        corpus_path.mkdir(parents=True)
+
+        resources = []
+        for resource in write_corpus(corpus_path, args.n, rng):
+            resource_type, subtype = rng.choice(TYPE_SUBTYPES)
+            resources.append(resource.copy_with(type=resource_type, subtype=subtype, week=rng.randint(1, 14)))
+
+        parquet_loader = ParquetLoader(str(Path(tmp) / 'dataset'), course_info)
+        parquet_write = timed(lambda: parquet_loader.load(resources))
+
+        json_write = timed(lambda: ContentMetadataLoader(str(output_path), course_info).load(resources))
+
+        json_results, parquet_results = {}, {}
+        json_read = timed(lambda: json_results.update(analyse_json(output_path)))
+        parquet_read = timed(lambda: parquet_results.update(analyse_parquet(parquet_loader.output_path)))
+
+    assert json_results.keys() == parquet_results.keys()
+    assert all(json_results[key][0] == parquet_results[key][0] for key in json_results)
+
+    print(f"Resources: {args.n}")
+    print(f"Write, Parquet dataset:         {parquet_write:.2f}s")
+    print(f"Write, content and metadata:    {json_write:.2f}s")
+    print(f"Analysis, metadata and content: {json_read:.2f}s")
+    print(f"Analysis, Parquet dataset:      {parquet_read:.3f}s ({json_read / parquet_read:.0f}x faster)")
+
+
+if __name__ == '__main__':
+    main()
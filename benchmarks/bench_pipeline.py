@@ -0,0 +1,291 @@
+"""
+End-to-end benchmark of a course pipeline, over a synthetic Moodle dump and against a local stub of the LLM endpoint.
+
+Generates a dump of real PDFs, notebooks with images and zips (see `synthetic_moodle.content_writer`), and runs it
+through `BaseCourse.run` with the COM309 extractors and transformers and all the loaders. The LLM requests go to
+`StubLLMServer`, with the given latency, jitter, error rate and rate limit. Each stage is profiled separately:
+
+    - throughput, in resources per second
+    - number of LLM requests (and of ALT text requests), rate limited (429) and failed (5xx) responses, and
+      latency percentiles
+    - peak Python memory, traced with tracemalloc (which slows Python code down, see --no-memory)
+
+Results can be saved as JSON with --output, and compared with those of another commit with --baseline. The run
+fails if the notebook stage got fewer ALT texts (or ALT text requests, with --error-rate) than there are notebook
+images in the dump, e.g. because some images were not found next to their notebooks.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--sections 4] [--resources-per-section 6] [--pdf-pages 1 4]
+        [--latency 0.2] [--jitter 0.1] [--error-rate 0.0] [--rate-limit 20] [--output results.json] [--baseline previous.json]
+"""
+
+import json
+import time
+import zipfile
+import argparse
+import resource
+import tempfile
+import subprocess
+import tracemalloc
+import importlib.util
+
+from collections import defaultdict
+from pathlib import Path
+
+from synthetic_moodle import generate_moodle_dump, content_writer
+from stub_llm_server import StubLLMServer
+
+
+def percentile(values, q):
+    """Nearest-rank percentile, None if there are no values."""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+class StageProfiler:
+    """Wraps the methods running each stage of a course, recording their time, LLM requests and peak memory."""
+
+    def __init__(self, server: StubLLMServer, trace_memory: bool = True):
+        self.server = server
+        self.trace_memory = trace_memory
+        self.calls = []
+
+    def _record(self, step: str, stage: str, items_in: int, result, start: float) -> None:
+        end = time.perf_counter()
+        self.calls.append({
+            'step': step,
+            'stage': stage,
+            'items_in': items_in,
+            'items_out': len(result) if step != 'load' and result is not None else 0,
+            'seconds': end - start,
+            'requests': self.server.requests_between(start, end),
+            'peak_bytes': tracemalloc.get_traced_memory()[1] if self.trace_memory else None,
+        })
+
+    def wrap(self, step: str, stage: str, fn):
+        def profiled(*args, **kwargs):
+            items_in = len(args[0]) if args else 0
+
+            if self.trace_memory:
+                tracemalloc.reset_peak()
+            start = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException:
+                self._record(step, stage, items_in, None, start)
+                raise
+
+            self._record(step, stage, items_in, result, start)
+            return result
+
+        return profiled
+
+    def report(self) -> list:
+        """Stats of each stage, in order, aggregated over its calls (e.g. when run again resource by resource)."""
+
+        stages = defaultdict(list)
+        for call in self.calls:
+            stages[(call['step'], call['stage'])].append(call)
+
+        report = []
+        for (step, stage), calls in stages.items():
+            requests = [request for call in calls for request in call['requests']]
+            latencies = [request.latency for request in requests if request.status == 200]
+            seconds = sum(call['seconds'] for call in calls)
+            items = calls[0]['items_in'] if step != 'extract' else sum(call['items_out'] for call in calls)
+            peaks = [call['peak_bytes'] for call in calls if call['peak_bytes'] is not None]
+
+            report.append({
+                'step': step,
+                'stage': stage,
+                'calls': len(calls),
+                'items_in': calls[0]['items_in'],
+                'items_out': sum(call['items_out'] for call in calls),
+                'seconds': seconds,
+                'items_per_second': items / seconds if seconds else None,
+                'llm_requests': len(requests),
+                'alt_text_requests': sum(request.kind == 'alt_text' for request in requests),
+                'alt_texts': sum(request.kind == 'alt_text' and request.status == 200 for request in requests),
+                'rate_limited': sum(request.status == 429 for request in requests),
+                'errors': sum(request.status >= 500 for request in requests),
+                'latency_p50': percentile(latencies, 50),
+                'latency_p95': percentile(latencies, 95),
+                'latency_p99': percentile(latencies, 99),
+                'peak_mb': max(peaks) / 1e6 if peaks else None,
+            })
+
+        return report
+
+
+def build_course(dump_path: Path, output_path: Path, profiler: StageProfiler):
+    """COM309 pipeline over the synthetic dump, with all the loaders, its stages wrapped by the profiler."""
+
+    # Imported here, once the configuration points to the temporary cache folder and the stub
+    from rag_etl.courses import COM309Course
+    from rag_etl.extractors import MoodleExtractor
+    from rag_etl.loaders import BundleLoader, ContentMetadataLoader, ParquetLoader, SQLiteIndexLoader, VectorIndexLoader
+
+    bundle_suffix = 'tar.zst' if importlib.util.find_spec('zstandard') else 'tar'
+
+    class BenchmarkCourse(COM309Course):
+        moodle_dump_path = str(dump_path)
+
+        def __init__(self):
+            self.output_path = str(output_path)
+            course_info = self.course_info
+
+            self._extractors = [MoodleExtractor(moodle_dump_path=self.moodle_dump_path)]
+            self._transformers = super().transformers
+            self._loaders = [
+                ContentMetadataLoader(output_path=str(output_path), course_info=course_info),
+                SQLiteIndexLoader(str(output_path / 'index' / 'chunks.db')),
+                VectorIndexLoader(str(output_path / 'index' / 'vectors')),
+                ParquetLoader(str(output_path / 'dataset'), course_info),
+                BundleLoader(str(output_path), course_info, str(output_path / 'bundles' / f"corpus.{bundle_suffix}")),
+            ]
+
+            for extractor in self._extractors:
+                extractor.extract = profiler.wrap('extract', extractor.__class__.__name__, extractor.extract)
+            for transformer in self._transformers:
+                transformer.transform = profiler.wrap('transform', transformer.__class__.__name__, transformer.transform)
+            for loader in self._loaders:
+                loader.load = profiler.wrap('load', loader.__class__.__name__, loader.load)
+
+        @property
+        def extractors(self):
+            return self._extractors
+
+        @property
+        def transformers(self):
+            return self._transformers
+
+        @property
+        def loaders(self):
+            return self._loaders
+
+    return BenchmarkCourse()
+
+
+def count_images(dump_path: Path) -> int:
+    """Number of images in the dump, in folders and in zips, i.e. of notebook images in synthetic dumps."""
+
+    images = sum(1 for _ in dump_path.rglob('*.png'))
+    for zip_path in dump_path.rglob('*.zip'):
+        with zipfile.ZipFile(zip_path) as archive:
+            images += sum(name.endswith('.png') for name in archive.namelist())
+
+    return images
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def format_value(value, spec):
+    return format(value, spec) if value is not None else '-'
+
+
+def print_report(report, baseline=None):
+    baseline_seconds = {(stage['step'], stage['stage']): stage['seconds'] for stage in (baseline or {}).get('stages', [])}
+
+    header = f"{'stage':<40}{'in':>6}{'out':>6}{'seconds':>9}{'items/s':>9}{'LLM':>6}{'ALT':>5}{'429':>5}{'5xx':>5}{'p50 s':>7}{'p95 s':>7}{'peak MB':>9}"
+    if baseline:
+        header += f"{'vs base':>9}"
+    print(header)
+
+    for stage in report:
+        line = (
+            f"{stage['step'] + ' ' + stage['stage']:<40}{stage['items_in']:>6}{stage['items_out'] if stage['step'] != 'load' else '':>6}"
+            f"{stage['seconds']:>9.2f}{format_value(stage['items_per_second'], '.1f'):>9}"
+            f"{stage['llm_requests']:>6}{stage['alt_text_requests']:>5}{stage['rate_limited']:>5}{stage['errors']:>5}"
+            f"{format_value(stage['latency_p50'], '.2f'):>7}{format_value(stage['latency_p95'], '.2f'):>7}"
+            f"{format_value(stage['peak_mb'], '.1f'):>9}"
+        )
+        if baseline:
+            previous = baseline_seconds.get((stage['step'], stage['stage']))
+            line += f"{format_value(stage['seconds'] / previous if previous else None, '.2f') + 'x':>9}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sections', type=int, default=4)
+    parser.add_argument('--resources-per-section', type=int, default=6)
+    parser.add_argument('--pdf-pages', type=int, nargs=2, default=(1, 4), metavar=('MIN', 'MAX'))
+    parser.add_argument('--notebook-images', type=int, default=2)
+    parser.add_argument('--latency', type=float, default=0.2, help="Mean latency of the LLM requests, in seconds")
+    parser.add_argument('--jitter', type=float, default=0.1)
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of the LLM requests failing with a 500 error")
+    parser.add_argument('--rate-limit', type=float, default=None, help="Maximum number of LLM requests per second")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true', help="Do not trace memory, which slows Python code down")
+    parser.add_argument('--output', help="JSON file to save the results to")
+    parser.add_argument('--baseline', help="JSON file with the results of a previous run, to compare with")
+    args = parser.parse_args()
+
+    from rag_etl.config import CONFIG
+
+    with tempfile.TemporaryDirectory() as tmp, StubLLMServer(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, rate_limit=args.rate_limit, seed=args.seed) as server:
+        # Fresh cache, so that nothing is served from previous runs, and every LLM request goes to the stub
+        CONFIG['CACHE_DIR'] = str(Path(tmp) / 'cache')
+        CONFIG['RCP_BASE_URL'] = server.base_url
+        CONFIG['RCP_API_KEY'] = 'stub'
+        Path(CONFIG['CACHE_DIR']).mkdir()
+
+        output_path = Path(tmp) / 'output'
+        dump_path = output_path / 'moodle'
+        generate_moodle_dump(dump_path, args.sections, args.resources_per_section, content_writer(tuple(args.pdf_pages), args.notebook_images, args.seed))
+        images = count_images(dump_path)
+
+        profiler = StageProfiler(server, trace_memory=not args.no_memory)
+        course = build_course(dump_path, output_path, profiler)
+
+        if profiler.trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        course.run()
+        total_seconds = time.perf_counter() - start
+        if profiler.trace_memory:
+            tracemalloc.stop()
+
+        requests = server.requests
+
+    results = {
+        'commit': git_commit(),
+        'args': vars(args),
+        'total_seconds': total_seconds,
+        'llm_requests': len(requests),
+        'images': images,
+        'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3,
+        'stages': profiler.report(),
+    }
+
+    baseline = json.loads(Path(args.baseline).read_text(encoding='utf-8')) if args.baseline else None
+
+    print(f"Commit {results['commit']}, {args.sections * args.resources_per_section} Moodle resources, stub latency {args.latency}s ± {args.jitter}s")
+    print_report(results['stages'], baseline)
+    print(f"Total {total_seconds:.2f}s, {len(requests)} LLM requests, max RSS {results['max_rss_mb']:.0f}MB")
+    if baseline:
+        print(f"Baseline (commit {baseline.get('commit')}): total {baseline['total_seconds']:.2f}s ({total_seconds / baseline['total_seconds']:.2f}x)")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2), encoding='utf-8')
+
+    # Sanity check, as images missing next to their notebooks silently get no ALT text. Images are all distinct.
+    # With failing requests, some images may get no ALT text, but each of them must still be requested
+    notebook_stages = [stage for stage in results['stages'] if stage['stage'] == 'JupyterToMarkdownTransformer']
+    if args.error_rate == 0:
+        alt_texts, counted = sum(stage['alt_texts'] for stage in notebook_stages), 'ALT texts'
+    else:
+        alt_texts, counted = sum(stage['alt_text_requests'] for stage in notebook_stages), 'ALT text requests'
+    if alt_texts < images:
+        raise SystemExit(f"The dump has {images} notebook images, but JupyterToMarkdownTransformer only got {alt_texts} {counted}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Benchmark of the SQLite full-text index loader.
+
+Indexes a synthetic corpus of Markdown exercise sheets, measures the throughput of the initial ingestion,
+of a re-run with nothing changed, and of a re-run with a few documents changed, then the latency of searches.
+
+Usage:
+    python benchmarks/bench_sqlite_index.py [--n 5000] [--changed 50] [--queries 200]
+"""
+
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+from pathlib import Path
+
+from rag_etl.config import CONFIG
+from rag_etl.loaders import SQLiteIndexLoader
+from rag_etl.resources import MoodleResource
+
+
+WORDS = (
+    "matrix vector eigenvalue proof lemma theorem graph vertex edge probability random variable "
+    "expectation variance integral derivative series convergence kernel basis dimension function "
+    "algorithm complexity induction set relation bijection prime modulo polynomial root limit"
+).split()
+
+
+def write_corpus(path, n, rng):
+    """Markdown files of a few exercises each, with a heading, prose and a code block."""
+
+    resources = []
+    for i in range(n):
+        lines = []
+        for exercise in range(1, rng.randint(2, 6)):
+            lines.append(f"## Exercise {exercise}\n")
+            for _ in range(rng.randint(2, 5)):
+                lines.append(' '.join(rng.choices(WORDS, k=rng.randint(30, 80))).capitalize() + '.\n')
+            lines.append("```python\nprint('step')\n```\n")
+
+        file_path = Path(path) / f"sheet_{i}.md"
+        file_path.write_text('\n'.join(lines), encoding='utf-8')
+
+        resources.append(MoodleResource(
+            title=f"Sheet {i}",
+            source='moodle',
+            url=f"https://moodle.epfl.ch/mod/resource/view.php?id={i}",
+            path=str(file_path),
+            mime_type='text/markdown',
+        ))
+
+    return resources
+
+
+def timed(function):
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n', type=int, default=5000, help="Number of documents")
+    parser.add_argument('--changed', type=int, default=50, help="Number of documents changed before the last run")
+    parser.add_argument('--queries', type=int, default=200, help="Number of search queries")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # The loaders hash files with the cache utilities, which require a cache folder
+        CONFIG['CACHE_DIR'] = str(Path(tmp) / 'cache')
+        Path(CONFIG['CACHE_DIR']).mkdir()
+
+        resources = write_corpus(tmp, args.n, rng)
+        loader = SQLiteIndexLoader(str(Path(tmp) / 'index.db'))
+
+        initial = timed(lambda: loader.load(resources))
+
+        conn = loader.connect()
+        chunks = conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+        conn.close()
+
+        unchanged = timed(lambda: loader.load(resources))
+
+        for resource in rng.sample(resources, args.changed):
+            with open(resource.path, 'a', encoding='utf-8') as f:
+                f.write(f"\n## Appendix\n\n{' '.join(rng.choices(WORDS, k=40))}.\n")
+        changed = timed(lambda: loader.load(resources))
+
+        latencies = []
+        for _ in range(args.queries):
+            query = ' '.join(rng.sample(WORDS, 2))
+            latencies.append(timed(lambda: loader.search(query)) * 1000)
+        latencies.sort()
+
+    print(f"Documents: {args.n}, chunks: {chunks}")
+    print(f"Initial ingestion:   {initial:.2f}s ({args.n / initial:.0f} docs/s, {chunks / initial:.0f} chunks/s)")
+    print(f"Re-run, unchanged:   {unchanged:.2f}s")
+    print(f"Re-run, {args.changed} changed: {changed:.2f}s")
+    print(f"Search latency: p50 {statistics.median(latencies):.2f}ms, p95 {latencies[int(len(latencies) * 0.95)]:.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmark of the local vector index loader, with the hashing embedder.
+
+Indexes a synthetic corpus of Markdown exercise sheets, measures the throughput of the initial ingestion,
+of a re-run with nothing changed, and of a re-run with a few documents changed, then the latency of searches
+and the recall@1 of queries taken from the indexed chunks themselves.
+
+Usage:
+    python benchmarks/bench_vector_index.py [--n 5000] [--changed 50] [--queries 200]
+"""
+
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+from pathlib import Path
+
+from rag_etl.config import CONFIG
+from rag_etl.loaders import VectorIndexLoader
+
+from bench_sqlite_index import write_corpus, timed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n', type=int, default=5000, help="Number of documents")
+    parser.add_argument('--changed', type=int, default=50, help="Number of documents changed before the last run")
+    parser.add_argument('--queries', type=int, default=200, help="Number of search queries")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # The loaders hash files with the cache utilities, which require a cache folder
+        CONFIG['CACHE_DIR'] = str(Path(tmp) / 'cache')
+        Path(CONFIG['CACHE_DIR']).mkdir()
+
+        resources = write_corpus(tmp, args.n, rng)
+        loader = VectorIndexLoader(str(Path(tmp) / 'index'))
+
+        initial = timed(lambda: loader.load(resources))
+        chunks = loader.read_index()['rows']
+
+        unchanged = timed(lambda: loader.load(resources))
+
+        for resource in rng.sample(resources, args.changed):
+            with open(resource.path, 'a', encoding='utf-8') as f:
+                f.write("\n## Appendix\n\nOne more remark.\n")
+        changed = timed(lambda: loader.load(resources))
+
+        # Queries are chunks of random documents, which should come first
+        latencies = []
+        hits = 0
+        for resource in rng.sample(resources, args.queries):
+            with open(resource.path, encoding='utf-8') as f:
+                query = f.read().split('\n\n')[1]
+            start = time.perf_counter()
+            results = loader.search(query, k=10)
+            latencies.append((time.perf_counter() - start) * 1000)
+            hits += results[0]['path'] == resource.path
+        latencies.sort()
+
+    print(f"Documents: {args.n}, chunks: {chunks}")
+    print(f"Initial ingestion:   {initial:.2f}s ({args.n / initial:.0f} docs/s, {chunks / initial:.0f} chunks/s)")
+    print(f"Re-run, unchanged:   {unchanged:.2f}s")
+    print(f"Re-run, {args.changed} changed: {changed:.2f}s")
+    print(f"Search latency: p50 {statistics.median(latencies):.2f}ms, p95 {latencies[int(len(latencies) * 0.95)]:.2f}ms")
+    print(f"Recall@1: {hits / args.queries:.2%}")
+
+
+if __name__ == '__main__':
+    main()
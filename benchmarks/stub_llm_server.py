@@ -0,0 +1,299 @@
+"""
+Local stub of an OpenAI-compatible endpoint, standing in for RCP, to run the LLM stages of a pipeline offline.
+
+Serves `/v1/chat/completions` and `/v1/embeddings` with synthetic answers after a configurable latency, and can
+fail a fraction of the requests and rate limit them, as the real endpoint does under load:
+
+    - Page conversions (requests with an image) get a page of Markdown with an exercise heading, ALT text
+      requests a short description, and stitching requests their snippets joined.
+    - Structured outputs (`response_format` with a JSON schema) get the smallest valid instance of the schema.
+    - Embeddings are deterministic unit vectors derived from the input text.
+
+Every request is recorded with its kind, start and end time, status and latency (see `StubLLMServer.requests`).
+
+Usage:
+    python benchmarks/stub_llm_server.py [--port 8766] [--latency 0.5] [--jitter 0.2] [--error-rate 0.01] [--rate-limit 10]
+"""
+
+import json
+import math
+import time
+import random
+import hashlib
+import argparse
+import itertools
+import threading
+
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+
+# Dimension of the embeddings, unless the request asks for another one
+EMBEDDING_DIM = 256
+
+PARAGRAPH = (
+    "Let $A$ be a symmetric matrix. Show that its eigenvalues are real, and that eigenvectors of distinct "
+    "eigenvalues are orthogonal. Deduce that $A$ is diagonalizable in an orthonormal basis."
+)
+
+
+@dataclass
+class StubRequest:
+    path: str
+    model: Optional[str]
+    kind: str                   # see `request_kind`
+    status: int
+    start: float
+    end: float
+
+    @property
+    def latency(self) -> float:
+        return self.end - self.start
+
+
+def schema_instance(schema: dict, defs: Optional[dict] = None):
+    """Smallest instance of a JSON schema, e.g. as generated by pydantic: required properties only, empty arrays."""
+
+    defs = defs if defs is not None else schema.get('$defs', {})
+
+    if '$ref' in schema:
+        return schema_instance(defs[schema['$ref'].rsplit('/', 1)[-1]], defs)
+    if 'anyOf' in schema:
+        return schema_instance(schema['anyOf'][0], defs)
+    if 'enum' in schema:
+        return schema['enum'][0]
+
+    return {
+        'object': lambda: {name: schema_instance(schema['properties'][name], defs) for name in schema.get('required', [])},
+        'array': lambda: [],
+        'string': lambda: '',
+        'integer': lambda: 0,
+        'number': lambda: 0.0,
+        'boolean': lambda: False,
+    }.get(schema.get('type'), lambda: None)()
+
+
+def message_texts(body: dict) -> List[str]:
+    """Texts of the messages of a chat request, whether plain or parts of a multimodal message."""
+
+    contents = [message['content'] for message in body.get('messages', [])]
+    texts = [part['text'] for content in contents if isinstance(content, list) for part in content if part.get('type') == 'text']
+    return texts + [content for content in contents if isinstance(content, str)]
+
+
+def request_kind(path: str, body: dict) -> str:
+    """
+    Kind of a request, as told from its content: 'embedding', 'structured' (JSON schema response format),
+    'alt_text' (an image with the ALT text prompt), 'page' (another image, i.e. a page conversion),
+    'stitch' (text with fenced snippets) or 'text'.
+    """
+
+    if path.endswith('/embeddings'):
+        return 'embedding'
+
+    response_format = body.get('response_format') or {}
+    if response_format.get('type') == 'json_schema':
+        return 'structured'
+
+    texts = message_texts(body)
+    contents = [message['content'] for message in body.get('messages', [])]
+    has_image = any(part.get('type') == 'image_url' for content in contents if isinstance(content, list) for part in content)
+
+    if has_image:
+        return 'alt_text' if any('ALT text for this image' in text for text in texts) else 'page'
+
+    # Stitching requests list the pages as fenced snippets
+    if any('```' in text for text in texts):
+        return 'stitch'
+
+    return 'text'
+
+
+def embedding(text: str, dim: int) -> List[float]:
+    """Deterministic unit vector of a text."""
+
+    rng = random.Random(hashlib.sha256(text.encode('utf-8')).digest())
+    vector = [rng.gauss(0, 1) for _ in range(dim)]
+    norm = math.sqrt(sum(x * x for x in vector))
+    return [x / norm for x in vector]
+
+
+class StubLLMServer:
+    """
+    OpenAI-compatible stub server, run in a background thread.
+
+    Args:
+        port: Port to listen on, 0 for any free port.
+        latency: Mean latency of a request, in seconds.
+        jitter: Latencies are drawn uniformly within `latency` ± `jitter`.
+        error_rate: Fraction of the requests answered with a 500 error.
+        rate_limit: Maximum number of requests per second, with bursts of as many. Requests over the limit are
+            answered with a 429 error and a Retry-After header. None for no limit.
+        seed: Seed of the latencies and errors.
+
+    Example:
+        with StubLLMServer(latency=0.2) as server:
+            CONFIG['RCP_BASE_URL'] = server.base_url
+    """
+
+    def __init__(self, port: int = 0, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, rate_limit: Optional[float] = None, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+
+        self.requests: List[StubRequest] = []
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._tokens = rate_limit or 0.0
+        self._refilled = time.monotonic()
+        self._exercises = itertools.count()
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+
+    def start(self) -> 'StubLLMServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> 'StubLLMServer':
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.stop()
+
+    def requests_between(self, start: float, end: float) -> List[StubRequest]:
+        """Requests started within the given `time.perf_counter` interval."""
+        with self._lock:
+            return [request for request in self.requests if start <= request.start < end]
+
+    ################################################################
+
+    def _admit(self) -> Optional[int]:
+        """Status of the error to answer with, if the request is rate limited or fails, else None."""
+
+        with self._lock:
+            if self.rate_limit:
+                now = time.monotonic()
+                self._tokens = min(self.rate_limit, self._tokens + (now - self._refilled) * self.rate_limit)
+                self._refilled = now
+                if self._tokens < 1:
+                    return 429
+                self._tokens -= 1
+
+            if self._rng.random() < self.error_rate:
+                return 500
+
+            return None
+
+    def _delay(self) -> float:
+        with self._lock:
+            return max(0.0, self._rng.uniform(self.latency - self.jitter, self.latency + self.jitter))
+
+    def _chat_answer(self, kind: str, body: dict) -> str:
+        if kind == 'structured':
+            return json.dumps(schema_instance(body['response_format']['json_schema']['schema']))
+
+        if kind == 'alt_text':
+            return "A synthetic figure with a plot and its axes."
+
+        if kind == 'page':
+            number = next(self._exercises) % 9 + 1
+            return f"## Exercise {number}\n\n{PARAGRAPH}\n\n{PARAGRAPH}\n"
+
+        if kind == 'stitch':
+            return '\n\n'.join(snippet.strip('\n') for text in message_texts(body) for snippet in text.split('```')[1::2])
+
+        return PARAGRAPH
+
+    def _answer(self, kind: str, body: dict) -> dict:
+        if kind == 'embedding':
+            inputs = body['input'] if isinstance(body['input'], list) else [body['input']]
+            dim = body.get('dimensions') or EMBEDDING_DIM
+            return {
+                'object': 'list',
+                'model': body['model'],
+                'data': [{'object': 'embedding', 'index': i, 'embedding': embedding(text, dim)} for i, text in enumerate(inputs)],
+                'usage': {'prompt_tokens': 0, 'total_tokens': 0},
+            }
+
+        return {
+            'id': 'chatcmpl-stub',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body['model'],
+            'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': self._chat_answer(kind, body)}}],
+            'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0},
+        }
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _send(self, status, payload, headers=None):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                start = time.perf_counter()
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                kind = request_kind(self.path, body)
+
+                status = server._admit()
+                if status == 429:
+                    self._send(429, {'error': {'message': "Rate limit exceeded", 'type': 'rate_limit_error'}}, {'Retry-After': f"{1 / server.rate_limit:.3f}"})
+                elif not self.path.endswith(('/chat/completions', '/embeddings')):
+                    status = 404
+                    self._send(404, {'error': {'message': f"Unknown path {self.path}"}})
+                else:
+                    time.sleep(server._delay())
+                    if status == 500:
+                        self._send(500, {'error': {'message': "Internal server error", 'type': 'server_error'}})
+                    else:
+                        status = 200
+                        self._send(200, server._answer(kind, body))
+
+                with server._lock:
+                    server.requests.append(StubRequest(self.path, body.get('model'), kind, status, start, time.perf_counter()))
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--latency', type=float, default=0.5, help="Mean latency of a request, in seconds")
+    parser.add_argument('--jitter', type=float, default=0.2, help="Latencies are drawn within latency ± jitter")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of the requests failing with a 500 error")
+    parser.add_argument('--rate-limit', type=float, default=None, help="Maximum number of requests per second")
+    args = parser.parse_args()
+
+    server = StubLLMServer(args.port, args.latency, args.jitter, args.error_rate, args.rate_limit).start()
+    print(f"Serving at {server.base_url}, set RCP_BASE_URL to it")
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,197 @@
+"""
+Local stub of the Moodle web service, replaying recorded responses, to run `MoodleWSExtractor` offline.
+
+A recording is a folder with the following layout:
+
+    <recording>/rest/<wsfunction>.json      response of each web service function
+    <recording>/files/<path>                file served at <base url>/webservice/pluginfile.php/<path>
+
+File URLs in the recorded responses are rewritten to point to the stub. Files are served with an ETag and
+a Last-Modified header, and conditional requests are answered with 304 Not Modified.
+
+Usage:
+    python benchmarks/stub_moodle_ws.py record <recording> --base-url https://moodle.epfl.ch --token <token> --course-id <id>
+    python benchmarks/stub_moodle_ws.py generate <recording> [--sections 14] [--resources-per-section 10]
+    python benchmarks/stub_moodle_ws.py serve <recording> [--port 8765]
+"""
+
+import json
+import hashlib
+import argparse
+import threading
+
+from pathlib import Path
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse, unquote
+
+from rag_etl.extractors.moodle.moodle_ws_client import call_ws, download_file
+
+
+PLUGINFILE = '/webservice/pluginfile.php'
+
+RECORDED_BASE_URL = 'https://moodle.epfl.ch'
+
+
+def record(recording_path, base_url: str, token: str, course_id: int) -> None:
+    """Record the course contents of a live Moodle instance, and all its files."""
+
+    recording_path = Path(recording_path)
+    (recording_path / 'rest').mkdir(parents=True, exist_ok=True)
+
+    sections = call_ws(base_url, token, 'core_course_get_contents', courseid=course_id)
+    (recording_path / 'rest' / 'core_course_get_contents.json').write_text(json.dumps(sections, indent=2), encoding='utf-8')
+
+    for section in sections:
+        for module in section.get('modules', []):
+            for content in module.get('contents', []):
+                if content.get('type') == 'file' and PLUGINFILE in content['fileurl']:
+                    file_path = urlparse(content['fileurl']).path.split(PLUGINFILE, 1)[1].lstrip('/')
+                    download_file(content['fileurl'], token, recording_path / 'files' / unquote(file_path))
+
+
+def generate_recording(recording_path, sections: int = 14, resources_per_section: int = 10, write_resource=None) -> Path:
+    """
+    Generate a synthetic recording, with the same courses as `synthetic_moodle.generate_moodle_dump`.
+    `write_resource(path, extension, index)` writes the content of each file.
+    """
+
+    from synthetic_moodle import KINDS, MONTHS, write_resource_file
+
+    write_resource = write_resource or write_resource_file
+    recording_path = Path(recording_path)
+
+    contents = []
+    resource_index = 0
+    for section in range(sections):
+        day = 1 + (section * 7) % 27
+        modules = []
+        for i in range(resources_per_section):
+            title_template, extension = KINDS[(section + i) % len(KINDS)]
+            filename = f"resource_{resource_index}.{extension}"
+            module_id = 10000 + resource_index
+            file_path = f"{module_id}/mod_resource/content/1/{filename}"
+
+            write_resource(recording_path / 'files' / file_path, extension, resource_index)
+
+            modules.append({
+                'id': module_id,
+                'name': title_template.format(n=section + 1, year=2015 + i % 10),
+                'modname': 'resource',
+                'url': f"{RECORDED_BASE_URL}/mod/resource/view.php?id={module_id}",
+                'contents': [{
+                    'type': 'file',
+                    'filename': filename,
+                    'filepath': '/',
+                    'fileurl': f"{RECORDED_BASE_URL}{PLUGINFILE}/{file_path}?forcedownload=1",
+                }],
+            })
+            resource_index += 1
+
+        contents.append({
+            'id': section,
+            'name': f"{day} - {day + 1} {MONTHS[(section // 4) % len(MONTHS)]}",
+            'summary': f"<p>Week {section + 1}. Topics of the week, reading and exercises.</p>",
+            'modules': modules,
+        })
+
+    (recording_path / 'rest').mkdir(parents=True, exist_ok=True)
+    (recording_path / 'rest' / 'core_course_get_contents.json').write_text(json.dumps(contents, indent=2), encoding='utf-8')
+
+    return recording_path
+
+
+def make_handler(recording_path: Path, recorded_base_url: str):
+
+    class StubHandler(BaseHTTPRequestHandler):
+        # Number of files actually transferred, e.g. to check that unchanged files are not downloaded again
+        files_served = 0
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, body=b'', headers=None):
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+
+            if url.path == '/webservice/rest/server.php':
+                response_path = recording_path / 'rest' / f"{query.get('wsfunction', [''])[0]}.json"
+                if 'wstoken' not in query or not response_path.exists():
+                    body = json.dumps({'exception': 'moodle_exception', 'errorcode': 'invalidrecord', 'message': self.path})
+                    return self._send(200, body.encode('utf-8'))
+
+                stub_base_url = f"http://{self.headers['Host']}"
+                body = response_path.read_text(encoding='utf-8').replace(f"{recorded_base_url}{PLUGINFILE}", f"{stub_base_url}{PLUGINFILE}")
+                return self._send(200, body.encode('utf-8'), {'Content-Type': 'application/json'})
+
+            if url.path.startswith(PLUGINFILE + '/'):
+                file_path = recording_path / 'files' / unquote(url.path[len(PLUGINFILE) + 1:])
+                if 'token' not in query or not file_path.is_file() or '..' in Path(url.path).parts:
+                    return self._send(404)
+
+                body = file_path.read_bytes()
+                etag = f'"{hashlib.sha256(body).hexdigest()}"'
+                mtime = file_path.stat().st_mtime
+                headers = {'ETag': etag, 'Last-Modified': formatdate(mtime, usegmt=True)}
+
+                if self.headers.get('If-None-Match') == etag:
+                    return self._send(304, headers=headers)
+                if 'If-None-Match' not in self.headers and self.headers.get('If-Modified-Since'):
+                    if parsedate_to_datetime(self.headers['If-Modified-Since']).timestamp() >= int(mtime):
+                        return self._send(304, headers=headers)
+
+                type(self).files_served += 1
+                return self._send(200, body, headers)
+
+            return self._send(404)
+
+    return StubHandler
+
+
+def serve(recording_path, port: int = 0, recorded_base_url: str = RECORDED_BASE_URL) -> ThreadingHTTPServer:
+    """
+    Start the stub server in a background thread and return it. Its base URL is
+    `f"http://127.0.0.1:{server.server_port}"`. Stop it with `server.shutdown()`.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(Path(recording_path), recorded_base_url))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = subparsers.add_parser('record')
+    record_parser.add_argument('recording_path')
+    record_parser.add_argument('--base-url', default=RECORDED_BASE_URL)
+    record_parser.add_argument('--token', required=True)
+    record_parser.add_argument('--course-id', type=int, required=True)
+
+    generate_parser = subparsers.add_parser('generate')
+    generate_parser.add_argument('recording_path')
+    generate_parser.add_argument('--sections', type=int, default=14)
+    generate_parser.add_argument('--resources-per-section', type=int, default=10)
+
+    serve_parser = subparsers.add_parser('serve')
+    serve_parser.add_argument('recording_path')
+    serve_parser.add_argument('--port', type=int, default=8765)
+
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        record(args.recording_path, args.base_url, args.token, args.course_id)
+    elif args.command == 'generate':
+        generate_recording(args.recording_path, args.sections, args.resources_per_section)
+    else:
+        server = serve(args.recording_path, args.port)
+        print(f"Serving {args.recording_path} at http://127.0.0.1:{server.server_port}")
+        threading.Event().wait()
@@ -0,0 +1,222 @@
+"""
+Generator of synthetic Moodle dumps, with the same layout as the HTML dumps read by `MoodleExtractor`:
+
+    <dump>/index.html                       sections (<h3>) followed by their text and links
+    <dump>/File_<i>/index.html              one page per resource, with its links inside <main>
+    <dump>/File_<i>/content/<filename>      the resource file itself
+
+Resource files are placeholders by default. `content_writer` writes real ones instead: PDFs with a configurable
+number of pages, notebooks with images, and zips of both, so that the whole pipeline can run over the dump.
+
+Usage:
+    python benchmarks/synthetic_moodle.py <dump path> [--sections 14] [--resources-per-section 10] [--content] [--pdf-pages 1 4]
+"""
+
+import io
+import json
+import random
+import zipfile
+import argparse
+
+from pathlib import Path
+
+
+# Typical Moodle page boilerplate around the actual content, so that parsing costs are realistic
+PAGE_HEAD = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<link rel="stylesheet" href="../theme/styles.css">
+<style>body {{ font-family: sans-serif; }} .nav {{ display: flex; }}</style>
+<script>window.M = window.M || {{}}; M.cfg = {{"wwwroot": "https://moodle.epfl.ch", "sesskey": "abc"}};</script>
+</head>
+<body>
+<nav class="nav">{nav}</nav>
+"""
+
+PAGE_TAIL = """
+<footer><p>EPFL Moodle</p><a href="https://moodle.epfl.ch/admin/tool/dataprivacy/summary.php">Data retention summary</a></footer>
+<script>require(['core/first'], function() {{ M.util.js_complete('init'); }});</script>
+</body>
+</html>
+"""
+
+NAV = ''.join(f'<a href="https://moodle.epfl.ch/course/view.php?id={i}">Course {i}</a>' for i in range(40))
+
+MONTHS = ['September', 'October', 'November', 'December']
+
+KINDS = [
+    ('Lecture {n} slides', 'pdf'),
+    ('Homework {n}', 'pdf'),
+    ('Solution homework {n}', 'pdf'),
+    ('Exam {year}', 'pdf'),
+    ('Notebooks {n}', 'zip'),
+    ('Exercise notebook {n}', 'ipynb'),
+]
+
+
+def write_resource_file(path: Path, extension: str, index: int) -> None:
+    """Write a placeholder resource file. Real content is generated by callers that need it."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(f"Synthetic resource {index}\n".encode() * 8)
+
+
+def pdf_bytes(pages: int, rng: random.Random) -> bytes:
+    """PDF of exercise sheet pages, with a few exercises of text and formulas per page. Requires PyMuPDF."""
+    import pymupdf
+
+    doc = pymupdf.open()
+    exercise = 1
+    for _ in range(pages):
+        page = doc.new_page()
+        text = []
+        for _ in range(rng.randint(1, 3)):
+            text.append(f"Exercise {exercise}\n")
+            text.append("Let A be a symmetric matrix with eigenvalues l1 <= ... <= ln. " * rng.randint(3, 8) + "\n")
+            exercise += 1
+        page.insert_textbox(pymupdf.Rect(50, 50, 550, 800), '\n'.join(text), fontsize=11)
+
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def png_bytes(rng: random.Random, size=(320, 240)) -> bytes:
+    """Random PNG figure, distinct for each call so that ALT texts are not shared. Requires PIL."""
+    from PIL import Image
+
+    img = Image.frombytes('RGB', size, rng.randbytes(size[0] * size[1] * 3))
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def notebook_files(name: str, images: int, rng: random.Random) -> dict:
+    """Files of a notebook `<name>.ipynb` with Markdown, code and output cells, and its images next to it."""
+
+    files = {}
+    cells = [{'cell_type': 'markdown', 'metadata': {}, 'source': f"# Exercises {name}\n\nSolve the following problems."}]
+    for i in range(images):
+        image_name = f"{name}_figure_{i}.png"
+        files[image_name] = png_bytes(rng)
+        cells.append({'cell_type': 'markdown', 'metadata': {}, 'source': f"## Exercise {i + 1}\n\n![Figure {i + 1}]({image_name})\n\nExplain the figure."})
+        cells.append({
+            'cell_type': 'code', 'metadata': {}, 'execution_count': i + 1,
+            'source': "import numpy as np\nx = np.linspace(0, 1, 100)\nprint(x.mean())",
+            'outputs': [{'output_type': 'stream', 'name': 'stdout', 'text': "0.5\n" * rng.randint(1, 60)}],
+        })
+
+    notebook = {'cells': cells, 'metadata': {}, 'nbformat': 4, 'nbformat_minor': 5}
+    files[f"{name}.ipynb"] = json.dumps(notebook).encode('utf-8')
+
+    return files
+
+
+def content_writer(pdf_pages=(1, 4), notebook_images: int = 2, seed: int = 0):
+    """
+    Function `(path, extension, index)` writing real resource files, for `generate_moodle_dump`: PDFs of
+    `pdf_pages` pages (a (min, max) range), notebooks with `notebook_images` images each, and zips of a PDF and
+    a notebook. Requires PyMuPDF and PIL.
+    """
+
+    def write_resource(path: Path, extension: str, index: int) -> None:
+        rng = random.Random(f"{seed}-{index}")
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        if extension == 'pdf':
+            path.write_bytes(pdf_bytes(rng.randint(*pdf_pages), rng))
+        elif extension == 'ipynb':
+            for name, data in notebook_files(path.stem, notebook_images, rng).items():
+                (path.parent / name).write_bytes(data)
+        elif extension == 'zip':
+            with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+                archive.writestr(f"sheets/{path.stem}.pdf", pdf_bytes(rng.randint(*pdf_pages), rng))
+                for name, data in notebook_files(f"{path.stem}_notebook", notebook_images, rng).items():
+                    archive.writestr(f"notebooks/{name}", data)
+        else:
+            write_resource_file(path, extension, index)
+
+    return write_resource
+
+
+def generate_moodle_dump(
+    dump_path,
+    sections: int = 14,
+    resources_per_section: int = 10,
+    write_resource=write_resource_file,
+) -> Path:
+    """
+    Generate a synthetic Moodle dump at `dump_path`.
+
+    Args:
+        dump_path: Folder to create the dump in.
+        sections: Number of <h3> sections in the index.
+        resources_per_section: Number of linked resources per section.
+        write_resource: Function `(path, extension, index)` writing the content file of each resource.
+
+    Returns:
+        Path: The dump path.
+    """
+
+    dump_path = Path(dump_path)
+    dump_path.mkdir(parents=True, exist_ok=True)
+
+    index_parts = [PAGE_HEAD.format(title="COM-309", nav=NAV), '<div class="course-content">']
+
+    resource_index = 0
+    for section in range(sections):
+        day = 1 + (section * 7) % 27
+        section_title = f"{day} - {day + 1} {MONTHS[(section // 4) % len(MONTHS)]}"
+
+        index_parts.append(f'<h3>{section_title}</h3>')
+        index_parts.append(f'<div class="summary"><p>Week {section + 1}. Topics of the week, reading and exercises.</p></div>')
+        index_parts.append('<ul class="section">')
+
+        for i in range(resources_per_section):
+            title_template, extension = KINDS[(section + i) % len(KINDS)]
+            title = title_template.format(n=section + 1, year=2015 + i % 10)
+            folder = f"File_{resource_index}"
+            filename = f"resource_{resource_index}.{extension}"
+
+            index_parts.append(f'<li><div class="activity"><a href="./{folder}/index.html">{title} (File)</a><span class="details">Uploaded</span></div></li>')
+
+            # Resource page
+            page = (
+                PAGE_HEAD.format(title=title, nav=NAV)
+                + '<main>'
+                + f'<h2>{title}</h2>'
+                + f'<a href="https://moodle.epfl.ch/mod/resource/view.php?id={10000 + resource_index}">Open in Moodle</a>'
+                + f'<a href="content/{filename}">{filename}</a>'
+                + '</main>'
+                + PAGE_TAIL.format()
+            )
+            (dump_path / folder).mkdir(parents=True, exist_ok=True)
+            (dump_path / folder / 'index.html').write_text(page, encoding='utf-8')
+
+            write_resource(dump_path / folder / 'content' / filename, extension, resource_index)
+
+            resource_index += 1
+
+        index_parts.append('</ul>')
+
+    index_parts.append('</div>')
+    index_parts.append(PAGE_TAIL.format())
+
+    (dump_path / 'index.html').write_text('\n'.join(index_parts), encoding='utf-8')
+
+    return dump_path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('dump_path')
+    parser.add_argument('--sections', type=int, default=14)
+    parser.add_argument('--resources-per-section', type=int, default=10)
+    parser.add_argument('--content', action='store_true', help="Write real PDFs, notebooks and zips instead of placeholders")
+    parser.add_argument('--pdf-pages', type=int, nargs=2, default=(1, 4), metavar=('MIN', 'MAX'))
+    parser.add_argument('--notebook-images', type=int, default=2)
+    args = parser.parse_args()
+
+    write_resource = content_writer(tuple(args.pdf_pages), args.notebook_images) if args.content else write_resource_file
+    generate_moodle_dump(args.dump_path, args.sections, args.resources_per_section, write_resource)
@@ -0,0 +1,29 @@
+import sys
+import argparse
+import logging
+
+from rag_etl.courses import BaseCourse
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='rag_etl', description="Run the RAG ETL pipeline for a course.")
+    parser.add_argument('course_code', help="Code of the course to process, e.g. COM309.")
+    parser.add_argument('--dry-run', action='store_true', help="Only estimate the work the pipeline would do, without running the expensive steps.")
+    parser.add_argument('--retry-failed', action='store_true', help="Only reprocess the items that failed permanently in the last run.")
+    parser.add_argument('--checkpoints', action='store_true', help="Store the resources after each stage, so that the run can be resumed.")
+    parser.add_argument('--resume-from', metavar='STAGE', help="Resume from the checkpoint taken before the given transformer (or 'load'). Transformers appearing more than once are named with their position, e.g. 'PDFToMarkdownTransformer@3'.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='[%(levelname)s] [%(filename)s:%(lineno)d] %(message)s', handlers=[logging.StreamHandler(sys.stdout)])
+
+    course = BaseCourse.from_code(args.course_code)
+    course.checkpoints = course.checkpoints or args.checkpoints
+
+    if args.dry_run:
+        course.plan()
+    else:
+        course.run(retry_failed=args.retry_failed, resume_from=args.resume_from)
+
+
+if __name__ == '__main__':
+    main()
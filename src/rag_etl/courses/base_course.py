@@ -1,14 +1,21 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
-from typing import List, Sequence
+from collections import Counter, defaultdict
+from dataclasses import replace
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
 
 import logging
 
 from rag_etl.resources import BaseResource
+from rag_etl.resources.serialization import write_resources, read_resources
 from rag_etl.extractors import BaseExtractor
 from rag_etl.transformers import BaseTransformer
 from rag_etl.loaders import BaseLoader
+from rag_etl.utils.cache import cache_path
+from rag_etl.utils.faults import RetryPolicy, DeadLetter, write_dead_letters, read_dead_letters
+from rag_etl.utils.planning import StageEstimate, format_plan
 
 
 class BaseCourse(ABC):
@@ -25,8 +32,15 @@ class BaseCourse(ABC):
       - `transform`: runs transformers sequentially
       - `load`: runs loaders sequentially
       - `run`: orchestrates ETL steps
+      - `plan`: predicts the cost of the ETL steps without running the expensive ones
+      - `retry_policy`: how failing stages are retried before their items are sent to the dead-letter file
+      - `checkpoints`: whether to store the resources after each stage, so that runs can be resumed
     """
 
+    retry_policy: RetryPolicy = RetryPolicy()
+
+    checkpoints: bool = False
+
     ################################################################
 
     @classmethod
@@ -53,6 +67,21 @@ class BaseCourse(ABC):
         """Defaults to the class name (e.g., 'MATH101') without 'Course'."""
         return self.__class__.__name__.removesuffix('Course')
 
+    @property
+    def dead_letter_path(self) -> Path:
+        """JSON lines file where the items failing permanently in the last run are stored."""
+        return cache_path / 'dead_letters' / f"{self.course_code}.jsonl"
+
+    @property
+    def healthy_resources_path(self) -> Path:
+        """File where the healthy resources of the last run with failures are stored, to be loaded again when retrying."""
+        return cache_path / 'dead_letters' / f"{self.course_code}.healthy.jsonl"
+
+    @property
+    def checkpoint_dir(self) -> Path:
+        """Folder where the resources are stored after each stage, if `checkpoints` is set."""
+        return cache_path / 'checkpoints' / self.course_code
+
     @property
     @abstractmethod
     def extractors(self) -> List[BaseExtractor]:
@@ -73,40 +102,230 @@ class BaseCourse(ABC):
 
     ################################################################
 
-    def extract(self) -> List[BaseResource]:
-        """Run all extractors and collect their results."""
+    def extract(self, dead_letters: Optional[List[DeadLetter]] = None) -> List[BaseResource]:
+        """
+        Run all extractors and collect their results.
+
+        If a `dead_letters` list is given, failures are retried according to `retry_policy` and permanent
+        failures are appended to it instead of being raised.
+        """
 
         resources: List[BaseResource] = []
-        for extractor in self.extractors:
+        for index, extractor in enumerate(self.extractors):
             logging.info(f"Running extractor: {extractor.__class__.__name__}")
-            extracted = extractor.extract()
+
+            if dead_letters is None:
+                extracted = extractor.extract()
+            else:
+                extracted = self._extract_isolated(index, extractor, dead_letters)
+
             logging.info(f"Extractor {extractor.__class__.__name__} returned {len(extracted)} resources")
             resources.extend(extracted)
 
+        if self.checkpoints:
+            self._write_checkpoint(0, 'extract', resources)
+
         return resources
 
-    def transform(self, resources: Sequence[BaseResource]) -> List[BaseResource]:
-        """Sequentially apply transformers."""
+    def transform(self, resources: Sequence[BaseResource], dead_letters: Optional[List[DeadLetter]] = None, start: int = 0) -> List[BaseResource]:
+        """
+        Sequentially apply transformers, starting from the one at position `start`.
+
+        If a `dead_letters` list is given, failures are retried according to `retry_policy` and permanent
+        failures are appended to it instead of being raised.
+        """
 
         resources: List[BaseResource] = list(resources)
 
-        for transformer in self.transformers:
+        for index, transformer in enumerate(self.transformers):
+            if index < start:
+                continue
+
             logging.info(f"Running transformer: {transformer.__class__.__name__} with {len(resources)} resources")
-            resources = transformer.transform(resources)
+
+            if dead_letters is None:
+                resources = transformer.transform(resources)
+            else:
+                resources = self._transform_isolated(index, transformer, resources, dead_letters)
+
             logging.info(f"Transformer {transformer.__class__.__name__} output {len(resources)} resources")
 
+            if self.checkpoints:
+                self._write_checkpoint(index + 1, transformer.__class__.__name__, resources)
+
         return resources
 
-    def load(self, resources: Sequence[BaseResource]) -> None:
-        """Persist resources using the loaders."""
+    def load(self, resources: Sequence[BaseResource], dead_letters: Optional[List[DeadLetter]] = None) -> None:
+        """
+        Persist resources using the loaders.
 
-        for loader in self.loaders:
+        If a `dead_letters` list is given, each loader receives its own copy of the resources, failures are
+        retried according to `retry_policy` and permanent failures are appended to it instead of being raised.
+        """
+
+        for index, loader in enumerate(self.loaders):
             logging.info(f"Running loader: {loader.__class__.__name__} with {len(resources)} resources")
-            loader.load(list(resources))
+
+            if dead_letters is None:
+                loader.load(list(resources))
+                continue
+
+            try:
+                self.retry_policy.call(lambda: loader.load([resource.copy_with() for resource in resources]))
+            except Exception as e:
+                logging.error(f"Loader {loader.__class__.__name__} failed permanently: {e!r}")
+                dead_letters.append(DeadLetter.from_exception('load', index, loader.__class__.__name__, None, e))
+
+    ################################################################
+
+    def _extract_isolated(self, index: int, extractor: BaseExtractor, dead_letters: List[DeadLetter], items: Optional[List[dict]] = None) -> List[BaseResource]:
+        """Run an extractor (or only some of its raw items), sending permanent failures to `dead_letters`."""
+
+        stage = extractor.__class__.__name__
+
+        def on_error(item, error, formatted_traceback=None):
+            logging.error(f"Extractor {stage} failed permanently on {item}: {error!r}")
+            dead_letters.append(DeadLetter.from_exception('extract', index, stage, item, error, formatted_traceback))
+
+        # A copy, as the policy is a class attribute shared by all courses
+        extractor.retry_policy = replace(self.retry_policy)
+        extractor.on_error = on_error
+
+        if items is not None:
+            return extractor.extract_items(items)
+
+        try:
+            return self.retry_policy.call(extractor.extract)
+        except Exception as e:
+            logging.error(f"Extractor {stage} failed permanently: {e!r}")
+            dead_letters.append(DeadLetter.from_exception('extract', index, stage, None, e))
+            return []
+
+    def _transform_isolated(self, index: int, transformer: BaseTransformer, resources: List[BaseResource], dead_letters: List[DeadLetter]) -> List[BaseResource]:
+        """
+        Run a transformer over all resources at once. If it fails, run it again resource by resource,
+        retrying each one and sending permanent failures to `dead_letters`.
+        """
+
+        stage = transformer.__class__.__name__
+
+        try:
+            return transformer.transform(resources)
+        except Exception as e:
+            logging.warning(f"Transformer {stage} failed ({e!r}). Running it resource by resource to isolate failures")
+
+        transformed_resources: List[BaseResource] = []
+        for resource in resources:
+            try:
+                transformed_resources.extend(self.retry_policy.call(transformer.transform, [resource]))
+            except Exception as e:
+                logging.error(f"Transformer {stage} failed permanently on {resource.path}: {e!r}")
+                dead_letters.append(DeadLetter.from_exception('transform', index, stage, resource.to_dict(), e))
+
+        return transformed_resources
+
+    def _checkpoint_path(self, position: int, stage: str) -> Path:
+        # Checkpoint at position 0 is taken after extraction, checkpoint at position i after the i-th transformer
+        return self.checkpoint_dir / f"{position:02d}_{stage}.jsonl.gz"
+
+    def _write_checkpoint(self, position: int, stage: str, resources: List[BaseResource]) -> None:
+        checkpoint_path = self._checkpoint_path(position, stage)
+        logging.info(f"Storing checkpoint with {len(resources)} resources at {checkpoint_path}")
+        write_resources(checkpoint_path, resources)
+
+    def _resume(self, resume_from: str) -> Tuple[int, List[BaseResource]]:
+        """
+        Find the position of the transformer named `resume_from` (or 'load', after the last transformer) and
+        read the resources from the checkpoint taken right before it. Transformers whose class appears more
+        than once are named by class and position instead, e.g. 'PDFToMarkdownTransformer@3' for the third transformer.
+        """
+
+        stages = ['extract'] + [transformer.__class__.__name__ for transformer in self.transformers]
+
+        # Positions of the transformers by name, starting at 1 as for checkpoints. Unique classes can be named by class only
+        counts = Counter(stages[1:])
+        names = [stage if counts[stage] == 1 else f"{stage}@{position}" for position, stage in enumerate(stages[1:], start=1)]
+        positions = {f"{stage}@{position}": position for position, stage in enumerate(stages[1:], start=1)}
+        positions.update({name: position for position, name in enumerate(names, start=1)})
+
+        if resume_from == 'load':
+            start = len(stages) - 1
+        elif resume_from in positions:
+            start = positions[resume_from] - 1
+        elif counts[resume_from] > 1:
+            raise ValueError(f"Ambiguous stage '{resume_from}'. Use one of: {', '.join(name for name in names if name.startswith(f'{resume_from}@'))}")
+        else:
+            raise ValueError(f"Unknown stage '{resume_from}'. Available: {', '.join(names + ['load'])}")
+
+        checkpoint_path = self._checkpoint_path(start, stages[start])
+        if not checkpoint_path.exists():
+            raise FileNotFoundError(f"Checkpoint {checkpoint_path} not found; run the pipeline with checkpoints first")
+
+        logging.info(f"Resuming from {resume_from} with checkpoint {checkpoint_path}")
+
+        return start, read_resources(checkpoint_path)
+
+    def _retry_failed(self, dead_letters: List[DeadLetter]) -> List[BaseResource]:
+        """
+        Reprocess only the items in the dead-letter file from the stage they failed at, and return them
+        together with the healthy resources of the run that produced the dead letters.
+        """
+
+        previous_dead_letters = read_dead_letters(self.dead_letter_path)
+        logging.info(f"Retrying {len(previous_dead_letters)} dead letters from {self.dead_letter_path}")
+
+        extractors = self.extractors
+        transformers = self.transformers
+
+        def check_stage(stages, dead_letter):
+            if dead_letter.stage_index >= len(stages) or stages[dead_letter.stage_index].__class__.__name__ != dead_letter.stage:
+                raise ValueError(f"Stage {dead_letter.stage} at position {dead_letter.stage_index} not found; the pipeline has changed since the dead letters were written")
+
+        # Gather the resources to retry, grouped by the transformer they have to (re)start from
+        pending: Dict[int, List[BaseResource]] = defaultdict(list)
+        for dead_letter in previous_dead_letters:
+            if dead_letter.step == 'extract':
+                check_stage(extractors, dead_letter)
+                items = [dead_letter.item] if dead_letter.item is not None else None
+                pending[0].extend(self._extract_isolated(dead_letter.stage_index, extractors[dead_letter.stage_index], dead_letters, items))
+
+            elif dead_letter.step == 'transform':
+                check_stage(transformers, dead_letter)
+                pending[dead_letter.stage_index].append(BaseResource.from_dict(dead_letter.item))
+
+            # Failed loaders need no special treatment, since all resources are loaded again
+
+        # Run the transformers, adding the pending resources as their stage is reached
+        resources: List[BaseResource] = []
+        for index, transformer in enumerate(transformers):
+            resources.extend(pending[index])
+            if not resources:
+                continue
+
+            logging.info(f"Running transformer: {transformer.__class__.__name__} with {len(resources)} resources")
+            resources = self._transform_isolated(index, transformer, resources, dead_letters)
+
+        # Add the healthy resources of the previous run
+        if self.healthy_resources_path.exists():
+            resources = read_resources(self.healthy_resources_path) + resources
+
+        return resources
+
+    def _store_dead_letters(self, resources: List[BaseResource], dead_letters: List[DeadLetter]) -> None:
+        """Persist the dead letters and healthy resources of a run, or clean them up if there were no failures."""
+
+        if not dead_letters:
+            self.dead_letter_path.unlink(missing_ok=True)
+            self.healthy_resources_path.unlink(missing_ok=True)
+            return
+
+        logging.warning(f"{len(dead_letters)} items failed permanently. Storing them in {self.dead_letter_path}")
+        write_dead_letters(self.dead_letter_path, dead_letters)
+        write_resources(self.healthy_resources_path, resources)
 
     ################################################################
 
-    def run(self) -> None:
+    def run(self, retry_failed: bool = False, resume_from: Optional[str] = None) -> None:
         """
         Execute the pipeline for this course.
 
@@ -115,6 +334,15 @@ class BaseCourse(ABC):
           2) run transformers in order -> List[Resource]
           3) run all loaders
 
+        Failures are isolated per resource and stage. Items failing permanently are stored in
+        `dead_letter_path` with their traceback, and the healthy resources are loaded anyway.
+        If `retry_failed` is set, only the items in the dead-letter file are reprocessed, and nothing is done if
+        there are none.
+
+        If `checkpoints` is set, the resources are stored after each stage. Then `resume_from` can be
+        set to the name of a transformer (or to 'load') to continue from the checkpoint taken before it,
+        see `_resume` for transformers appearing more than once.
+
         Subclasses may override for custom logic, filtering, or branching.
         """
 
@@ -122,19 +350,72 @@ class BaseCourse(ABC):
 
         logging.info("#" * 64)
 
-        # Extract
-        resources = self.extract()
+        if retry_failed and resume_from:
+            raise ValueError("Cannot both retry failed items and resume from a stage")
 
-        logging.info("#" * 64)
+        dead_letters: List[DeadLetter] = []
+
+        if retry_failed:
+            # Nothing to load either, as loading no resources would wipe the output of the last run
+            if not read_dead_letters(self.dead_letter_path):
+                logging.info(f"No dead letters in {self.dead_letter_path}, nothing to retry")
+                return
 
-        # Transform
-        resources = self.transform(resources)
+            # Extract and transform dead letters only
+            resources = self._retry_failed(dead_letters)
+        elif resume_from:
+            # Read checkpoint and transform from the given stage
+            start, resources = self._resume(resume_from)
+
+            # Keep the failures of the stages that are not run again
+            dead_letters.extend(
+                dead_letter for dead_letter in read_dead_letters(self.dead_letter_path)
+                if dead_letter.step == 'extract' or (dead_letter.step == 'transform' and dead_letter.stage_index < start)
+            )
+
+            resources = self.transform(resources, dead_letters, start=start)
+        else:
+            # Extract
+            resources = self.extract(dead_letters)
+
+            logging.info("#" * 64)
+
+            # Transform
+            resources = self.transform(resources, dead_letters)
 
         logging.info("#" * 64)
 
         # Load
-        self.load(resources)
+        self.load(resources, dead_letters)
 
         logging.info("#" * 64)
 
+        # Keep track of permanent failures
+        self._store_dead_letters(resources, dead_letters)
+
         logging.info(f"Finished pipeline for course {self.course_code}")
+
+    def plan(self) -> List[StageEstimate]:
+        """
+        Predict the work the pipeline would do for this course, without doing any expensive work.
+
+        Extractors run as usual, then each transformer is planned in order (cheap transformers are
+        simply run). Loaders are not run, and no content file is written or unpacked from archives.
+
+        Returns:
+            List[StageEstimate]: One estimate per transformer, in order.
+        """
+
+        logging.info(f"Planning pipeline for course {self.course_code}")
+
+        resources = self.extract()
+
+        estimates: List[StageEstimate] = []
+        for transformer in self.transformers:
+            logging.info(f"Planning transformer: {transformer.__class__.__name__} with {len(resources)} resources")
+            resources, estimate = transformer.plan(resources)
+            estimates.append(estimate)
+
+        logging.info(f"Plan for course {self.course_code}:\n{format_plan(estimates)}")
+
+        return estimates
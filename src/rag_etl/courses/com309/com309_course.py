@@ -53,7 +53,7 @@ class COM309Course(BaseCourse):
     def extractors(self) -> List[BaseExtractor]:
         """Single Moodle extractor for COM309 course content."""
         return [
-            MoodleExtractor(moodle_dump_path=self.moodle_dump_path)
+            MoodleExtractor(moodle_dump_path=self.moodle_dump_path, incremental=True)
         ]
 
     @property
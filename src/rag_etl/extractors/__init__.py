@@ -1,7 +1,8 @@
 from rag_etl.extractors.base_extractor import BaseExtractor
-from rag_etl.extractors.moodle import MoodleExtractor
+from rag_etl.extractors.moodle import MoodleExtractor, MoodleWSExtractor
 
 __all__ = [
     "BaseExtractor",
     "MoodleExtractor",
+    "MoodleWSExtractor",
 ]
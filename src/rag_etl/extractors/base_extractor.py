@@ -1,9 +1,27 @@
 from __future__ import annotations
 
+import traceback
+
 from abc import ABC, abstractmethod
-from typing import List
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Callable, Iterable, List, Optional, Tuple
 
 from rag_etl.resources import BaseResource
+from rag_etl.utils.faults import RetryPolicy
+
+
+def _extract_item_safely(extractor: BaseExtractor, item: dict) -> Tuple[Optional[BaseResource], Optional[Exception], Optional[str]]:
+    """
+    Extract a single item, retrying if needed, and return either the resource or the error with its formatted
+    traceback, which is lost when the error is sent back from a worker process. Module-level so that it can run
+    in worker processes.
+    """
+    try:
+        if extractor.retry_policy:
+            return extractor.retry_policy.call(extractor.extract_item, item), None, None
+        return extractor.extract_item(item), None, None
+    except Exception as e:
+        return None, e, traceback.format_exc()
 
 
 class BaseExtractor(ABC):
@@ -15,8 +33,30 @@ class BaseExtractor(ABC):
 
     Each subclass must implement `extract()` to return a list
     of `Resource` instances.
+
+    Extractors producing one resource per raw item (e.g. per link found
+    in an index) can implement `extract_item()` and use `extract_items()`,
+    so that items failing to extract are retried according to `retry_policy`
+    and reported to `on_error` instead of aborting the whole extraction.
+    Items are extracted in a pool of `max_workers` threads (or processes, if
+    `use_processes` is set) when `max_workers` is greater than one, and
+    `item_extracted()` is called back in the main process for each success.
     """
 
+    # Set by the course running the extractor. If `on_error` is None, failures are raised. It is called with the
+    # item, the error and, if known, its formatted traceback
+    retry_policy: Optional[RetryPolicy] = None
+    on_error: Optional[Callable[..., None]] = None
+
+    max_workers: Optional[int] = None
+    use_processes: bool = False
+
+    def __getstate__(self):
+        # Error handlers are typically closures over the course state, and are only called in the main process
+        state = self.__dict__.copy()
+        state.pop('on_error', None)
+        return state
+
     @abstractmethod
     def extract(self) -> List[BaseResource]:
         """
@@ -26,3 +66,52 @@ class BaseExtractor(ABC):
             list[Resource]: The extracted resources ready for transformation.
         """
         raise NotImplementedError
+
+    def extract_item(self, item: dict) -> BaseResource:
+        """
+        Extract a single raw item into a Resource object.
+
+        Args:
+            item (dict): Raw item, as found by the extractor before resolving it.
+
+        Returns:
+            Resource: The extracted resource.
+        """
+        raise NotImplementedError(f"{self.__class__.__name__} does not support extracting single items")
+
+    def item_extracted(self, item: dict, resource: BaseResource) -> None:
+        """
+        Called in the main process after an item is successfully extracted by `extract_items`,
+        e.g. to keep track of intermediate results. Does nothing by default.
+        """
+        pass
+
+    def extract_items(self, items: Iterable[dict]) -> List[BaseResource]:
+        """
+        Extract each raw item with `extract_item`, isolating failures.
+
+        Returns:
+            list[Resource]: The resources of the items successfully extracted.
+        """
+
+        items = list(items)
+
+        if self.max_workers and self.max_workers > 1:
+            executor_class = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+            with executor_class(max_workers=self.max_workers) as executor:
+                results = list(executor.map(_extract_item_safely, [self] * len(items), items, chunksize=16 if self.use_processes else 1))
+        else:
+            results = (_extract_item_safely(self, item) for item in items)
+
+        resources: List[BaseResource] = []
+        for item, (resource, error, formatted_traceback) in zip(items, results):
+            if error is not None:
+                if self.on_error is None:
+                    raise error
+                self.on_error(item, error, formatted_traceback)
+                continue
+
+            self.item_extracted(item, resource)
+            resources.append(resource)
+
+        return resources
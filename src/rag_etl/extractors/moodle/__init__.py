@@ -1,5 +1,7 @@
 from rag_etl.extractors.moodle.moodle_extractor import MoodleExtractor
+from rag_etl.extractors.moodle.moodle_ws_extractor import MoodleWSExtractor
 
 __all__ = [
     "MoodleExtractor",
+    "MoodleWSExtractor",
 ]
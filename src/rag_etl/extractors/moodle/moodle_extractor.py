@@ -1,26 +1,89 @@
 from __future__ import annotations
 
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 from pathlib import Path
 
 from rag_etl.resources import MoodleResource
 from rag_etl.extractors import BaseExtractor
 
-from rag_etl.extractors.moodle.moodle_parser import parse_index, resolve_resource
+from rag_etl.utils.extraction_index import ExtractionIndex
+from rag_etl.utils.archives import get_archive, is_archive, member_path
+
+from rag_etl.extractors.moodle.moodle_parser import parse_index, resolve_resource, split_resource_url
+
+
+def dump_root(moodle_dump_path: str) -> Path:
+    """
+    Root of a Moodle dump, the folder containing index.html. For archives, this is the archive
+    itself or its single top-level folder, if the dump was archived with its folder.
+    """
+
+    if not is_archive(moodle_dump_path):
+        return Path(moodle_dump_path)
+
+    members = get_archive(moodle_dump_path).members
+    if 'index.html' in members:
+        return Path(member_path(moodle_dump_path))
+
+    top_level_indices = [m for m in members if m.count('/') == 1 and m.endswith('/index.html')]
+    if len(top_level_indices) == 1:
+        return Path(member_path(moodle_dump_path, top_level_indices[0].split('/')[0]))
+
+    raise ValueError(f"index.html not found in archive {moodle_dump_path}")
 
 
 class MoodleExtractor(BaseExtractor):
     """
     Extractor for retrieving course materials from Moodle.
+
+    Each resource linked from the index has its own HTML page, parsed with the given `parser`
+    (see `find_main_hrefs`). Pages are resolved in a pool of `max_workers` threads, or processes
+    if `use_processes` is set.
+
+    The dump can also be a zip or tar archive of the dump folder, which is then read without unpacking it:
+    resource paths point inside the archive (see `rag_etl.utils.archives`), and content files are only
+    unpacked when a transformer needs them.
+
+    If `incremental` is set, the parsed index and resource pages are kept in an `ExtractionIndex`,
+    so that only the HTML files that changed since the last extraction are parsed again. It is off by
+    default, as the index is keyed by the dump path and reused across runs.
     """
 
     def __init__(
         self,
         moodle_dump_path: str,
         allowed_href_prefixes: Tuple[str] = ("./File",),
+        parser: str = 'html.parser',
+        max_workers: Optional[int] = None,
+        use_processes: bool = False,
+        incremental: bool = False,
     ) -> None:
-        self.moodle_dump_path = Path(moodle_dump_path)
+        self.moodle_dump_path = dump_root(moodle_dump_path)
         self.allowed_href_prefixes = allowed_href_prefixes
+        self.parser = parser
+        self.max_workers = max_workers
+        self.use_processes = use_processes
+        self.incremental = incremental
+
+        # Extraction index, only set while extracting
+        self._index: Optional[ExtractionIndex] = None
+
+    def __getstate__(self):
+        # The extraction index is only used in the main process
+        state = super().__getstate__()
+        state['_index'] = None
+        return state
+
+    @staticmethod
+    def _page_path(item: dict) -> Optional[str]:
+        """Path of the HTML page of a local resource relative to the dump, None if the item is not local."""
+        if not item['url'].startswith('./'):
+            return None
+        try:
+            folder, filename = split_resource_url(item['url'])
+        except ValueError:
+            return None
+        return f"{folder}/{filename}"
 
     def extract(self) -> List[MoodleResource]:
         """
@@ -30,24 +93,65 @@ class MoodleExtractor(BaseExtractor):
             List[MoodleResource]: List of raw Resources.
         """
 
-        # Parse index file
-        resources = parse_index(self.moodle_dump_path, self.allowed_href_prefixes)
-
-        # Replace local references with actual Moodle urls
-        resources = [resolve_resource(resource, self.moodle_dump_path) for resource in resources]
-
-        # Convert dicts to MoodleResource instances
-        resources = [
-            MoodleResource(
-                section_title=resource['section_title'],
-                section_text=resource['section_text'],
-                title=resource['title'],
-                url=resource['url'],
-                path=resource['path'],
-                source='moodle',
-                mime_type=resource['mime_type'],
-            )
-            for resource in resources
-        ]
-
-        return resources
+        index = None
+        if self.incremental:
+            index = ExtractionIndex(self.__class__.__name__, self.moodle_dump_path, variant=repr(self.allowed_href_prefixes))
+
+        # Parse index file, unless unchanged since the last extraction
+        items = index.get('index.html') if index else None
+        if items is None:
+            items = parse_index(self.moodle_dump_path, self.allowed_href_prefixes)
+            if index:
+                index.set('index.html', items)
+
+        # Attach the result of the resource pages that did not change since the last extraction
+        if index:
+            items = [self._with_known_page(index, item) for item in items]
+
+        # Resolve each item into a MoodleResource
+        self._index = index
+        try:
+            return self.extract_items(items)
+        finally:
+            self._index = None
+            if index:
+                index.save()
+
+    def _with_known_page(self, index: ExtractionIndex, item: dict) -> dict:
+        page_path = self._page_path(item)
+        page = index.get(page_path) if page_path else None
+        return {**item, 'page': page} if page is not None else item
+
+    def item_extracted(self, item: dict, resource: MoodleResource) -> None:
+        """Store the result of the resource page in the extraction index, if it was parsed."""
+
+        if self._index is None or 'page' in item:
+            return
+
+        page_path = self._page_path(item)
+        if page_path is not None:
+            self._index.set(page_path, {'url': resource.url, 'path': resource.path})
+
+    def extract_item(self, item: dict) -> MoodleResource:
+        """
+        Resolve a single resource found in the index file.
+
+        Returns:
+            MoodleResource: Raw Resource.
+        """
+
+        # Replace local references with actual Moodle urls. Work on a copy so that the original item can be retried
+        resource = dict(item)
+        page = resource.pop('page', None)
+        resource = resolve_resource(resource, self.moodle_dump_path, self.parser, page)
+
+        # Convert dict to MoodleResource instance
+        return MoodleResource(
+            section_title=resource['section_title'],
+            section_text=resource['section_text'],
+            title=resource['title'],
+            url=resource['url'],
+            path=resource['path'],
+            source='moodle',
+            mime_type=resource['mime_type'],
+        )
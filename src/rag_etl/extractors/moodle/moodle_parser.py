@@ -1,105 +1,330 @@
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 from pathlib import Path
+from collections import Counter
+from html.parser import HTMLParser
 
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 
 import rag_etl.utils.mime_types as mt
 
+from rag_etl.utils.archives import open_text, read_text
 
-def parse_index(moodle_dump_path: Path, allowed_href_prefixes: Tuple[str]) -> List[dict]:
-    """Parse sections and local links from index.html. Returns a list of dictionaries with the resource information."""
 
-    # Open and read the base HTML file
-    index = moodle_dump_path / 'index.html'
-    html = index.read_text(encoding="utf-8")
+# Elements that are never explicitly closed, as in BeautifulSoup's HTML tree builder
+VOID_ELEMENTS = frozenset({
+    'area', 'base', 'basefont', 'bgsound', 'br', 'col', 'command', 'embed', 'frame', 'hr', 'image', 'img',
+    'input', 'isindex', 'keygen', 'link', 'menuitem', 'meta', 'nextid', 'param', 'source', 'spacer', 'track', 'wbr',
+})
+
+# Elements whose strings are not part of the text of their ancestors, only of their own, as in BeautifulSoup's
+# `get_text` (which gives them their own string classes)
+NON_TEXT_ELEMENTS = frozenset({'script', 'style', 'template', 'rt', 'rp'})
+
+
+class _Section:
+    """State of a section while walking the index: an <h3> and its following siblings."""
+
+    __slots__ = ('depth', 'parent_id', 'h3_id', 'sibling_id', 'sibling_valid', 'title_parts', 'texts', 'links')
+
+    def __init__(self, depth: int, parent_id: int, h3_id: int):
+        self.depth = depth              # position of the <h3> (and its siblings) in the stack of open elements
+        self.parent_id = parent_id
+        self.h3_id = h3_id
+        self.sibling_id = h3_id         # sibling currently open at `depth`
+        self.sibling_valid = False      # whether its content belongs to the section (i.e. it is not the <h3> nor a script)
+        self.title_parts: List[str] = []
+        self.texts: List[str] = []
+        self.links: List[list] = []     # [href, title parts] of each allowed link, in document order
+
+
+class IndexWalker(HTMLParser):
+    """
+    Single-pass, event-based walker over a Moodle index.html.
 
-    # Parse with BeautifulSoup
-    soup = BeautifulSoup(html, "html.parser")
+    Each <h3> starts a section, made of the text and links of the elements following it under the same
+    parent, up to the next <h3> sibling. This is the same as iterating over `h3.find_next_siblings()`
+    with BeautifulSoup, but every element is visited once, so time is linear in the size of the page and
+    the page does not need to be kept in memory, as it can be fed in chunks.
 
-    # Initialise list of resources
-    resources = []
+    Texts are split into strings as BeautifulSoup does, including for CDATA sections, redundant end tags of
+    void elements (e.g. `<br>a</br>b` is a single string) and the text of <template>, <rt> and <rp> siblings.
+    This was checked against BeautifulSoup on randomly generated malformed markup only, so differences may
+    remain for other constructs.
+    """
 
-    # Iterate over all headers
-    for h in soup.find_all('h3'):
-        section_title = h.get_text(strip=True)
+    def __init__(self, allowed_href_prefixes: Tuple[str]):
+        super().__init__(convert_charrefs=True)
+        self.allowed_href_prefixes = allowed_href_prefixes
 
-        texts = []
-        section_resources = []
+        self.stack: List[Tuple[str, int]] = []     # open elements, as (name, id)
+        self.next_id = 0
+        self.containers: List[str] = []             # open elements in NON_TEXT_ELEMENTS, by name
+        self.closed_void_elements = Counter()       # void elements that may still get a (redundant) end tag, by name
+        self.data: List[str] = []                   # pending text, flushed on the next non-text event
 
-        # Iterate over all siblings of the header until the next one
-        for sib in h.find_next_siblings():
-            # Finish if sibling is next header
-            if sib.name == 'h3':
-                break
+        self.sections: List[_Section] = []          # all sections, in document order
+        self.active: List[_Section] = []            # sections whose parent is still open
+        self.open_links: Dict[int, list] = {}       # open <a> elements, by id, with the [href, title parts] they fill
 
-            # Skip irrelevant siblings
-            if sib.name in {'script', 'style'}:
+    ################################################################
+
+    def _flush(self, cdata: bool = False) -> None:
+        if not self.data:
+            return
+
+        text = ''.join(self.data).strip()
+        self.data = []
+
+        if not text:
+            return
+
+        # Strings belong to the innermost open element in NON_TEXT_ELEMENTS, if any, and then only count for the
+        # text of an element with the same name. CDATA sections always count, except for such elements
+        container = self.containers[-1] if self.containers and not cdata else None
+
+        for section in self.active:
+            if len(self.stack) <= section.depth:
                 continue
 
-            # Gather partial texts for each sibling
-            text = sib.get_text(separator='\n', strip=True)
-            if text:
-                texts.append(text)
+            name, element_id = self.stack[section.depth]
+            if name in NON_TEXT_ELEMENTS and name != container or name not in NON_TEXT_ELEMENTS and container is not None:
+                continue
 
-            # Gather all links in sibling
-            for a in sib.find_all('a', href=True):
-                href = a['href']
+            if element_id == section.h3_id:
+                section.title_parts.append(text)
+            elif section.sibling_valid and element_id == section.sibling_id:
+                section.texts.append(text)
 
-                # Keep only allowed href prefixes
-                if not href.startswith(allowed_href_prefixes):
-                    continue
+        if container is None:
+            for link in self.open_links.values():
+                link[1].append(text)
 
-                section_resources.append({'url': href, 'title': a.get_text(strip=True)})
+    def _push(self, name: str, attrs) -> None:
+        element_id = self.next_id
+        self.next_id += 1
 
-        # Now we have the full section text
-        section_text = '\n'.join(texts).strip()
+        depth = len(self.stack)
+        parent_id = self.stack[-1][1] if self.stack else -1
 
-        # Iterate over the resources found in this section and add the section details
-        for resource in section_resources:
-            resources.append({
-                'section_title': section_title,
-                'section_text': section_text,
-                'url': resource['url'],
-                'title': resource['title'],
-            })
+        if name == 'h3':
+            # A new <h3> ends the sections started by its previous siblings
+            self.active = [s for s in self.active if s.parent_id != parent_id]
+            section = _Section(depth, parent_id, element_id)
+            self.sections.append(section)
+            self.active.append(section)
 
-    return resources
+        for section in self.active:
+            if section.depth == depth and section.h3_id != element_id:
+                section.sibling_id = element_id
+                section.sibling_valid = name not in ('script', 'style')
 
+        if name == 'a':
+            attrs = dict(attrs)
+            href = attrs.get('href')
+            if href is not None and href.startswith(self.allowed_href_prefixes):
+                link = None
+                for section in self.active:
+                    # Only links strictly inside a sibling count, as with `sibling.find_all('a')`
+                    if depth > section.depth and section.sibling_valid and self.stack[section.depth][1] == section.sibling_id:
+                        link = link or [href, []]
+                        section.links.append(link)
+                if link:
+                    self.open_links[element_id] = link
 
-def resolve_resource(resource: dict, moodle_dump_path: Path) -> dict:
-    """Resolve the Moodle URL and local file path for a single resource, represented by a dictionary."""
+        self.stack.append((name, element_id))
+        if name in NON_TEXT_ELEMENTS:
+            self.containers.append(name)
 
-    if not resource['url'].startswith('./'):
-        return resource
+    def _pop_to(self, name: str) -> None:
+        # Pop up to and including the most recent element with the given name, if any
+        if not any(open_name == name for open_name, _ in self.stack):
+            return
+
+        while True:
+            popped_name, popped_id = self.stack.pop()
+
+            if popped_name in NON_TEXT_ELEMENTS:
+                self.containers.pop()
+
+            self.open_links.pop(popped_id, None)
+            self.active = [s for s in self.active if s.parent_id != popped_id]
+
+            if popped_name == name:
+                return
+
+    ################################################################
+
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        self._push(tag, attrs)
+
+        if tag in VOID_ELEMENTS:
+            self._pop_to(tag)
+            self.closed_void_elements[tag] += 1
+
+    def handle_startendtag(self, tag, attrs):
+        self._flush()
+        self._push(tag, attrs)
+        self._pop_to(tag)
+
+    def handle_endtag(self, tag):
+        # Redundant end tags of void elements are ignored altogether, so they do not split the text around them
+        if self.closed_void_elements[tag] > 0:
+            self.closed_void_elements[tag] -= 1
+            return
+
+        self._flush()
+        self._pop_to(tag)
+
+    def handle_data(self, data):
+        self.data.append(data)
+
+    def handle_comment(self, data):
+        self._flush()
+
+    def handle_decl(self, decl):
+        self._flush()
+
+    def handle_pi(self, data):
+        self._flush()
+
+    def unknown_decl(self, data):
+        self._flush()
+
+        # CDATA sections are strings of their own
+        if data.upper().startswith('CDATA['):
+            self.data.append(data[len('CDATA['):])
+            self._flush(cdata=True)
+
+    def close(self):
+        super().close()
+        self._flush()
 
-    # Extract resource index path. Fail if not exactly './<folder>/<filename>.html'
-    url_parts = resource['url'].split('/')
+    ################################################################
+
+    def resources(self) -> List[dict]:
+        """Return the resources found, with their section details."""
+
+        resources = []
+        for section in self.sections:
+            section_title = ''.join(section.title_parts)
+            section_text = '\n'.join(section.texts)
+
+            for href, title_parts in section.links:
+                resources.append({
+                    'section_title': section_title,
+                    'section_text': section_text,
+                    'url': href,
+                    'title': ''.join(title_parts),
+                })
+
+        return resources
+
+
+def parse_index(moodle_dump_path: Path, allowed_href_prefixes: Tuple[str], chunk_size: int = 1 << 16) -> List[dict]:
+    """Parse sections and local links from index.html. Returns a list of dictionaries with the resource information."""
+
+    walker = IndexWalker(allowed_href_prefixes)
+
+    # Stream the base HTML file through the walker
+    index = moodle_dump_path / 'index.html'
+    with open_text(index) as f:
+        for chunk in iter(lambda: f.read(chunk_size), ''):
+            walker.feed(chunk)
+    walker.close()
+
+    return walker.resources()
+
+
+def find_main_hrefs(html: str, parser: str = 'html.parser') -> Optional[List[str]]:
+    """
+    Return the href of every link in the (first) <main> element of an HTML page, or None if there is no <main>.
+
+    Supported parsers:
+      - 'html.parser': BeautifulSoup with the pure-Python parser, only building the <main> subtree
+      - 'lxml': lxml.html, considerably faster
+      - 'selectolax': selectolax (Lexbor backend), fastest
+    """
+
+    if parser == 'html.parser':
+        soup = BeautifulSoup(html, "html.parser", parse_only=SoupStrainer('main'))
+        main = soup.find('main')
+        if main is None:
+            return None
+        return [a['href'] for a in main.find_all('a', href=True)]
+
+    if parser == 'lxml':
+        import lxml.html
+        mains = lxml.html.document_fromstring(html).xpath('//main')
+        if not mains:
+            return None
+        return [a.get('href') for a in mains[0].iter('a') if a.get('href') is not None]
+
+    if parser == 'selectolax':
+        from selectolax.lexbor import LexborHTMLParser
+        main = LexborHTMLParser(html).css_first('main')
+        if main is None:
+            return None
+        return [a.attributes['href'] or '' for a in main.css('a[href]')]
+
+    raise ValueError(f"Unknown parser '{parser}'. Available: html.parser, lxml, selectolax")
+
+
+def split_resource_url(url: str) -> Tuple[str, str]:
+    """Split a local resource URL './<folder>/<filename>.html' into folder and filename. Fail if it has another shape."""
+
+    url_parts = url.split('/')
     if len(url_parts) != 3:
-        raise ValueError(f"Unexpected URL shape {resource['url']}; expected './<folder>/<filename>.html'")
+        raise ValueError(f"Unexpected URL shape {url}; expected './<folder>/<filename>.html'")
     _, folder, filename = url_parts
 
+    return folder, filename
+
+
+def parse_resource_page(moodle_dump_path: Path, folder: str, filename: str, parser: str = 'html.parser') -> dict:
+    """
+    Parse the HTML page of a single resource. Returns a dictionary with the Moodle URL ('url') and the
+    local file path ('path') of the resource, each only if found in the page.
+    """
+
     # Open and read the HTML file for the particular resource
     resource_index = moodle_dump_path / folder / filename
-    resource_html = resource_index.read_text(encoding="utf-8")
+    resource_html = read_text(resource_index)
 
-    # Parse with BeautifulSoup
-    soup = BeautifulSoup(resource_html, "html.parser")
-
-    # Extract the <main> element from the HTML, fail if not present
-    main = soup.find('main')
-    if main is None:
+    # Extract the links in the <main> element from the HTML, fail if not present
+    hrefs = find_main_hrefs(resource_html, parser)
+    if hrefs is None:
         raise RuntimeError(f"<main> not found in {resource_index}")
 
     # Find the correct links (to Moodle and to the local file)
-    for a in main.find_all('a', href=True):
-        href = a['href']
-
+    page = {}
+    for href in hrefs:
         if href.startswith('https://moodle.epfl.ch'):
             # The correct url for the file is the actual Moodle link
-            resource['url'] = href
+            page['url'] = href
         elif href.startswith('content/'):
             # The path of the file is the one under content/
-            resource['path'] = f"{moodle_dump_path}/{folder}/{href}"
+            page['path'] = f"{moodle_dump_path}/{folder}/{href}"
+
+    return page
+
+
+def resolve_resource(resource: dict, moodle_dump_path: Path, parser: str = 'html.parser', page: Optional[dict] = None) -> dict:
+    """
+    Resolve the Moodle URL and local file path for a single resource, represented by a dictionary.
+    The result of `parse_resource_page` can be given as `page` if already known, to avoid parsing it again.
+    """
+
+    if not resource['url'].startswith('./'):
+        return resource
+
+    # Extract resource index path
+    folder, filename = split_resource_url(resource['url'])
+
+    # Replace local references with the links in the resource page
+    if page is None:
+        page = parse_resource_page(moodle_dump_path, folder, filename, parser)
+    resource.update(page)
 
     # Clean up the link text (remove Moodle resource type): e.g. "examen 2018 (File)" -> "examen 2018"
     moodle_resource_type = folder.split('_')[0]
@@ -0,0 +1,86 @@
+import os
+import json
+import shutil
+
+from typing import Any
+from pathlib import Path
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+
+class MoodleWSError(RuntimeError):
+    """Error reported by the Moodle web service."""
+
+
+def call_ws(base_url: str, token: str, function: str, timeout: float = 60, **params) -> Any:
+    """
+    Call a function of the Moodle REST web service and return its decoded JSON response.
+
+    Args:
+        base_url: Base URL of the Moodle instance, e.g. 'https://moodle.epfl.ch'.
+        token: Web service token.
+        function: Web service function, e.g. 'core_course_get_contents'.
+        timeout: Timeout of the request, in seconds.
+        **params: Parameters of the function.
+    """
+
+    query = urlencode({'wstoken': token, 'wsfunction': function, 'moodlewsrestformat': 'json', **params})
+
+    with urlopen(f"{base_url}/webservice/rest/server.php?{query}", timeout=timeout) as response:
+        data = json.load(response)
+
+    # Moodle reports errors in the body of successful responses
+    if isinstance(data, dict) and 'exception' in data:
+        raise MoodleWSError(f"{function} failed with {data.get('errorcode')}: {data.get('message')}")
+
+    return data
+
+
+def validators_path(path: Path) -> Path:
+    """Path of the sidecar file storing the HTTP validators (ETag, Last-Modified) of a downloaded file."""
+    return path.with_name(f".{path.name}.validators.json")
+
+
+def download_file(file_url: str, token: str, path: Path, timeout: float = 60) -> bool:
+    """
+    Download a Moodle file to `path`, unless the local copy is still up to date.
+
+    If the file was downloaded before, the request is conditional on its ETag and Last-Modified
+    validators, so that unchanged files are not transferred again.
+
+    Returns:
+        bool: Whether the file was downloaded, False if the local copy was up to date.
+    """
+
+    # Files are only served to authenticated requests
+    separator = '&' if '?' in file_url else '?'
+    request = Request(f"{file_url}{separator}{urlencode({'token': token})}")
+
+    # Make the request conditional if the file is already in the store
+    sidecar_path = validators_path(path)
+    if path.exists() and sidecar_path.exists():
+        validators = json.loads(sidecar_path.read_text(encoding='utf-8'))
+        if validators.get('etag'):
+            request.add_header('If-None-Match', validators['etag'])
+        if validators.get('last_modified'):
+            request.add_header('If-Modified-Since', validators['last_modified'])
+
+    try:
+        with urlopen(request, timeout=timeout) as response:
+            # Download into a temporary file first, so that interrupted downloads never replace a good copy
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f".{path.name}.part")
+            with open(tmp_path, 'wb') as f:
+                shutil.copyfileobj(response, f)
+            os.replace(tmp_path, path)
+
+            validators = {'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified')}
+    except HTTPError as e:
+        if e.code == 304:
+            return False
+        raise
+
+    sidecar_path.write_text(json.dumps(validators), encoding='utf-8')
+
+    return True
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+
+from typing import List, Optional, Sequence
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+from rag_etl.config import CONFIG
+from rag_etl.resources import MoodleResource
+from rag_etl.extractors import BaseExtractor
+
+from rag_etl.extractors.moodle.moodle_ws_client import call_ws, download_file
+
+import rag_etl.utils.mime_types as mt
+
+
+def _safe_relative_path(*parts: str) -> Path:
+    """Join path parts given by the server, refusing any that would escape the download folder."""
+    path = Path(*(part.strip('/') for part in parts if part.strip('/')))
+    if path.is_absolute() or '..' in path.parts:
+        raise ValueError(f"Unsafe file path {path}")
+    return path
+
+
+class MoodleWSExtractor(BaseExtractor):
+    """
+    Extractor for retrieving course materials from a live Moodle instance, through its REST web service.
+
+    Sections and modules are listed with `core_course_get_contents`, and the files of the modules of the
+    given `modnames` are downloaded to `download_path`, with at most `max_concurrency` downloads at a time.
+    Downloads are conditional on the ETag and Last-Modified validators of the previous download, so that
+    unchanged files are never transferred again. The resources are the same as with `MoodleExtractor`,
+    except that the section text is the section summary alone, without the list of activities of the page.
+
+    The web service token defaults to MOODLE_WS_TOKEN in the config. Any other `base_url`
+    (e.g. a local stub server) can be used instead of the EPFL Moodle.
+    """
+
+    def __init__(
+        self,
+        course_id: int,
+        download_path: str,
+        base_url: str = 'https://moodle.epfl.ch',
+        token: Optional[str] = None,
+        modnames: Sequence[str] = ('resource',),
+        max_concurrency: int = 8,
+        timeout: float = 60,
+    ) -> None:
+        self.course_id = course_id
+        self.download_path = Path(download_path)
+        self.base_url = base_url.rstrip('/')
+        self.token = token or CONFIG.get('MOODLE_WS_TOKEN')
+        self.modnames = tuple(modnames)
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+
+    def list_items(self) -> List[dict]:
+        """
+        List the files of the course with the web service, one item per file, without downloading them.
+
+        Returns:
+            List[dict]: Items with the section and module details of each file, and where to download it from and to.
+        """
+
+        sections = call_ws(self.base_url, self.token, 'core_course_get_contents', timeout=self.timeout, courseid=self.course_id)
+
+        items = []
+        for section in sections:
+            # Section summaries are HTML, keep their text only
+            section_text = BeautifulSoup(section.get('summary') or '', 'html.parser').get_text(separator='\n', strip=True)
+
+            for module in section.get('modules', []):
+                if module.get('modname') not in self.modnames:
+                    continue
+
+                files = [content for content in module.get('contents', []) if content.get('type') == 'file']
+                for content in files:
+                    path = self.download_path / f"{module['modname']}_{module['id']}" / _safe_relative_path(content.get('filepath', '/'), content['filename'])
+
+                    items.append({
+                        'section_title': section.get('name', ''),
+                        'section_text': section_text,
+                        # Modules with several files (e.g. folders) get a resource per file
+                        'title': module['name'] if len(files) == 1 else f"{module['name']} > {content['filename']}",
+                        'url': module.get('url', ''),
+                        'file_url': content['fileurl'],
+                        'path': str(path),
+                        'mime_type': content.get('mimetype'),
+                    })
+
+        return items
+
+    def download_item(self, item: dict) -> bool:
+        """Download the file of an item, unless unchanged. Returns whether it was downloaded."""
+        if self.retry_policy:
+            return self.retry_policy.call(download_file, item['file_url'], self.token, Path(item['path']), self.timeout)
+        return download_file(item['file_url'], self.token, Path(item['path']), self.timeout)
+
+    async def _download_items(self, items: List[dict]) -> list:
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def download(item):
+            async with semaphore:
+                return await asyncio.to_thread(self.download_item, item)
+
+        return await asyncio.gather(*(download(item) for item in items), return_exceptions=True)
+
+    def extract(self) -> List[MoodleResource]:
+        """
+        Extract resources for this course from Moodle, downloading new and changed files.
+
+        Returns:
+            List[MoodleResource]: List of raw Resources.
+        """
+
+        items = self.list_items()
+
+        # Download all files concurrently
+        results = asyncio.run(self._download_items(items))
+
+        resources = []
+        for item, result in zip(items, results):
+            if isinstance(result, Exception):
+                if self.on_error is None:
+                    raise result
+                self.on_error(item, result)
+                continue
+
+            resources.append(self._to_resource(item))
+
+        downloaded = sum(result is True for result in results)
+        logging.info(f"Downloaded {downloaded} files, {len(resources) - downloaded} up to date, {len(items) - len(resources)} failed")
+
+        return resources
+
+    def extract_item(self, item: dict) -> MoodleResource:
+        """
+        Download the file of a single item and build its resource.
+
+        Returns:
+            MoodleResource: Raw Resource.
+        """
+        self.download_item(item)
+        return self._to_resource(item)
+
+    def _to_resource(self, item: dict) -> MoodleResource:
+        return MoodleResource(
+            section_title=item['section_title'],
+            section_text=item['section_text'],
+            title=item['title'],
+            url=item['url'],
+            path=item['path'],
+            source='moodle',
+            mime_type=mt.guess_mime_type(item['path']) or item['mime_type'],
+        )
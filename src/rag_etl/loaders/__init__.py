@@ -1,9 +1,17 @@
 from rag_etl.loaders.base_loader import BaseLoader
 from rag_etl.loaders.dummy_loader import DummyLoader
 from rag_etl.loaders.content_metadata_loader import ContentMetadataLoader
+from rag_etl.loaders.sqlite_index_loader import SQLiteIndexLoader
+from rag_etl.loaders.vector_index_loader import VectorIndexLoader
+from rag_etl.loaders.parquet_loader import ParquetLoader
+from rag_etl.loaders.bundle_loader import BundleLoader
 
 __all__ = [
     "BaseLoader",
     "DummyLoader",
     "ContentMetadataLoader",
+    "SQLiteIndexLoader",
+    "VectorIndexLoader",
+    "ParquetLoader",
+    "BundleLoader",
 ]
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import json
+import hashlib
+
+from typing import Dict, Optional, Sequence
+
+import logging
+
+from rag_etl.loaders import BaseLoader
+from rag_etl.resources import BaseResource
+
+from rag_etl.utils.archives import mirror_path
+from rag_etl.utils.bundles import BundleWriter, manifest_path
+
+
+class BundleLoader(BaseLoader):
+    """
+    Loader that ships the resources as a single bundle file, a tar, zstd-compressed tar or zip according to the
+    suffix of `bundle_path` (see `BundleWriter`), instead of thousands of small files. The bundle holds the same
+    `content` and `metadata` files as written by `ContentMetadataLoader`, streamed into it without being staged
+    on disk, plus a manifest with the offset of each file, so that consumers can read single documents
+    (see `BundleReader`).
+
+    If `delta_from` is the path of a previous bundle, only the files whose hash changed since it are added, and
+    the manifest lists the others as held by the previous bundle, along with the files deleted since. Delta
+    bundles are read with the previous bundles next to them.
+
+    As for `ContentMetadataLoader`, content paths are relative to `output_path`, and must be placed before
+    loaders rewriting the resource paths.
+    """
+
+    def __init__(
+        self,
+        output_path: str,
+        course_info: dict,
+        bundle_path: str,
+        delta_from: Optional[str] = None,
+        level: int = 3,
+    ):
+        self.output_path = output_path
+        self.course_info = course_info
+        self.bundle_path = bundle_path
+        self.delta_from = delta_from
+        self.level = level
+
+    def load(self, resources: Sequence[BaseResource]) -> None:
+        # Imported here so that the cache folder is only required when actually used
+        from rag_etl.utils.cache import hash_file
+
+        logging.debug(f"Writing bundle {self.bundle_path}")
+
+        output_path = Path(self.output_path)
+
+        # Files of the previous bundle, with their hash, to only add the changed ones
+        base = json.loads(manifest_path(self.delta_from).read_text(encoding='utf-8')) if self.delta_from else None
+        base_files: Dict[str, dict] = base['files'] if base else {}
+
+        # Collect content files and metadata, with paths as in the content folder. Files inside archives are placed as if the archive was unpacked
+        content_files: Dict[str, str] = {}
+        metadata: Dict[str, list] = {}
+        for resource in resources:
+            name = (Path("content") / mirror_path(resource.path).relative_to(output_path)).as_posix()
+            content_files[name] = resource.path
+            metadata.setdefault(resource.source, []).append({**resource.metadata_dict(), "path": name})
+
+        metadata_files = {
+            f"metadata/{source}.json": json.dumps({"course_info": self.course_info, "documents": documents}, ensure_ascii=False, indent=2).encode('utf-8')
+            for source, documents in metadata.items()
+        }
+
+        unchanged: Dict[str, dict] = {}
+        with BundleWriter(self.bundle_path, level=self.level) as writer:
+            for name, path in content_files.items():
+                sha256 = hash_file(path)
+                if base_files.get(name, {}).get('sha256') == sha256:
+                    unchanged[name] = base_files[name]
+                else:
+                    writer.add_file(name, path, sha256)
+
+            for name, data in metadata_files.items():
+                sha256 = hashlib.sha256(data).hexdigest()
+                if base_files.get(name, {}).get('sha256') == sha256:
+                    unchanged[name] = base_files[name]
+                else:
+                    writer.add_bytes(name, data, sha256)
+
+            deleted = sorted(set(base_files) - set(content_files) - set(metadata_files))
+
+            writer.close({
+                "course_info": self.course_info,
+                "base": base['bundle'] if base else None,
+                "deleted": deleted,
+                "files": unchanged,
+            })
+
+        logging.info(f"Wrote {len(writer.files)} files to {self.bundle_path}, {len(unchanged)} unchanged in previous bundles, {len(deleted)} deleted")
@@ -1,17 +1,21 @@
 from __future__ import annotations
 
-import shutil
 from pathlib import Path
 
 import json
 
-from typing import Sequence
+from typing import Optional, Sequence
 
 import logging
 
 from rag_etl.loaders import BaseLoader
 from rag_etl.resources import BaseResource
 
+from rag_etl.utils.archives import mirror_path
+from rag_etl.utils.sync import sync_files, delete_orphans, reuse_unchanged
+from rag_etl.utils.generations import current_generation, start_generation, publish_generation
+from rag_etl.utils.jsonl_shards import ShardedJSONLWriter, SHARD_DOCUMENTS, remove_shards
+
 
 class ContentMetadataLoader(BaseLoader):
     """
@@ -19,52 +23,147 @@ class ContentMetadataLoader(BaseLoader):
     containing the actual content files and the metadata files respectively.
 
     The result is ready to be processed by the chatbotpipelines scripts.
+
+    Content files are synced like rsync does: files whose destination has the same size and modification
+    time (or the same hash, if `checksum`) are skipped, and the others are placed in a pool of `max_workers`
+    threads, copied, hard linked or reflinked according to `mode` (see `sync_file`). If `delete_orphans`,
+    content files of resources no longer loaded are deleted.
+
+    With `metadata_format='json'`, the metadata of each source is a single `metadata/<source>.json` file.
+    With `metadata_format='jsonl'`, it is streamed into JSON lines shards of `shard_documents` documents,
+    optionally gzip-compressed, along with a `metadata/<source>.index.json` file with the course info and
+    the offset of each document (see `ShardedJSONLWriter`). `encoder` can be 'orjson' for faster encoding.
+
+    If `atomic`, each load writes a new generation of the output in a staging folder, and publishes it by
+    atomically flipping a symlink once complete (see `rag_etl.utils.generations`). The `content` and `metadata`
+    folders are then symlinks to the current generation, so that consumers never see a half-written output,
+    and a failed load leaves the previous generation in place. Files unchanged since the previous generation
+    are hard linked from it rather than copied, so that staging costs little. The `keep_generations` newest
+    generations are kept. Orphans never make it to a new generation, whatever `delete_orphans`.
     """
 
-    def __init__(self, output_path: str, course_info: dict):
+    def __init__(
+        self,
+        output_path: str,
+        course_info: dict,
+        mode: str = 'copy',
+        checksum: bool = False,
+        max_workers: int = 8,
+        delete_orphans: bool = False,
+        metadata_format: str = 'json',
+        shard_documents: int = SHARD_DOCUMENTS,
+        compression: Optional[str] = None,
+        encoder: str = 'json',
+        atomic: bool = False,
+        keep_generations: int = 2,
+    ):
+        if metadata_format not in ('json', 'jsonl'):
+            raise ValueError(f"Unknown metadata format '{metadata_format}'. Available: json, jsonl")
+
         self.output_path = output_path
         self.course_info = course_info
+        self.mode = mode
+        self.checksum = checksum
+        self.max_workers = max_workers
+        self.delete_orphans = delete_orphans
+        self.metadata_format = metadata_format
+        self.shard_documents = shard_documents
+        self.compression = compression
+        self.encoder = encoder
+        self.atomic = atomic
+        self.keep_generations = keep_generations
+
+    def _open_writer(self, metadata_path: Path, source: str) -> ShardedJSONLWriter:
+        return ShardedJSONLWriter(
+            metadata_path,
+            source,
+            header={"course_info": self.course_info},
+            shard_documents=self.shard_documents,
+            compression=self.compression,
+            encoder=self.encoder,
+        )
 
     def load(self, resources: Sequence[BaseResource]) -> None:
         logging.debug(f"Populating content and metadata folders at {self.output_path}")
 
-        # Create paths and folders if needed
+        # Create paths and folders if needed. Atomic loads write a new generation, next to the current one
         output_path = Path(self.output_path)
-        content_path = output_path / "content"
-        metadata_path = output_path / "metadata"
+        if self.atomic:
+            previous_path = current_generation(output_path) or output_path
+            generation_path = start_generation(output_path)
+        else:
+            generation_path = output_path
+
+        content_path = generation_path / "content"
+        metadata_path = generation_path / "metadata"
 
         content_path.mkdir(parents=True, exist_ok=True)
         metadata_path.mkdir(parents=True, exist_ok=True)
 
-        # Iterate over resources, create content files and keep track of metadata files
+        # Iterate over resources, collect content files to sync and keep track of metadata files
         metadata = {}
+        writers = {}
+        content_files = []
         for resource in resources:
             # Initialise metadata for the given source
             if resource.source not in metadata:
                 metadata[resource.source] = []
+                if self.metadata_format == 'jsonl':
+                    writers[resource.source] = self._open_writer(metadata_path, resource.source)
 
-            # Build actual location of the content file
-            resource_output_path = content_path / Path(resource.path).relative_to(output_path)
-            resource_output_path.parent.mkdir(parents=True, exist_ok=True)
-
-            # Copy actual file
-            shutil.copy(resource.path, resource_output_path.parent)
+            # Build actual location of the content file. Files inside archives are placed as if the archive was unpacked
+            relative_path = mirror_path(resource.path).relative_to(output_path)
+            resource_output_path = content_path / relative_path
+            content_files.append((resource.path, resource_output_path))
 
             # Make path relative to base path
-            resource.path = str(content_path.relative_to(output_path) / Path(resource.path).relative_to(output_path))
+            resource.path = str(Path(content_path.name) / relative_path)
+
+            # Store metadata, or stream it to the shards
+            if self.metadata_format == 'jsonl':
+                writers[resource.source].write(resource.metadata_dict())
+            else:
+                metadata[resource.source].append(resource.metadata_dict())
 
-            # Store metadata
-            metadata[resource.source].append(resource.metadata_dict())
+        # Reuse the unchanged files of the previous generation
+        if self.atomic and (previous_path / "content").is_dir():
+            reused = reuse_unchanged(content_files, content_path, previous_path / "content", self.checksum)
+            logging.info(f"Reused {reused} content files from the previous generation")
 
-        for source, source_metadata in metadata.items():
+        # Sync actual files, streaming them out of their archive if needed
+        placed, up_to_date = sync_files(content_files, self.mode, self.checksum, self.max_workers)
+        logging.info(f"Synced content files: {placed} placed, {up_to_date} up to date")
+
+        if self.delete_orphans:
+            deleted = delete_orphans(content_path, [destination for _, destination in content_files])
+            logging.info(f"Deleted {deleted} orphaned content files")
+
+        # Finish metadata shards, writing their indices once the content is in place
+        for source, writer in writers.items():
+            writer.close()
+
+            # Remove the metadata file of loads in the other format
+            (metadata_path / source).with_suffix('.json').unlink(missing_ok=True)
+
+        for source, source_metadata in (metadata.items() if self.metadata_format == 'json' else []):
             # Build path for the metadata file for this source
             source_metadata_path = (metadata_path / source).with_suffix('.json')
 
+            # Remove the shards of loads in the other format
+            remove_shards(metadata_path, source)
+
             # Build full metadata in final format
             full_source_metadata = {
                 "course_info": self.course_info,
                 "documents": source_metadata
             }
 
-            # Write full metadata into metadata file
-            source_metadata_path.write_text(json.dumps(full_source_metadata, ensure_ascii=False, indent=2))
+            # Write full metadata into metadata file, unless unchanged
+            text = json.dumps(full_source_metadata, ensure_ascii=False, indent=2)
+            if not source_metadata_path.exists() or source_metadata_path.read_text() != text:
+                source_metadata_path.write_text(text)
+
+        # Publish the new generation, now complete
+        if self.atomic:
+            generation_path = publish_generation(output_path, generation_path, ["content", "metadata"], self.keep_generations)
+            logging.info(f"Published {generation_path}")
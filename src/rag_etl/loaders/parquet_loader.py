@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import json
+import hashlib
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import fields
+from typing import List, Optional, Sequence, get_type_hints
+
+import logging
+
+import rag_etl.utils.mime_types as mt
+
+from rag_etl.loaders import BaseLoader
+from rag_etl.resources import BaseResource, ResourceBatch
+
+from rag_etl.utils.archives import open_binary
+
+
+# Mime types whose content is stored as text in the `content` column
+TEXT_MIME_TYPES = (mt.MARKDOWN, mt.TEXT)
+
+# Columns derived from the content file of each resource
+CONTENT_COLUMNS = ('content', 'content_hash', 'size_bytes', 'chars', 'tokens')
+
+
+def resource_classes() -> List[type]:
+    """All resource classes, so that the columns do not depend on the resources of a given load."""
+
+    classes = []
+    pending = [BaseResource]
+    while pending:
+        resource_class = pending.pop(0)
+        classes.append(resource_class)
+        pending.extend(resource_class.__subclasses__())
+
+    return classes
+
+
+def _arrow_type(hint):
+    import pyarrow as pa
+
+    # Optional[X] is Union[X, None]
+    args = [arg for arg in getattr(hint, '__args__', ()) if arg is not type(None)]
+    if args:
+        hint = args[0]
+
+    # Anything else, e.g. lists, is stored as a string
+    return {bool: pa.bool_(), int: pa.int64(), float: pa.float64()}.get(hint, pa.string())
+
+
+def corpus_schema(course_info: dict):
+    """
+    Arrow schema of the corpus: the course info fields, the resource class, the fields of all resource
+    classes, and the columns derived from the content (see CONTENT_COLUMNS).
+    """
+    import pyarrow as pa
+
+    columns = {name: _arrow_type(type(value)) for name, value in course_info.items()}
+    columns['resource_class'] = pa.string()
+
+    for resource_class in resource_classes():
+        hints = get_type_hints(resource_class)
+        for f in fields(resource_class):
+            columns.setdefault(f.name, _arrow_type(hints[f.name]))
+
+    columns.update({
+        'content': pa.large_string(),
+        'content_hash': pa.string(),
+        'size_bytes': pa.int64(),
+        'chars': pa.int64(),
+        'tokens': pa.int64(),
+    })
+
+    return pa.schema(list(columns.items()))
+
+
+def describe_content(path: str, mime_type: str) -> tuple:
+    """
+    Content of a resource file and its stats: text (Markdown and plain text files only), SHA-256 hash,
+    size in bytes, number of characters and estimated number of tokens. All None if the file is missing.
+    """
+
+    # Imported here so that the cache folder is only required when actually used
+    from rag_etl.utils.planning import estimate_text_tokens
+
+    try:
+        with open_binary(path) as f:
+            data = f.read()
+    except (FileNotFoundError, KeyError):
+        logging.warning(f"Could not read {path}, leaving its content empty")
+        return None, None, None, None, None
+
+    content = data.decode('utf-8', errors='replace') if mime_type in TEXT_MIME_TYPES else None
+    chars = len(content) if content is not None else None
+    tokens = estimate_text_tokens(content) if content is not None else None
+
+    return content, hashlib.sha256(data).hexdigest(), len(data), chars, tokens
+
+
+class ParquetLoader(BaseLoader):
+    """
+    Loader that writes the resources as a Parquet dataset for corpus analytics: all the resource fields, the
+    course info, the Markdown content and derived stats (see `describe_content`), one row per resource.
+
+    The dataset is partitioned in folders like `course_id=COM-309/source=moodle/` (hive style) according to
+    `partition_by`, so that several courses can be loaded into the same dataset, each load replacing only the
+    partitions it writes. Resources are written in row groups of `row_group_size`, as they are read in a pool
+    of `max_workers` threads, so that memory stays bounded. Files are compressed with `compression`.
+
+    The columns are the same whatever the resources, so that the partitions of different courses can be read
+    together, e.g. with `pyarrow.dataset.dataset(output_path, partitioning='hive')`.
+
+    Relative resource paths (e.g. once loaded by `ContentMetadataLoader`) are resolved against `base_path`.
+    """
+
+    def __init__(
+        self,
+        output_path: str,
+        course_info: dict,
+        base_path: Optional[str] = None,
+        partition_by: Sequence[str] = ('course_id', 'source'),
+        row_group_size: int = 10000,
+        compression: str = 'zstd',
+        include_content: bool = True,
+        max_workers: int = 8,
+    ):
+        self.output_path = output_path
+        self.course_info = course_info
+        self.base_path = base_path
+        self.partition_by = list(partition_by)
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.include_content = include_content
+        self.max_workers = max_workers
+
+    def _resolve(self, path: str) -> str:
+        if self.base_path and not Path(path).is_absolute():
+            return str(Path(self.base_path) / path)
+        return path
+
+    def _batches(self, resources: List[BaseResource], schema):
+        import pyarrow as pa
+
+        names = [name for name in schema.names if name not in self.course_info and name != 'resource_class' and name not in CONTENT_COLUMNS]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for i in range(0, len(resources), self.row_group_size):
+                batch = ResourceBatch(resources[i:i + self.row_group_size])
+
+                columns = {name: [value] * len(batch) for name, value in self.course_info.items()}
+                columns.update(batch.to_columns(names))
+
+                # Lists (e.g. associated video lectures) are stored as JSON
+                for name in names:
+                    if any(isinstance(value, list) for value in columns[name]):
+                        columns[name] = [json.dumps(value) if isinstance(value, list) else value for value in columns[name]]
+
+                if self.include_content:
+                    stats = list(executor.map(describe_content, batch.map(self._resolve, 'path'), batch['mime_type']))
+                else:
+                    stats = [(None,) * len(CONTENT_COLUMNS)] * len(batch)
+                columns.update(zip(CONTENT_COLUMNS, map(list, zip(*stats))))
+
+                yield pa.RecordBatch.from_pydict(columns, schema=schema)
+
+    def load(self, resources: Sequence[BaseResource]) -> None:
+        import pyarrow.dataset as ds
+
+        logging.debug(f"Writing Parquet dataset at {self.output_path}")
+
+        resources = list(resources)
+        schema = corpus_schema(self.course_info)
+
+        missing = [name for name in self.partition_by if name not in schema.names]
+        if missing:
+            raise ValueError(f"Cannot partition by {missing}, not columns of the corpus")
+
+        if not resources:
+            return
+
+        # Partitions written by this load replace the previous ones, others are left untouched
+        ds.write_dataset(
+            self._batches(resources, schema),
+            self.output_path,
+            schema=schema,
+            format='parquet',
+            partitioning=ds.partitioning(schema.empty_table().select(self.partition_by).schema, flavor='hive'),
+            basename_template='part-{i}.parquet',
+            existing_data_behavior='delete_matching',
+            max_rows_per_group=self.row_group_size,
+            min_rows_per_group=min(self.row_group_size, len(resources)),
+            file_options=ds.ParquetFileFormat().make_write_options(compression=self.compression),
+        )
+
+        logging.info(f"Wrote {len(resources)} resources to {self.output_path}")
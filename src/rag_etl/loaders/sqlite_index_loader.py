@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import json
+import sqlite3
+
+from typing import List, Optional, Sequence
+
+import logging
+
+from rag_etl.loaders import BaseLoader
+from rag_etl.resources import BaseResource
+
+from rag_etl.utils.chunking import CHUNK_CHARS, CHUNKABLE_MIME_TYPES, chunk_pages, read_pages
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS documents (
+    key TEXT PRIMARY KEY,           -- path of the resource file
+    content_hash TEXT NOT NULL,     -- SHA-256 of the file
+    metadata TEXT NOT NULL          -- JSON of the resource metadata
+);
+
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,
+    document_key TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    page INTEGER,
+    title TEXT NOT NULL,
+    text TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS chunks_document_key ON chunks (document_key);
+
+-- Full-text index over the chunks table, without storing the text twice
+CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5 (
+    text, title, content='chunks', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+"""
+
+# Relative weights of the text and title columns when ranking search results
+BM25_WEIGHTS = (1.0, 2.0)
+
+
+class SQLiteIndexLoader(BaseLoader):
+    """
+    Loader that chunks the text content of the resources into a SQLite database with an FTS5 full-text index,
+    for quick retrieval checks or as a lexical search fallback (see `search`).
+
+    Markdown, plain text and PDF resources are chunked following their `one_chunk_per_doc` and
+    `one_chunk_per_page` flags (see `chunk_pages`), and other resources are skipped. Loads are incremental:
+    documents are keyed by path, and only re-chunked if the hash of their file or their metadata changed.
+    Documents are ingested in transactions of `batch_size` documents, with bulk prepared statements.
+    If `delete_missing`, documents of resources no longer loaded are removed from the index.
+
+    Relative resource paths (e.g. once loaded by `ContentMetadataLoader`) are resolved against `base_path`.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        base_path: Optional[str] = None,
+        max_chars: int = CHUNK_CHARS,
+        batch_size: int = 1000,
+        delete_missing: bool = False,
+    ):
+        self.db_path = db_path
+        self.base_path = base_path
+        self.max_chars = max_chars
+        self.batch_size = batch_size
+        self.delete_missing = delete_missing
+
+    def connect(self) -> sqlite3.Connection:
+        """Open the database, creating its tables if needed. Transactions are handled explicitly."""
+
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.executescript(SCHEMA)
+
+        return conn
+
+    def _resolve(self, path: str) -> str:
+        if self.base_path and not Path(path).is_absolute():
+            return str(Path(self.base_path) / path)
+        return path
+
+    def _delete_documents(self, conn: sqlite3.Connection, keys: List[str], keep_documents: bool = False) -> None:
+        """Delete the chunks of the given documents, from the full-text index as well, and the documents themselves."""
+
+        params = [(key,) for key in keys]
+
+        # Rows of external content FTS tables are deleted by giving their indexed values
+        conn.executemany(
+            "INSERT INTO chunks_fts (chunks_fts, rowid, text, title) SELECT 'delete', id, text, title FROM chunks WHERE document_key = ?",
+            params,
+        )
+        conn.executemany("DELETE FROM chunks WHERE document_key = ?", params)
+
+        if not keep_documents:
+            conn.executemany("DELETE FROM documents WHERE key = ?", params)
+
+    def _ingest(self, conn: sqlite3.Connection, documents: List[tuple], chunks: List[tuple]) -> None:
+        """Replace the given documents and their chunks, in a single transaction."""
+
+        conn.execute("BEGIN")
+        try:
+            self._delete_documents(conn, [key for key, _, _ in documents], keep_documents=True)
+
+            # New chunks get ids above all existing ones, so they are indexed at once
+            last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM chunks").fetchone()[0]
+
+            conn.executemany("INSERT OR REPLACE INTO documents (key, content_hash, metadata) VALUES (?, ?, ?)", documents)
+            conn.executemany("INSERT INTO chunks (document_key, position, page, title, text) VALUES (?, ?, ?, ?, ?)", chunks)
+            conn.execute("INSERT INTO chunks_fts (rowid, text, title) SELECT id, text, title FROM chunks WHERE id > ?", (last_id,))
+
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def load(self, resources: Sequence[BaseResource]) -> None:
+        # Imported here so that the cache folder is only required when actually used
+        from rag_etl.utils.cache import hash_file
+
+        logging.debug(f"Indexing resources into {self.db_path}")
+
+        conn = self.connect()
+        try:
+            # Documents chunked with another chunk size are all chunked again
+            chunk_chars = conn.execute("SELECT value FROM settings WHERE name = 'chunk_chars'").fetchone()
+            if chunk_chars is None or int(chunk_chars[0]) != self.max_chars:
+                conn.execute("BEGIN")
+                conn.execute("INSERT INTO chunks_fts (chunks_fts) VALUES ('delete-all')")
+                conn.execute("DELETE FROM chunks")
+                conn.execute("DELETE FROM documents")
+                conn.execute("INSERT OR REPLACE INTO settings (name, value) VALUES ('chunk_chars', ?)", (str(self.max_chars),))
+                conn.execute("COMMIT")
+
+            existing = {key: (content_hash, metadata) for key, content_hash, metadata in conn.execute("SELECT key, content_hash, metadata FROM documents")}
+
+            seen = set()
+            documents: List[tuple] = []
+            chunks: List[tuple] = []
+            skipped = unchanged = indexed = 0
+
+            for resource in resources:
+                # Skip resources without text content, e.g. videos
+                if resource.mime_type not in CHUNKABLE_MIME_TYPES:
+                    skipped += 1
+                    continue
+
+                path = self._resolve(resource.path)
+                if path in seen:
+                    continue
+                seen.add(path)
+
+                metadata = json.dumps(resource.metadata_dict(), ensure_ascii=False, sort_keys=True)
+
+                # Only files whose content or metadata changed are chunked again
+                content_hash = hash_file(path)
+                if existing.get(path) == (content_hash, metadata):
+                    unchanged += 1
+                    continue
+
+                pages = read_pages(path, resource.mime_type)
+                documents.append((path, content_hash, metadata))
+                chunks.extend(
+                    (path, position, chunk.page, resource.title, chunk.text)
+                    for position, chunk in enumerate(chunk_pages(pages, resource.one_chunk_per_doc, resource.one_chunk_per_page, self.max_chars))
+                )
+
+                if len(documents) == self.batch_size:
+                    self._ingest(conn, documents, chunks)
+                    indexed += len(documents)
+                    documents, chunks = [], []
+
+            if documents:
+                self._ingest(conn, documents, chunks)
+                indexed += len(documents)
+
+            logging.info(f"Indexed {indexed} documents, {unchanged} unchanged, {skipped} skipped")
+
+            if self.delete_missing:
+                missing = [key for key in existing if key not in seen]
+                conn.execute("BEGIN")
+                self._delete_documents(conn, missing)
+                conn.execute("COMMIT")
+                logging.info(f"Deleted {len(missing)} documents no longer loaded")
+        finally:
+            conn.close()
+
+    def search(self, query: str, limit: int = 10, raw: bool = False) -> List[dict]:
+        """
+        Search the chunks matching a query, best first according to BM25.
+
+        Args:
+            query: Words to search for. If `raw`, an FTS5 query instead (e.g. 'qubit NEAR/5 entanglement').
+            limit: Maximum number of results.
+            raw: Whether the query uses the FTS5 query syntax.
+
+        Returns:
+            List[dict]: Path, title, page, highlighted snippet, score and metadata of each matching chunk.
+        """
+
+        # Words are quoted, so that punctuation is never taken for FTS5 syntax
+        if not raw:
+            query = ' '.join('"' + word.replace('"', '""') + '"' for word in query.split())
+
+        conn = self.connect()
+        try:
+            rows = conn.execute(
+                """
+                SELECT c.document_key, c.title, c.page, snippet(chunks_fts, 0, '[', ']', '…', 16), bm25(chunks_fts, ?, ?) AS score, d.metadata
+                FROM chunks_fts
+                JOIN chunks c ON c.id = chunks_fts.rowid
+                JOIN documents d ON d.key = c.document_key
+                WHERE chunks_fts MATCH ?
+                ORDER BY score
+                LIMIT ?
+                """,
+                (*BM25_WEIGHTS, query, limit),
+            ).fetchall()
+        finally:
+            conn.close()
+
+        return [
+            {'path': path, 'title': title, 'page': page, 'snippet': snippet, 'score': score, 'metadata': json.loads(metadata)}
+            for path, title, page, snippet, score, metadata in rows
+        ]
@@ -0,0 +1,324 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import os
+import json
+
+from typing import Dict, List, Optional, Sequence
+
+import logging
+
+import numpy as np
+
+from rag_etl.loaders import BaseLoader
+from rag_etl.resources import BaseResource
+
+from rag_etl.utils.chunking import CHUNK_CHARS, CHUNKABLE_MIME_TYPES, chunk_pages, read_pages
+from rag_etl.utils.embeddings import BaseEmbedder, HashingEmbedder
+
+
+# Layout of an index folder:
+#
+#   index.json          embedder, number of rows, and rows of each document, written last and atomically
+#   vectors-<gen>.f32   float32 matrix of the chunk embeddings, one row per chunk, memory-mapped for search
+#   chunks-<gen>.jsonl  sidecar with the path, position, page and text of each chunk, one line per row
+#   offsets-<gen>.i64   int64 offset of each line of the sidecar
+#
+# Rows are only ever appended. Rows of documents changed or removed are tombstoned, i.e. no longer listed
+# in index.json, until the index is compacted into files of the next generation <gen>.
+INDEX_FILE = 'index.json'
+
+
+class VectorIndexLoader(BaseLoader):
+    """
+    Loader that chunks the text content of the resources (see `chunk_pages`), embeds the chunks with `embedder`,
+    and stores the vectors in a local index folder, to check retrieval in-process with `search`.
+
+    Loads are incremental: documents are keyed by path, and only re-embedded if the hash of their file or their
+    metadata changed, their previous rows being tombstoned. Chunks are embedded `batch_size` at a time, across
+    documents. The index is compacted once more than `compact_ratio` of its rows are tombstoned. If `delete_missing`,
+    documents of resources no longer loaded are tombstoned too. Changing the embedder rebuilds the whole index.
+
+    Relative resource paths (e.g. once loaded by `ContentMetadataLoader`) are resolved against `base_path`.
+    """
+
+    def __init__(
+        self,
+        index_path: str,
+        embedder: Optional[BaseEmbedder] = None,
+        base_path: Optional[str] = None,
+        max_chars: int = CHUNK_CHARS,
+        batch_size: int = 512,
+        delete_missing: bool = False,
+        compact_ratio: float = 0.5,
+    ):
+        self.index_path = Path(index_path)
+        self.embedder = embedder or HashingEmbedder()
+        self.base_path = base_path
+        self.max_chars = max_chars
+        self.batch_size = batch_size
+        self.delete_missing = delete_missing
+        self.compact_ratio = compact_ratio
+
+        self._searcher = None
+
+    def _resolve(self, path: str) -> str:
+        if self.base_path and not Path(path).is_absolute():
+            return str(Path(self.base_path) / path)
+        return path
+
+    def _file(self, kind: str, generation: int) -> Path:
+        suffix = {'vectors': 'f32', 'chunks': 'jsonl', 'offsets': 'i64'}[kind]
+        return self.index_path / f"{kind}-{generation}.{suffix}"
+
+    def read_index(self) -> dict:
+        """Contents of index.json, or those of an empty index for the current embedder."""
+
+        path = self.index_path / INDEX_FILE
+        if path.exists():
+            index = json.loads(path.read_text(encoding='utf-8'))
+            if (index['embedder'], index['dim'], index['max_chars']) == (self.embedder.name, self.embedder.dim, self.max_chars):
+                return index
+            logging.info(f"Index {self.index_path} was built with another embedder or chunk size, rebuilding it")
+
+        generation = index['generation'] + 1 if path.exists() else 0
+        return {
+            'embedder': self.embedder.name,
+            'dim': self.embedder.dim,
+            'max_chars': self.max_chars,
+            'generation': generation,
+            'rows': 0,
+            'chunks_bytes': 0,
+            'documents': {},
+        }
+
+    def _write_index(self, index: dict) -> None:
+        path = self.index_path / INDEX_FILE
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        tmp_path.write_text(json.dumps(index, ensure_ascii=False), encoding='utf-8')
+        os.replace(tmp_path, path)
+
+    def _prepare_files(self, index: dict) -> None:
+        """Remove the files of other generations, and the rows appended by failed loads after the last index write."""
+
+        generation = index['generation']
+        for path in self.index_path.glob('*-*.*'):
+            if path.stem.rsplit('-', 1)[-1] != str(generation):
+                path.unlink()
+
+        sizes = {
+            'vectors': index['rows'] * index['dim'] * 4,
+            'chunks': index['chunks_bytes'],
+            'offsets': index['rows'] * 8,
+        }
+        for kind, size in sizes.items():
+            with open(self._file(kind, generation), 'ab') as f:
+                f.truncate(size)
+
+    def _append(self, index: dict, documents: List[tuple]) -> None:
+        """Embed the chunks of the given documents together, and append them to the index."""
+
+        texts = [chunk.text for _, _, _, chunks in documents for chunk in chunks]
+        vectors = self.embedder.embed(texts).astype(np.float32, copy=False)
+
+        generation = index['generation']
+        lines = []
+        offsets = []
+        offset = index['chunks_bytes']
+        row = index['rows']
+        for key, content_hash, metadata, chunks in documents:
+            index['documents'][key] = {'content_hash': content_hash, 'metadata': metadata, 'rows': [row, row + len(chunks)]}
+            row += len(chunks)
+
+            for position, chunk in enumerate(chunks):
+                line = json.dumps({'path': key, 'position': position, 'page': chunk.page, 'text': chunk.text}, ensure_ascii=False).encode('utf-8') + b'\n'
+                lines.append(line)
+                offsets.append(offset)
+                offset += len(line)
+
+        with open(self._file('vectors', generation), 'ab') as f:
+            f.write(vectors.tobytes())
+        with open(self._file('chunks', generation), 'ab') as f:
+            f.write(b''.join(lines))
+        with open(self._file('offsets', generation), 'ab') as f:
+            f.write(np.array(offsets, dtype=np.int64).tobytes())
+
+        index['rows'] = row
+        index['chunks_bytes'] = offset
+
+    def _compact(self, index: dict) -> dict:
+        """Copy the rows of the documents into files of the next generation, dropping tombstoned rows."""
+
+        generation = index['generation']
+        vectors = np.memmap(self._file('vectors', generation), dtype=np.float32, mode='r', shape=(index['rows'], index['dim']))
+        offsets = np.fromfile(self._file('offsets', generation), dtype=np.int64)
+
+        compacted = {**index, 'generation': generation + 1, 'rows': 0, 'chunks_bytes': 0, 'documents': {}}
+
+        with (
+            open(self._file('chunks', generation), 'rb') as chunks_file,
+            open(self._file('vectors', generation + 1), 'wb') as vectors_file,
+            open(self._file('chunks', generation + 1), 'wb') as new_chunks_file,
+            open(self._file('offsets', generation + 1), 'wb') as offsets_file,
+        ):
+            for key, document in sorted(index['documents'].items(), key=lambda item: item[1]['rows'][0]):
+                start, end = document['rows']
+
+                compacted['documents'][key] = {**document, 'rows': [compacted['rows'], compacted['rows'] + end - start]}
+                if end == start:
+                    continue
+
+                # Sidecar lines of a document are contiguous, so they are copied in one go
+                chunks_file.seek(offsets[start])
+                data = chunks_file.read((offsets[end] if end < index['rows'] else index['chunks_bytes']) - offsets[start])
+
+                vectors_file.write(np.ascontiguousarray(vectors[start:end]).tobytes())
+                new_chunks_file.write(data)
+                offsets_file.write((offsets[start:end] - offsets[start] + compacted['chunks_bytes']).tobytes())
+
+                compacted['rows'] += end - start
+                compacted['chunks_bytes'] += len(data)
+
+        del vectors
+
+        return compacted
+
+    def load(self, resources: Sequence[BaseResource]) -> None:
+        # Imported here so that the cache folder is only required when actually used
+        from rag_etl.utils.cache import hash_file
+
+        logging.debug(f"Indexing resources into {self.index_path}")
+
+        self.index_path.mkdir(parents=True, exist_ok=True)
+        self._searcher = None
+
+        index = self.read_index()
+        self._prepare_files(index)
+
+        seen = set()
+        pending: List[tuple] = []
+        pending_chunks = 0
+        skipped = unchanged = indexed = 0
+
+        for resource in resources:
+            # Skip resources without text content, e.g. videos
+            if resource.mime_type not in CHUNKABLE_MIME_TYPES:
+                skipped += 1
+                continue
+
+            path = self._resolve(resource.path)
+            if path in seen:
+                continue
+            seen.add(path)
+
+            # Metadata is compared as stored, i.e. after a JSON round trip
+            metadata = json.loads(json.dumps(resource.metadata_dict(), ensure_ascii=False))
+
+            # Only files whose content or metadata changed are embedded again
+            content_hash = hash_file(path)
+            document = index['documents'].get(path)
+            if document is not None and (document['content_hash'], document['metadata']) == (content_hash, metadata):
+                unchanged += 1
+                continue
+
+            chunks = chunk_pages(read_pages(path, resource.mime_type), resource.one_chunk_per_doc, resource.one_chunk_per_page, self.max_chars)
+            pending.append((path, content_hash, metadata, chunks))
+            pending_chunks += len(chunks)
+
+            if pending_chunks >= self.batch_size:
+                self._append(index, pending)
+                indexed += len(pending)
+                pending, pending_chunks = [], 0
+
+        if pending:
+            self._append(index, pending)
+            indexed += len(pending)
+
+        logging.info(f"Indexed {indexed} documents, {unchanged} unchanged, {skipped} skipped")
+
+        if self.delete_missing:
+            missing = [key for key in index['documents'] if key not in seen]
+            for key in missing:
+                del index['documents'][key]
+            logging.info(f"Tombstoned {len(missing)} documents no longer loaded")
+
+        # Compact once too many rows are tombstoned
+        live_rows = sum(end - start for start, end in (document['rows'] for document in index['documents'].values()))
+        if index['rows'] and index['rows'] - live_rows > self.compact_ratio * index['rows']:
+            logging.info(f"Compacting {self.index_path}, {index['rows'] - live_rows} of {index['rows']} rows tombstoned")
+            index = self._compact(index)
+
+        self._write_index(index)
+        self._prepare_files(index)
+
+    def _open_searcher(self) -> tuple:
+        """Index, memory-mapped vectors and offsets, and mask of the live rows, kept until the index is written again."""
+
+        mtime_ns = (self.index_path / INDEX_FILE).stat().st_mtime_ns
+        if self._searcher is not None and self._searcher[0] == mtime_ns:
+            return self._searcher[1:]
+
+        index = json.loads((self.index_path / INDEX_FILE).read_text(encoding='utf-8'))
+        rows, generation = index['rows'], index['generation']
+
+        if rows:
+            vectors = np.memmap(self._file('vectors', generation), dtype=np.float32, mode='r', shape=(rows, index['dim']))
+            offsets = np.memmap(self._file('offsets', generation), dtype=np.int64, mode='r', shape=(rows,))
+        else:
+            vectors = np.zeros((0, index['dim']), dtype=np.float32)
+            offsets = np.zeros(0, dtype=np.int64)
+
+        live = np.zeros(rows, dtype=bool)
+        for document in index['documents'].values():
+            start, end = document['rows']
+            live[start:end] = True
+
+        self._searcher = (mtime_ns, index, vectors, offsets, live)
+
+        return self._searcher[1:]
+
+    def search(self, query: str, k: int = 10) -> List[dict]:
+        """
+        Search the chunks most similar to a query, by cosine similarity of their embeddings.
+
+        Args:
+            query: Text to search for, embedded with the embedder of the index.
+            k: Maximum number of results.
+
+        Returns:
+            List[dict]: Path, title, page, text, score and metadata of each chunk, most similar first.
+        """
+
+        index, vectors, offsets, live = self._open_searcher()
+        if index['embedder'] != self.embedder.name:
+            raise ValueError(f"Index {self.index_path} was built with embedder {index['embedder']}, not {self.embedder.name}")
+
+        k = min(k, int(live.sum()))
+        if k == 0:
+            return []
+
+        # Vectors are unit-length, so dot products are cosine similarities
+        scores = vectors @ self.embedder.embed([query])[0]
+        scores[~live] = -np.inf
+
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        results = []
+        documents: Dict[str, dict] = index['documents']
+        with open(self._file('chunks', index['generation']), 'rb') as f:
+            for row in top:
+                f.seek(offsets[row])
+                chunk = json.loads(f.readline())
+                metadata = documents[chunk['path']]['metadata']
+                results.append({
+                    'path': chunk['path'],
+                    'title': metadata.get('title'),
+                    'page': chunk['page'],
+                    'text': chunk['text'],
+                    'score': float(scores[row]),
+                    'metadata': metadata,
+                })
+
+        return results
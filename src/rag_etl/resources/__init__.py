@@ -3,8 +3,11 @@ from rag_etl.resources.base_resource import BaseResource
 from rag_etl.resources.moodle_resource import MoodleResource
 from rag_etl.resources.mooc_resource import MOOCResource
 
+from rag_etl.resources.resource_batch import ResourceBatch
+
 __all__ = [
     "BaseResource",
     "MoodleResource",
     "MOOCResource",
+    "ResourceBatch",
 ]
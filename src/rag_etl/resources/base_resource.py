@@ -1,13 +1,40 @@
 from __future__ import annotations
 
-from dataclasses import dataclass, replace
+import sys
 
-from typing import Optional
+from dataclasses import dataclass, fields, MISSING
+from functools import lru_cache
 
+from typing import Callable, Optional, Tuple
 
-@dataclass
+
+@lru_cache(maxsize=None)
+def _field_names(cls) -> Tuple[str, ...]:
+    return tuple(f.name for f in fields(cls))
+
+
+@lru_cache(maxsize=None)
+def _copier(cls) -> Callable[[BaseResource, BaseResource], None]:
+    """
+    Build a function copying all field values of a resource of class `cls` into another one.
+    As dataclasses do for `__init__`, the function is generated with one plain assignment per field.
+    """
+    body = ''.join(f"    new.{name} = old.{name}\n" for name in _field_names(cls))
+    namespace = {}
+    exec(f"def copy_fields(old, new):\n{body}", namespace)
+    return namespace['copy_fields']
+
+
+@dataclass(slots=True)
 class BaseResource:
-    """Represents a single resource flowing through the ETL pipeline."""
+    """
+    Represents a single resource flowing through the ETL pipeline.
+
+    Resources are slotted to keep them small, since large corpora hold tens of thousands of them.
+    Fields listed in `_interned_fields` take the same few values across resources, so they are interned.
+    """
+
+    _interned_fields = ('source', 'mime_type', 'type', 'subtype')
 
     title: str
     source: str                 # e.g., "moodle", "mooc", etc.
@@ -46,9 +73,63 @@ class BaseResource:
     original_link: Optional[str] = None
     pipeline_link: Optional[str] = None
 
+    def __post_init__(self):
+        for name in self._interned_fields:
+            value = getattr(self, name)
+            if isinstance(value, str):
+                setattr(self, name, sys.intern(value))
+
     def copy_with(self, **changes):
-        """Return a copy with specified fields replaced."""
-        return replace(self, **changes)
+        """
+        Return a copy with specified fields replaced.
+
+        Unchanged field values are shared with the original resource rather than copied, and
+        `__init__` is bypassed, since the original resource was already initialised.
+        """
+        cls = self.__class__
+
+        new = object.__new__(cls)
+        _copier(cls)(self, new)
+
+        for name, value in changes.items():
+            if name not in _field_names(cls):
+                raise TypeError(f"{cls.__name__} has no field '{name}'")
+            if isinstance(value, str) and name in self._interned_fields:
+                value = sys.intern(value)
+            setattr(new, name, value)
+
+        return new
+
+    def to_dict(self) -> dict[str, object]:
+        """
+        Return a dictionary with the resource class and all fields that differ from their defaults,
+        from which the resource can be rebuilt with `BaseResource.from_dict`.
+        """
+        d = {"resource_class": self.__class__.__name__}
+
+        for f in fields(self):
+            value = getattr(self, f.name)
+            if f.default is not MISSING and value == f.default:
+                continue
+            d[f.name] = value
+
+        return d
+
+    @classmethod
+    def from_dict(cls, d: dict[str, object]) -> BaseResource:
+        """Rebuild a resource from a dictionary returned by `to_dict`, with the right resource subclass."""
+        d = dict(d)
+        class_name = d.pop("resource_class")
+
+        # Look for the resource class among all (already imported) subclasses
+        pending = [BaseResource]
+        while pending:
+            resource_class = pending.pop()
+            if resource_class.__name__ == class_name:
+                return resource_class(**d)
+            pending.extend(resource_class.__subclasses__())
+
+        raise ValueError(f"Unknown resource class '{class_name}'")
 
     def metadata_dict(self) -> dict[str, Optional[object]]:
         """Return a dictionary containing only metadata-style fields."""
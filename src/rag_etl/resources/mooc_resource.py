@@ -7,9 +7,9 @@ from typing import Optional
 from rag_etl.resources.base_resource import BaseResource
 
 
-@dataclass
+@dataclass(slots=True)
 class MOOCResource(BaseResource):
-    source = 'mooc'
+    _interned_fields = BaseResource._interned_fields + ('chapter', 'subchapter')
 
     chapter: Optional[str] = None
     subchapter: Optional[str] = None
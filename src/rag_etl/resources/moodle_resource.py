@@ -7,9 +7,9 @@ from typing import Optional
 from rag_etl.resources.base_resource import BaseResource
 
 
-@dataclass
+@dataclass(slots=True)
 class MoodleResource(BaseResource):
-    source = 'moodle'
+    _interned_fields = BaseResource._interned_fields + ('section_title', 'section_text')
 
     section_title: Optional[str] = None
     section_text: Optional[str] = None
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import re
+
+from dataclasses import fields
+from typing import Callable, Dict, List, Optional, Sequence, Union
+
+from rag_etl.resources.base_resource import BaseResource
+
+
+Column = Union[str, Sequence]
+
+
+def where(mask: Sequence[bool], a: Sequence, b: Sequence) -> list:
+    """Element-wise choice between two columns: `a[i]` if `mask[i]` else `b[i]`."""
+    return [x if m else y for m, x, y in zip(mask, a, b)]
+
+
+class ResourceBatch:
+    """
+    Columnar view over a list of resources.
+
+    Columns are built lazily from the resource fields and can be replaced as a whole. Column-wise
+    operations (`map`, `contains`, `extract`, `lookup`) are evaluated once per distinct value, which is
+    cheap since metadata such as section titles, mime types or dates repeats across many resources.
+    Modified columns are written back to the resources with `to_resources`.
+
+    Example:
+        batch = ResourceBatch(resources)
+        batch['year'] = batch.extract('title', r'(2[0-9]{3})')
+        resources = batch.to_resources()
+    """
+
+    def __init__(self, resources: Sequence[BaseResource]):
+        self.resources: List[BaseResource] = list(resources)
+        self._columns: Dict[str, list] = {}
+        self._modified: set = set()
+
+    def __len__(self) -> int:
+        return len(self.resources)
+
+    @property
+    def field_names(self) -> List[str]:
+        """Names of all the fields of the resources in the batch, in declaration order."""
+        names: Dict[str, None] = {}
+        for resource_class in dict.fromkeys(type(resource) for resource in self.resources):
+            names.update((f.name, None) for f in fields(resource_class))
+        return list(names)
+
+    def __getitem__(self, name: str) -> list:
+        """Return the column of the given field. Resources lacking the field get None."""
+        if name not in self._columns:
+            self._columns[name] = [getattr(resource, name, None) for resource in self.resources]
+        return self._columns[name]
+
+    def __setitem__(self, name: str, values: Sequence) -> None:
+        """Replace the column of the given field, to be written back by `to_resources`."""
+        values = list(values)
+        if len(values) != len(self.resources):
+            raise ValueError(f"Column '{name}' has {len(values)} values, expected {len(self.resources)}")
+
+        self._columns[name] = values
+        self._modified.add(name)
+
+    def _resolve(self, column: Column) -> Sequence:
+        return self[column] if isinstance(column, str) else column
+
+    ################################################################
+
+    def is_instance(self, resource_class: type) -> List[bool]:
+        """Mask of the resources that are instances of the given class."""
+        return [isinstance(resource, resource_class) for resource in self.resources]
+
+    def map(self, fn: Callable, *columns: Column) -> list:
+        """
+        Apply `fn` row-wise over the given columns (field names or sequences of values), calling it
+        only once per distinct combination of values. Values must be hashable.
+        """
+        if len(columns) == 1:
+            values = self._resolve(columns[0])
+            results = {value: fn(value) for value in set(values)}
+            return [results[value] for value in values]
+
+        rows = list(zip(*(self._resolve(column) for column in columns)))
+        results = {row: fn(*row) for row in set(rows)}
+        return [results[row] for row in rows]
+
+    def contains(self, column: Column, pattern: str, flags: int = 0) -> List[bool]:
+        """Mask of the values of the column in which the regex `pattern` is found. None values do not match."""
+        regex = re.compile(pattern, flags)
+        return self.map(lambda value: value is not None and regex.search(value) is not None, column)
+
+    def extract(self, column: Column, pattern: str, group: int = 1, flags: int = 0) -> List[Optional[str]]:
+        """Group `group` of the first match of the regex `pattern` in each value of the column, or None."""
+        regex = re.compile(pattern, flags)
+
+        def extract_one(value):
+            match = regex.search(value) if value is not None else None
+            return match.group(group) if match else None
+
+        return self.map(extract_one, column)
+
+    def lookup(self, column: Column, mapping: dict, default=None) -> list:
+        """Map each value of the column through `mapping`."""
+        return [mapping.get(value, default) for value in self._resolve(column)]
+
+    ################################################################
+
+    def to_resources(self) -> List[BaseResource]:
+        """Write the modified columns back to the resources, and return them."""
+        for name in self._modified:
+            for resource, value in zip(self.resources, self._columns[name]):
+                setattr(resource, name, value)
+
+        self._modified.clear()
+
+        return self.resources
+
+    def to_columns(self, names: Optional[Sequence[str]] = None) -> Dict[str, list]:
+        """
+        Return the given columns (all fields by default) as a dictionary of lists, plus a
+        `resource_class` column with the class name of each resource.
+        """
+        names = names or self.field_names
+
+        columns = {'resource_class': [resource.__class__.__name__ for resource in self.resources]}
+        columns.update((name, self[name]) for name in names)
+
+        return columns
+
+    def to_pandas(self, names: Optional[Sequence[str]] = None):
+        """Export the given columns (all fields by default) as a pandas DataFrame. Requires pandas."""
+        import pandas as pd
+        return pd.DataFrame(self.to_columns(names))
+
+    def to_arrow(self, names: Optional[Sequence[str]] = None):
+        """Export the given columns (all fields by default) as a pyarrow Table. Requires pyarrow."""
+        import pyarrow as pa
+        return pa.table(self.to_columns(names))
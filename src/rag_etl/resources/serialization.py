@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import gzip
+import json
+
+from pathlib import Path
+from typing import List, Sequence
+
+from rag_etl.resources.base_resource import BaseResource
+
+
+def _open(path: Path, mode: str):
+    if path.suffix == '.gz':
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return path.open(mode, encoding='utf-8')
+
+
+def write_resources(path, resources: Sequence[BaseResource]) -> None:
+    """Write resources as JSON lines, one `to_dict` per line. Gzip-compressed if `path` ends with '.gz'."""
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    with _open(path, 'w') as f:
+        for resource in resources:
+            f.write(json.dumps(resource.to_dict(), ensure_ascii=False) + '\n')
+
+
+def read_resources(path) -> List[BaseResource]:
+    """Read resources written by `write_resources`."""
+
+    with _open(Path(path), 'r') as f:
+        return [BaseResource.from_dict(json.loads(line)) for line in f if line.strip()]
@@ -1,5 +1,6 @@
 from rag_etl.transformers.base_transformer import BaseTransformer
 
+from rag_etl.transformers.course_metadata import CourseMetadataTransformer
 from rag_etl.transformers.extract_zip import ExtractZipTransformer
 from rag_etl.transformers.jupyter_to_markdown import JupyterToMarkdownTransformer
 from rag_etl.transformers.pdf_to_markdown import PDFToMarkdownTransformer
@@ -7,6 +8,7 @@ from rag_etl.transformers.split_exercises import SplitExercisesTransformer
 
 __all__ = [
     "BaseTransformer",
+    "CourseMetadataTransformer",
     "ExtractZipTransformer",
     "JupyterToMarkdownTransformer",
     "PDFToMarkdownTransformer",
@@ -1,11 +1,12 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
-from typing import List, Sequence
+from typing import List, Sequence, Tuple
 
 from rag_etl.resources import BaseResource
 
-from rag_etl.utils.cache import get_from_cache, set_to_cache
+from rag_etl.utils.cache import is_cached, get_from_cache, set_to_cache
+from rag_etl.utils.planning import StageEstimate, record_throughput, get_seconds_per_unit
 
 
 class BaseTransformer(ABC):
@@ -17,13 +18,28 @@ class BaseTransformer(ABC):
     and return a new list of transformed `Resource` objects.
     """
 
+    @property
+    def cache_scope(self) -> str:
+        """Cache scope of the transformer outputs. Transformers whose output depends on their options should include them."""
+        return self.__class__.__name__
+
+    def is_cached(self, resource_path, destination_path):
+        return is_cached(self.cache_scope, resource_path, destination_path)
+
     def get_from_cache(self, resource_path, destination_path):
-        scope = self.__class__.__name__
-        return get_from_cache(scope, resource_path, destination_path)
+        return get_from_cache(self.cache_scope, resource_path, destination_path)
 
     def set_to_cache(self, resource_path, source_path):
+        set_to_cache(self.cache_scope, resource_path, source_path)
+
+    def record_throughput(self, units, seconds):
         scope = self.__class__.__name__
-        set_to_cache(scope, resource_path, source_path)
+        record_throughput(scope, units, seconds)
+
+    def estimate_seconds(self, units):
+        scope = self.__class__.__name__
+        seconds_per_unit = get_seconds_per_unit(scope)
+        return seconds_per_unit * units if seconds_per_unit is not None else None
 
     @abstractmethod
     def transform(self, resources: Sequence[BaseResource]) -> List[BaseResource]:
@@ -37,3 +53,27 @@ class BaseTransformer(ABC):
             List[Resource]: Transformed resources ready for loading.
         """
         raise NotImplementedError
+
+    def plan(self, resources: Sequence[BaseResource]) -> Tuple[List[BaseResource], StageEstimate]:
+        """
+        Predict the work this transformer would do on the given resources, without doing any expensive work.
+
+        By default, the transformer is considered cheap and is simply run. Transformers relying on LLMs or
+        other expensive processing should override this method, and so should transformers writing files,
+        as planning never writes anything to disk.
+
+        Args:
+            resources (Sequence[Resource]): Input resources from the previous (planned) step.
+
+        Returns:
+            Tuple[List[Resource], StageEstimate]: Resources this step would output and the estimated cost of the step.
+        """
+        transformed_resources = self.transform(resources)
+
+        estimate = StageEstimate(
+            stage=self.__class__.__name__,
+            resources_in=len(resources),
+            resources_out=len(transformed_resources),
+        )
+
+        return transformed_resources, estimate
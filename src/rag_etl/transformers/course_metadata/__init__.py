@@ -0,0 +1,9 @@
+from rag_etl.transformers.course_metadata.course_metadata_transformer import CourseMetadataTransformer
+from rag_etl.transformers.course_metadata.utils import MetadataRules, compile_rules, load_rules
+
+__all__ = [
+    "CourseMetadataTransformer",
+    "MetadataRules",
+    "compile_rules",
+    "load_rules",
+]
@@ -0,0 +1,84 @@
+from typing import Optional, Sequence
+
+from rag_etl.resources import BaseResource, MoodleResource, ResourceBatch
+from rag_etl.resources.resource_batch import where
+from rag_etl.transformers import BaseTransformer
+
+from rag_etl.transformers.course_metadata.utils import MetadataRules, load_rules
+
+
+class CourseMetadataTransformer(BaseTransformer):
+    """
+    Transformer that infers the metadata of course resources (date, week, year, type, subtype, ...) from their
+    titles and, for Moodle resources, their section titles, according to the metadata rules of the course.
+
+    The rules are declared in a TOML file (see `compile_rules` for its tables) and compiled once, so that
+    adding a course only requires declaring its keywords and academic calendar.
+    """
+
+    def __init__(self, rules_path=None, rules: Optional[MetadataRules] = None) -> None:
+        if rules is None and rules_path is None:
+            raise ValueError("Either rules_path or rules must be given")
+
+        self.rules = rules or load_rules(rules_path)
+
+    def _get_number(self, week: Optional[int], year: Optional[str]) -> Optional[str]:
+        if week:
+            return str(week)
+
+        if year:
+            return str(year)
+
+        return None
+
+    def _get_from(self, date_: Optional[str], type: str, subtype: str) -> Optional[str]:
+        if date_ and (type, subtype) in self.rules.scheduled_type_subtypes:
+            return f"{date_}T00:00:00.000000"
+        else:
+            return None
+
+    def transform(self, resources: Sequence[BaseResource]) -> Sequence[BaseResource]:
+        rules = self.rules
+
+        # Work column-wise, so that each inference runs once per distinct value rather than once per resource
+        batch = ResourceBatch(resources)
+
+        # Texts metadata is inferred from. For Moodle resources, the section title is used as well
+        is_moodle = batch.is_instance(MoodleResource)
+        titles = batch.map(str.lower, 'title')
+        date_texts = where(is_moodle, batch['section_title'], titles)
+        texts = batch.map(
+            lambda moodle, section_title, title: f"{section_title.lower()}\n{title}" if moodle else title,
+            is_moodle, 'section_title', titles,
+        )
+
+        # Infer time-related fields, like date, week and year
+        batch['date'] = batch.map(rules.infer_date, date_texts)
+        batch['week'] = batch.lookup('date', rules.weeks)
+        batch['year'] = batch.map(rules.infer_year, titles)
+
+        # Infer type and subtype
+        type_subtypes = batch.map(lambda text, week: rules.type_subtype(text, week=week), texts, 'week')
+        batch['type'] = [type for type, _ in type_subtypes]
+        batch['subtype'] = [subtype for _, subtype in type_subtypes]
+
+        # Infer whether it is a solution
+        batch['is_solution'] = batch.map(rules.is_solution, texts)
+
+        # Infer processing method
+        batch['processing_method'] = batch.map(rules.processing_method, 'mime_type', 'type', 'subtype')
+
+        # Infer number
+        batch['number'] = batch.map(self._get_number, 'week', 'year')
+
+        # Solutions of scheduled resources (e.g. homework) are published the following week
+        is_scheduled_solution = batch.map(
+            lambda type, subtype, is_solution: (type, subtype) in rules.scheduled_type_subtypes and is_solution,
+            'type', 'subtype', 'is_solution',
+        )
+        batch['date'] = where(is_scheduled_solution, batch.map(rules.shifted_date, 'date'), batch['date'])
+
+        # Create from field with the datetime
+        batch['from_'] = batch.map(self._get_from, 'date', 'type', 'subtype')
+
+        return batch.to_resources()
@@ -0,0 +1,205 @@
+import re
+import tomllib
+import itertools
+
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Dict, FrozenSet, List, Optional, Pattern, Tuple
+
+import rag_etl.utils.mime_types as mt
+
+
+# Month names, in English and French, by their first three letters
+MONTHS = {
+    "jan": 1, "feb": 2, "fev": 2, "fév": 2, "mar": 3,
+    "apr": 4, "avr": 4, "may": 5, "mai": 5, "jun": 6, "jui": 6,
+    "jul": 7, "aug": 8, "aou": 8, "aoû": 8,
+    "sep": 9, "oct": 10, "nov": 11, "dec": 12, "déc": 12,
+}
+
+# Section titles starting with the days of the week, e.g. "3 - 4 Octob"
+DEFAULT_DATE_PATTERN = r"^\s*(?P<day>\d{1,2})\s*-\s*\d{1,2}\s+(?P<month>[A-Za-z]+)"
+
+YEAR_RE = re.compile(r'\b(1[0-9]{3}|2[0-9]{3})\b')
+
+
+@dataclass
+class TypeRule:
+    """Type and subtype given to resources whose text matches any of the keywords, if the required fields are set."""
+
+    type: str
+    subtype: str
+    requires: Tuple[str, ...] = ()
+
+
+@dataclass
+class MetadataRules:
+    """
+    Metadata rules of a course, compiled from their declaration (see `compile_rules`).
+
+    Type rules are compiled into a single regex, with a named group per rule, for each combination of
+    required fields that can be set. The calendar is compiled into lookup tables from section date to
+    week and to the date of the following week.
+    """
+
+    type_regexes: Dict[FrozenSet[str], Optional[Pattern]]
+    type_rules: List[TypeRule]
+    required_fields: FrozenSet[str]
+    default_type_subtype: Tuple[str, str]
+
+    date_regex: Pattern
+    semester_start: date
+    semester_end: date
+    year_start_month: int
+    weeks: Dict[str, Optional[int]]
+    next_dates: Dict[str, str]
+
+    solution_regex: Pattern
+    processing_methods: Dict[Tuple[str, str], Optional[str]] = field(default_factory=dict)
+    default_processing_method: Optional[str] = None
+    scheduled_type_subtypes: Tuple[Tuple[str, str], ...] = ()
+
+    def infer_date(self, text: str) -> str:
+        """Date of the section title the text starts with, clamped to the semester. The semester start if none."""
+
+        match = self.date_regex.match(text)
+        if not match:
+            return str(self.semester_start)
+
+        # Normalise month to three letters, then to int (Oct → oct, October → oct, octover → oct)
+        month = MONTHS[match.group('month').strip().lower()[:3]]
+        day = int(match.group('day'))
+
+        # Infer year based on month and semester
+        year = self.semester_start.year if month >= self.year_start_month else self.semester_start.year + 1
+        inferred_date = date(year=year, month=month, day=day)
+
+        # Clamp inferred date to be in semester
+        inferred_date = max(self.semester_start, inferred_date)
+        inferred_date = min(self.semester_end, inferred_date)
+
+        return str(inferred_date)
+
+    def infer_year(self, title: str) -> Optional[str]:
+        """Years mentioned in the title, joined by hyphens (e.g. '2019-2020'), if any."""
+
+        years = YEAR_RE.findall(title)
+        if years:
+            return '-'.join(years)
+
+        return None
+
+    def type_subtype(self, text: str, **fields) -> Tuple[str, str]:
+        """
+        Type and subtype of the first rule matching the text, among the rules whose required fields are set.
+
+        All the rules are matched in a single scan of the text. Matches are zero-width, so that every
+        position yields the first rule matching there, whatever the other matches around it.
+        """
+
+        type_regex = self.type_regexes[frozenset(name for name in self.required_fields if fields.get(name))]
+
+        best = len(self.type_rules)
+        if type_regex is not None:
+            for match in type_regex.finditer(text):
+                best = min(best, int(match.lastgroup[1:]))
+                if best == 0:
+                    break
+
+        if best == len(self.type_rules):
+            return self.default_type_subtype
+
+        rule = self.type_rules[best]
+        return rule.type, rule.subtype
+
+    def is_solution(self, text: str) -> bool:
+        return bool(self.solution_regex.search(text))
+
+    def processing_method(self, mime_type: str, type: str, subtype: str) -> Optional[str]:
+        """Processing method of PDF resources, by type and subtype. None for other resources."""
+
+        if mime_type != mt.PDF:
+            return None
+
+        return self.processing_methods.get((type, subtype), self.default_processing_method)
+
+    def shifted_date(self, date_: str) -> str:
+        """Date of the teaching week following the one of the given date. Unchanged if not a teaching week."""
+        return self.next_dates.get(date_, date_)
+
+
+def _type_subtype(key: str) -> Tuple[str, str]:
+    type, _, subtype = key.partition('/')
+    return type, subtype
+
+
+def compile_rules(config: dict) -> MetadataRules:
+    """
+    Compile the metadata rules of a course, as declared in its TOML file (see `load_rules`).
+
+    Args:
+        config: The parsed declaration, with the tables `calendar`, `types` and `processing_methods`.
+
+    Returns:
+        MetadataRules: The compiled rules.
+    """
+
+    types = config.get('types', {})
+    type_rules = []
+    alternatives = []
+    for i, rule in enumerate(types.get('rules', [])):
+        keywords = [rf"\b{re.escape(keyword)}\b" for keyword in rule.get('keywords', [])]
+        if rule.get('pattern'):
+            keywords.append(rule['pattern'])
+
+        type_rules.append(TypeRule(type=rule['type'], subtype=rule['subtype'], requires=tuple(rule.get('requires', ()))))
+        alternatives.append(f"(?P<r{i}>{'|'.join(keywords)})")
+
+    # One named group per rule, tried in order at each position of the text. Rules whose required fields
+    # are not set are left out, so that they never hide the rules after them
+    required_fields = sorted({name for rule in type_rules for name in rule.requires})
+    type_regexes = {}
+    for n in range(len(required_fields) + 1):
+        for fields_set in itertools.combinations(required_fields, n):
+            kept = [alternative for rule, alternative in zip(type_rules, alternatives) if set(rule.requires) <= set(fields_set)]
+            type_regexes[frozenset(fields_set)] = re.compile(f"(?=(?:{'|'.join(kept)}))", re.IGNORECASE) if kept else None
+
+    default = types.get('default', {})
+
+    # Teaching weeks are numbered in order, skipping the breaks. The week after the last one is a week later
+    calendar = config['calendar']
+    teaching_dates = sorted(str(date_) for date_ in calendar.get('weeks', []))
+    weeks: Dict[str, Optional[int]] = {date_: week for week, date_ in enumerate(teaching_dates, 1)}
+    weeks.update({str(date_): None for date_ in calendar.get('breaks', [])})
+
+    next_dates = dict(zip(teaching_dates, teaching_dates[1:]))
+    if teaching_dates:
+        next_dates[teaching_dates[-1]] = str(date.fromisoformat(teaching_dates[-1]) + timedelta(weeks=1))
+
+    semester_start = calendar['semester_start']
+    processing_methods = dict(config.get('processing_methods', {}))
+    default_processing_method = processing_methods.pop('default', None)
+
+    return MetadataRules(
+        type_regexes=type_regexes,
+        type_rules=type_rules,
+        required_fields=frozenset(required_fields),
+        default_type_subtype=(default.get('type', 'theory'), default.get('subtype', 'lecture_slides')),
+        date_regex=re.compile(calendar.get('date_pattern', DEFAULT_DATE_PATTERN)),
+        semester_start=semester_start,
+        semester_end=calendar['semester_end'],
+        year_start_month=calendar.get('year_start_month', semester_start.month),
+        weeks=weeks,
+        next_dates=next_dates,
+        solution_regex=re.compile(types.get('solution_pattern', 'solution'), re.IGNORECASE),
+        processing_methods={_type_subtype(key): method for key, method in processing_methods.items()},
+        default_processing_method=default_processing_method,
+        scheduled_type_subtypes=tuple(_type_subtype(key) for key in types.get('scheduled', [])),
+    )
+
+
+def load_rules(path) -> MetadataRules:
+    """Load and compile the metadata rules declared in a TOML file (see `compile_rules`)."""
+
+    with open(path, 'rb') as f:
+        return compile_rules(tomllib.load(f))
@@ -1,59 +1,61 @@
 from __future__ import annotations
 
-from typing import List, Sequence
+from typing import List, Optional, Sequence, Tuple
 from pathlib import Path
 
 import logging
 
-import zipfile
-
 from rag_etl.transformers import BaseTransformer
 from rag_etl.resources import BaseResource
 
-import rag_etl.utils.mime_types as mt
-
-
-def unzip_file(zip_path):
-    """
-    Unzips a ZIP archive into a folder named after the zip file (without .zip).
-
-    Args:
-        zip_path (str or Path): Path to the zip file.
-
-    Returns:
-        Path: Path to the folder where files were extracted.
-    """
-
-    zip_path = Path(zip_path)
-    extract_dir = zip_path.parent
-
-    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-        zip_ref.extractall(extract_dir)
+from rag_etl.transformers.extract_zip.utils import (
+    check_limits,
+    extract_zip,
+    list_wanted_members,
+    list_zip_members,
+    member_destination,
+    DEFAULT_SKIP_PATTERNS,
+    MAX_MEMBER_SIZE,
+    MAX_TOTAL_SIZE,
+    MAX_COMPRESSION_RATIO,
+)
 
-    return extract_dir
-
-
-def iter_files(root):
-    """
-    Recursively yields all files under `root`, skipping macOS metadata.
-    """
-    root = Path(root)
-    for path in root.rglob("*"):
-        if path.is_file():
-            # Skip macOS metadata
-            parts = set(path.parts)
-            if "__MACOSX" in parts or '.ipynb_checkpoints' in parts or path.name == ".DS_Store":
-                continue
-            yield path
+import rag_etl.utils.mime_types as mt
+from rag_etl.utils.archives import get_archive, local_path, member_path, mirror_path
+from rag_etl.utils.planning import StageEstimate
 
 
 class ExtractZipTransformer(BaseTransformer):
     """
     Transformer that extracts zip resources replacing them with their contents.
+
+    Only the members matching `mime_types` (all if None) and none of the `skip_patterns` are extracted,
+    next to the zip file, in a pool of `max_workers` threads. Members already extracted are not extracted
+    again, and zip files whose wanted members exceed the size or compression ratio limits are rejected.
+    The local images referenced from the notebooks extracted are extracted too, but do not become resources.
+
+    If `materialize` is False, nothing is extracted: the new resources point at the members inside the
+    zip file (see `rag_etl.utils.archives`), which are read lazily by the next transformers and loaders.
+    Zip files inside the zip file are then looked into as well.
     """
 
-    def __init__(self, mime_types=None):
+    def __init__(
+        self,
+        mime_types: Optional[Sequence[str]] = None,
+        skip_patterns: Sequence[str] = DEFAULT_SKIP_PATTERNS,
+        max_workers: int = 4,
+        max_member_size: int = MAX_MEMBER_SIZE,
+        max_total_size: int = MAX_TOTAL_SIZE,
+        max_ratio: float = MAX_COMPRESSION_RATIO,
+        materialize: bool = True,
+    ):
         self.mime_types = mime_types
+        self.skip_patterns = skip_patterns
+        self.max_workers = max_workers
+        self.max_member_size = max_member_size
+        self.max_total_size = max_total_size
+        self.max_ratio = max_ratio
+        self.materialize = materialize
 
     def transform(self, resources: Sequence[BaseResource]) -> List[BaseResource]:
         """
@@ -71,21 +73,22 @@ class ExtractZipTransformer(BaseTransformer):
 
             logging.debug(f"Unzipping {resource.path}")
 
-            # If resource is a zip file, unzip it
-            resource_folder = unzip_file(resource.path)
+            limits = dict(max_member_size=self.max_member_size, max_total_size=self.max_total_size, max_ratio=self.max_ratio)
 
-            # Iterate over extracted files and add new resources for each of them
-            for extracted_file in iter_files(resource_folder):
-                mime_type = mt.guess_mime_type(str(extracted_file))
-
-                # Skip if mime type not in list
-                if mime_type not in self.mime_types:
-                    continue
+            if self.materialize:
+                # If resource is a zip file, extract the wanted members next to it. Zip files inside archives are unpacked first
+                zip_path = local_path(resource.path)
+                member_paths = extract_zip(zip_path, zip_path.parent, self.mime_types, self.skip_patterns, self.max_workers, **limits)
+            else:
+                # Otherwise only list them
+                member_paths = list_zip_members(resource.path, self.mime_types, self.skip_patterns, **limits)
 
+            # Add new resources for each of the wanted members
+            for path in member_paths:
                 new_resource = resource.copy_with(
-                    title=f"{resource.title} > {extracted_file.name}",
-                    path=str(extracted_file),
-                    mime_type=mime_type,
+                    title=f"{resource.title} > {Path(path).name}",
+                    path=str(path),
+                    mime_type=mt.guess_mime_type(str(path)),
                 )
 
                 logging.debug(f"Appending {new_resource.path}")
@@ -93,3 +96,54 @@ class ExtractZipTransformer(BaseTransformer):
                 transformed_resources.append(new_resource)
 
         return transformed_resources
+
+    def plan(self, resources: Sequence[BaseResource]) -> Tuple[List[BaseResource], StageEstimate]:
+        """
+        Count the members that would be extracted, reading the central directories of the zip files only.
+        Zip files whose wanted members are all extracted already count as cache hits.
+
+        Nothing is extracted: members not extracted yet are passed on as paths inside the zip file
+        (see `rag_etl.utils.archives`), which the next transformers plan without unpacking them.
+        """
+
+        if not self.materialize:
+            return super().plan(resources)
+
+        estimate = StageEstimate(stage=self.__class__.__name__, resources_in=len(resources))
+
+        transformed_resources: List[BaseResource] = []
+
+        for resource in resources:
+            if resource.mime_type != mt.ZIP:
+                transformed_resources.append(resource)
+                continue
+
+            members = list_wanted_members(get_archive(resource.path), self.mime_types, self.skip_patterns)
+            check_limits(members, self.max_member_size, self.max_total_size, self.max_ratio)
+
+            # Members are extracted next to the zip file, itself unpacked to its mirror path if inside an archive
+            extract_dir = mirror_path(resource.path).parent
+
+            pending = 0
+            for info in members:
+                destination = member_destination(extract_dir, info)
+                if destination.is_file() and destination.stat().st_size == info.file_size:
+                    path = str(destination)
+                else:
+                    path = member_path(resource.path, info.filename)
+                    pending += 1
+
+                transformed_resources.append(resource.copy_with(
+                    title=f"{resource.title} > {Path(info.filename).name}",
+                    path=path,
+                    mime_type=mt.guess_mime_type(info.filename),
+                ))
+
+            if pending == 0:
+                estimate.cache_hits += 1
+            estimate.work_units += pending
+
+        estimate.resources_out = len(transformed_resources)
+        estimate.seconds = self.estimate_seconds(estimate.work_units)
+
+        return transformed_resources, estimate
@@ -0,0 +1,242 @@
+import io
+import os
+import zlib
+import fnmatch
+import logging
+import zipfile
+import posixpath
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Sequence, Union
+
+import nbformat
+
+import rag_etl.utils.mime_types as mt
+from rag_etl.utils.archives import Archive, get_archive, member_path
+from rag_etl.transformers.jupyter_to_markdown.utils import notebook_image_srcs
+
+
+# Members never worth extracting: macOS metadata and Jupyter checkpoints
+DEFAULT_SKIP_PATTERNS = ('__MACOSX/*', '*/__MACOSX/*', '.DS_Store', '*/.DS_Store', '.ipynb_checkpoints/*', '*/.ipynb_checkpoints/*')
+
+# Limits against zip bombs
+MAX_MEMBER_SIZE = 1 << 30           # uncompressed bytes of a single member
+MAX_TOTAL_SIZE = 4 << 30            # uncompressed bytes of all the members extracted from a zip file
+MAX_COMPRESSION_RATIO = 100         # uncompressed / compressed size of a member, for members larger than RATIO_MIN_SIZE
+RATIO_MIN_SIZE = 1 << 20
+
+
+class UnsafeZipError(ValueError):
+    """Zip file exceeding the size or compression ratio limits, or with members escaping the extraction folder."""
+
+
+def list_wanted_members(
+    zip_file: Union[zipfile.ZipFile, Archive],
+    mime_types: Optional[Sequence[str]] = None,
+    skip_patterns: Sequence[str] = DEFAULT_SKIP_PATTERNS,
+) -> List[zipfile.ZipInfo]:
+    """
+    List the members of a zip file worth extracting, from its central directory only.
+
+    Args:
+        zip_file: Open zip file, or zip `Archive`.
+        mime_types: Mime types of the members to keep. All if None.
+        skip_patterns: Glob patterns (`fnmatch`) of the member paths to skip.
+
+    Returns:
+        List[ZipInfo]: The wanted members, in the order of the zip file.
+    """
+
+    members = []
+    for info in zip_file.infolist():
+        if info.is_dir():
+            continue
+
+        if any(fnmatch.fnmatch(info.filename, pattern) for pattern in skip_patterns):
+            continue
+
+        if mime_types is not None and mt.guess_mime_type(info.filename) not in mime_types:
+            continue
+
+        members.append(info)
+
+    return members
+
+
+def notebook_image_members(zip_file: zipfile.ZipFile, notebook_info: zipfile.ZipInfo) -> List[zipfile.ZipInfo]:
+    """
+    List the members of a zip file that are local images referenced from a notebook member, resolved relative
+    to the notebook folder as in `resolve_image`, so that they can be extracted next to it.
+    """
+
+    try:
+        with zip_file.open(notebook_info) as f:
+            notebook_node = nbformat.read(io.TextIOWrapper(f, encoding='utf-8'), as_version=4)
+    except ValueError as e:
+        # Left to fail when the notebook is converted
+        logging.warning(f"Could not read notebook {notebook_info.filename} for its images: {e!r}")
+        return []
+
+    folder = posixpath.dirname(notebook_info.filename)
+
+    members = []
+    for src in notebook_image_srcs(notebook_node):
+        try:
+            members.append(zip_file.getinfo(posixpath.normpath(posixpath.join(folder, src))))
+        except KeyError:
+            # Not a file of the zip, e.g. a URL
+            continue
+
+    return members
+
+
+def check_limits(members: Sequence[zipfile.ZipInfo], max_member_size: int, max_total_size: int, max_ratio: float) -> None:
+    """Raise UnsafeZipError if the members to extract exceed the size or compression ratio limits."""
+
+    total_size = 0
+    for info in members:
+        if info.file_size > max_member_size:
+            raise UnsafeZipError(f"Member {info.filename} is {info.file_size} bytes, more than {max_member_size}")
+
+        if info.file_size > RATIO_MIN_SIZE and info.file_size / max(info.compress_size, 1) > max_ratio:
+            raise UnsafeZipError(f"Member {info.filename} has a compression ratio of {info.file_size / max(info.compress_size, 1):.0f}, more than {max_ratio}")
+
+        total_size += info.file_size
+
+    if total_size > max_total_size:
+        raise UnsafeZipError(f"Members to extract are {total_size} bytes, more than {max_total_size}")
+
+
+def member_destination(extract_dir: Path, info: zipfile.ZipInfo) -> Path:
+    """Path a member is extracted to. Raises UnsafeZipError if it would be outside of `extract_dir`."""
+
+    destination = extract_dir / info.filename
+    if not destination.resolve().is_relative_to(extract_dir.resolve()):
+        raise UnsafeZipError(f"Member {info.filename} would be extracted outside of {extract_dir}")
+
+    return destination
+
+
+def is_extracted(destination: Path, info: zipfile.ZipInfo) -> bool:
+    """Whether the member was already extracted to `destination`, i.e. a file with the same size and CRC exists."""
+
+    if not destination.is_file() or destination.stat().st_size != info.file_size:
+        return False
+
+    crc = 0
+    with destination.open('rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            crc = zlib.crc32(chunk, crc)
+
+    return crc == info.CRC
+
+
+def extract_member(zip_file: zipfile.ZipFile, info: zipfile.ZipInfo, destination: Path) -> None:
+    """Stream a member to `destination`, never writing more bytes than declared in the central directory."""
+
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = destination.with_name(f".{destination.name}.{threading.get_ident()}.part")
+
+    written = 0
+    with zip_file.open(info) as src, tmp_path.open('wb') as dst:
+        for chunk in iter(lambda: src.read(1 << 20), b''):
+            written += len(chunk)
+            if written > info.file_size:
+                dst.close()
+                tmp_path.unlink()
+                raise UnsafeZipError(f"Member {info.filename} is larger than declared")
+            dst.write(chunk)
+
+    os.replace(tmp_path, destination)
+
+
+def extract_zip(
+    zip_path: Path,
+    extract_dir: Path,
+    mime_types: Optional[Sequence[str]] = None,
+    skip_patterns: Sequence[str] = DEFAULT_SKIP_PATTERNS,
+    max_workers: int = 4,
+    max_member_size: int = MAX_MEMBER_SIZE,
+    max_total_size: int = MAX_TOTAL_SIZE,
+    max_ratio: float = MAX_COMPRESSION_RATIO,
+) -> List[Path]:
+    """
+    Extract the wanted members of a zip file (see `list_wanted_members`) into `extract_dir`.
+
+    The local images referenced from wanted notebooks are extracted too, even if not wanted themselves, for
+    their ALT texts to be generated. Members already extracted with the same size and CRC are skipped, the
+    rest are streamed to disk in parallel. Nothing is extracted if the members to extract exceed the size or
+    compression ratio limits.
+
+    Returns:
+        List[Path]: Paths of the wanted members, in the order of the zip file.
+    """
+
+    with zipfile.ZipFile(zip_path) as zip_file:
+        members = list_wanted_members(zip_file, mime_types, skip_patterns)
+
+        # Images of the notebooks, which are not resources of their own
+        images = [image for info in members if mt.guess_mime_type(info.filename) == mt.IPYNB for image in notebook_image_members(zip_file, info)]
+        images = [image for image in dict.fromkeys(images) if image not in members and not image.is_dir()]
+
+        check_limits(members + images, max_member_size, max_total_size, max_ratio)
+
+        destinations = [member_destination(extract_dir, info) for info in members]
+        image_destinations = [member_destination(extract_dir, info) for info in images]
+
+        pending = [
+            (info, destination) for info, destination in zip(members + images, destinations + image_destinations)
+            if not is_extracted(destination, info)
+        ]
+        logging.debug(f"Extracting {len(pending)} of {len(members)} wanted members and {len(images)} notebook images of {zip_path}")
+
+        # Members are decompressed in parallel, reading through the shared zip file handle
+        if max_workers > 1 and len(pending) > 1:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                list(executor.map(lambda job: extract_member(zip_file, *job), pending))
+        else:
+            for info, destination in pending:
+                extract_member(zip_file, info, destination)
+
+    return destinations
+
+
+def list_zip_members(
+    zip_path: str,
+    mime_types: Optional[Sequence[str]] = None,
+    skip_patterns: Sequence[str] = DEFAULT_SKIP_PATTERNS,
+    max_member_size: int = MAX_MEMBER_SIZE,
+    max_total_size: int = MAX_TOTAL_SIZE,
+    max_ratio: float = MAX_COMPRESSION_RATIO,
+    max_depth: int = 3,
+) -> List[str]:
+    """
+    List the wanted members of a zip file (see `list_wanted_members`) as archive member paths
+    (see `rag_etl.utils.archives`), without extracting anything. The zip file can itself be inside an archive.
+
+    Zip members are listed recursively, up to `max_depth` levels of nesting, instead of being returned.
+    The size and compression ratio limits apply to each zip file.
+
+    Returns:
+        List[str]: Paths of the wanted members, in the order of the zip file(s).
+    """
+
+    archive = get_archive(zip_path)
+
+    # Nested zip files are wanted too, to look into them
+    wanted_mime_types = None if mime_types is None else [*mime_types, mt.ZIP]
+    members = list_wanted_members(archive, wanted_mime_types if max_depth > 0 else mime_types, skip_patterns)
+    check_limits(members, max_member_size, max_total_size, max_ratio)
+
+    paths = []
+    for info in members:
+        path = member_path(zip_path, info.filename)
+
+        if max_depth > 0 and mt.guess_mime_type(info.filename) == mt.ZIP:
+            paths.extend(list_zip_members(path, mime_types, skip_patterns, max_member_size, max_total_size, max_ratio, max_depth - 1))
+        else:
+            paths.append(path)
+
+    return paths
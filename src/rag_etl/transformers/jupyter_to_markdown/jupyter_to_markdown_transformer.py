@@ -1,25 +1,120 @@
 from __future__ import annotations
 
-from typing import List, Sequence
-from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 import logging
+import time
+
+from PIL import Image
 
 from rag_etl.transformers import BaseTransformer
 from rag_etl.resources import BaseResource
 
-from rag_etl.transformers.jupyter_to_markdown.utils import convert_ipynb_to_md
+from rag_etl.transformers.jupyter_to_markdown.utils import (
+    convert_ipynb_to_md,
+    find_notebook_images,
+    MAX_OUTPUT_LINES,
+    MAX_OUTPUT_CHARS,
+)
 
 import rag_etl.utils.mime_types as mt
+from rag_etl.utils.archives import mirror_path, open_binary, stat
+from rag_etl.utils.cache import hash_file
+from rag_etl.utils.llms import alt_text_cache_path, generate_alt_texts, ALT_TEXT_MAX_SIZE
+from rag_etl.utils.planning import StageEstimate, estimate_image_tokens, estimate_png_bytes, PROMPT_TOKENS
 
 
 class JupyterToMarkdownTransformer(BaseTransformer):
     """
     Transformer that converts Jupyter notebook resources into Markdown resources.
 
-    Non-Jupyter resources are left unchanged.
+    Non-Jupyter resources are left unchanged. Notebooks not found in the cache are converted in a pool
+    of `max_workers` processes, if greater than one. Cell outputs are shrunk before conversion
+    according to `max_output_lines`, `max_output_chars` and `strip_output_images` (see `truncate_outputs`),
+    which are part of the cache scope.
     """
 
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_output_lines: int = MAX_OUTPUT_LINES,
+        max_output_chars: int = MAX_OUTPUT_CHARS,
+        strip_output_images: bool = True,
+    ):
+        self.max_workers = max_workers
+        self.max_output_lines = max_output_lines
+        self.max_output_chars = max_output_chars
+        self.strip_output_images = strip_output_images
+
+    @property
+    def cache_scope(self) -> str:
+        # Converted notebooks depend on the limits on cell outputs
+        images = 'strip' if self.strip_output_images else 'keep'
+        return f"{self.__class__.__name__}_{self.max_output_lines}l_{self.max_output_chars}c_{images}"
+
+    def _generate_alt_texts(self, paths: List[Tuple[str, str]]) -> Dict[str, Dict[str, str]]:
+        """
+        Generate the ALT texts of the images of all the given notebooks at once, in this process, so that images
+        shared by several notebooks are described once and requests are limited across all notebooks.
+
+        Returns:
+            dict: ALT texts of the images of each notebook, by notebook path and then image path.
+        """
+
+        images: Dict[str, List[str]] = {}
+        for ipynb_path, _ in paths:
+            try:
+                images[ipynb_path] = find_notebook_images(ipynb_path)
+            except Exception as e:
+                # Left to fail when the notebook is converted
+                logging.debug(f"Could not list the images of {ipynb_path}: {e!r}")
+                images[ipynb_path] = []
+
+        alt_texts = generate_alt_texts([image_path for image_paths in images.values() for image_path in image_paths])
+
+        return {ipynb_path: {image_path: alt_texts[image_path] for image_path in image_paths} for ipynb_path, image_paths in images.items()}
+
+    def _convert_all(self, paths: List[Tuple[str, str]]) -> None:
+        """
+        Convert the given (ipynb path, md path) pairs, in a process pool if configured, caching each notebook
+        as soon as it is converted. If some conversions fail, the first error is raised once all are done.
+        """
+
+        # Notebooks referenced by several resources are converted once
+        paths = list(dict.fromkeys(paths))
+        limits = (self.max_output_lines, self.max_output_chars, self.strip_output_images)
+
+        alt_texts = self._generate_alt_texts(paths)
+
+        error = None
+
+        if self.max_workers and self.max_workers > 1 and len(paths) > 1:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = {executor.submit(convert_ipynb_to_md, ipynb_path, md_path, *limits, alt_texts[ipynb_path]): (ipynb_path, md_path) for ipynb_path, md_path in paths}
+                for future in as_completed(futures):
+                    try:
+                        future.result()
+                    except Exception as e:
+                        logging.error(f"Failed to convert {futures[future][0]}: {e!r}")
+                        error = error or e
+                        continue
+
+                    self.set_to_cache(*futures[future])
+        else:
+            for ipynb_path, md_path in paths:
+                try:
+                    convert_ipynb_to_md(ipynb_path, md_path, *limits, alt_texts[ipynb_path])
+                except Exception as e:
+                    logging.error(f"Failed to convert {ipynb_path}: {e!r}")
+                    error = error or e
+                    continue
+
+                self.set_to_cache(ipynb_path, md_path)
+
+        if error is not None:
+            raise error
+
     def transform(self, resources: Sequence[BaseResource]) -> List[BaseResource]:
         """
         Converts Jupyter notebook resources into Markdown resources.
@@ -28,6 +123,7 @@ class JupyterToMarkdownTransformer(BaseTransformer):
         """
 
         transformed_resources: List[BaseResource] = []
+        pending: List[Tuple[str, str]] = []
 
         for resource in resources:
             # Skip if resource is not a Jupyter notebook
@@ -35,16 +131,16 @@ class JupyterToMarkdownTransformer(BaseTransformer):
                 transformed_resources.append(resource)
                 continue
 
-            # Build paths of ipynb file and md file
-            ipynb_path = Path(resource.path)
-            md_path = ipynb_path.with_suffix('.md')
+            # Build paths of ipynb file and md file. Notebooks inside archives are read without unpacking them
+            ipynb_path = resource.path
+            md_path = mirror_path(ipynb_path).with_suffix('.md')
+            md_path.parent.mkdir(parents=True, exist_ok=True)
 
             # Only convert if not cached
             cached = self.get_from_cache(ipynb_path, md_path)
             if not cached:
-                logging.debug(f"Splitting {resource.path} into exercises")
-                convert_ipynb_to_md(ipynb_path, md_path)
-                self.set_to_cache(ipynb_path, md_path)
+                logging.debug(f"Converting {resource.path} → {md_path.name}")
+                pending.append((ipynb_path, str(md_path)))
 
             # Build transformed resource and append it
             new_resource = resource.copy_with(
@@ -54,4 +150,66 @@ class JupyterToMarkdownTransformer(BaseTransformer):
             )
             transformed_resources.append(new_resource)
 
+        # Convert all notebooks not found in the cache at once
+        if pending:
+            start = time.perf_counter()
+            self._convert_all(pending)
+            self.record_throughput(len(pending), time.perf_counter() - start)
+
         return transformed_resources
+
+    def plan(self, resources: Sequence[BaseResource]) -> Tuple[List[BaseResource], StageEstimate]:
+        """
+        Count the notebooks that would be converted and the images that would be sent to the VLM for an ALT text.
+        Notebooks found in the cache count as cache hits, and so do images whose ALT text is cached. Identical
+        images are only counted once.
+        """
+
+        estimate = StageEstimate(stage=self.__class__.__name__, resources_in=len(resources))
+
+        transformed_resources: List[BaseResource] = []
+        image_hashes = set()
+
+        for resource in resources:
+            if resource.mime_type != mt.IPYNB:
+                transformed_resources.append(resource)
+                continue
+
+            ipynb_path = resource.path
+            md_path = mirror_path(ipynb_path).with_suffix('.md')
+
+            if self.is_cached(ipynb_path, md_path):
+                estimate.cache_hits += 1
+            else:
+                # One VLM request per distinct local image without a cached ALT text
+                for image_path in find_notebook_images(ipynb_path):
+                    image_hash = hash_file(image_path)
+                    if image_hash in image_hashes or alt_text_cache_path(image_hash).exists():
+                        continue
+                    image_hashes.add(image_hash)
+
+                    with open_binary(image_path) as f, Image.open(f) as img:
+                        width, height = img.size
+
+                    # Images are uploaded as is, unless downscaled as in `image_data_url`
+                    scale = min(1.0, ALT_TEXT_MAX_SIZE[0] / width, ALT_TEXT_MAX_SIZE[1] / height)
+                    estimate.input_tokens += PROMPT_TOKENS + estimate_image_tokens(width * scale, height * scale)
+                    if scale < 1.0:
+                        estimate.upload_bytes += estimate_png_bytes(width * scale, height * scale)
+                    else:
+                        estimate.upload_bytes += stat(image_path).st_size * 4 // 3
+                    estimate.alt_text_images += 1
+                    estimate.vlm_requests += 1
+
+                estimate.work_units += 1
+
+            transformed_resources.append(resource.copy_with(
+                path=str(md_path),
+                mime_type=mt.MARKDOWN,
+                processing_method=None,
+            ))
+
+        estimate.resources_out = len(transformed_resources)
+        estimate.seconds = self.estimate_seconds(estimate.work_units)
+
+        return transformed_resources, estimate
@@ -1,20 +1,118 @@
 from pathlib import Path
 
+from typing import Dict, List, Optional
+
+import os
 import re
+import posixpath
+
+from functools import lru_cache
 
 import nbformat
 from nbconvert import MarkdownExporter
 
-from rag_etl.utils.llms import generate_alt_text
+from rag_etl.utils.llms import generate_alt_texts
+from rag_etl.utils.archives import exists, open_text
+
+
+# Images in Markdown (![alt](src), groups 1 and 2) and HTML (<img...>, group 3) syntax
+IMAGE_RE = re.compile(r'!\[(.*?)\]\((.*?)\)|<img\s+[^>]*src="([^"]+)"[^>]*>', re.IGNORECASE)
+
+# Limits on the size of each cell output, applied before exporting notebooks
+MAX_OUTPUT_LINES = 40
+MAX_OUTPUT_CHARS = 4000
+
+
+@lru_cache(maxsize=1)
+def get_markdown_exporter() -> MarkdownExporter:
+    """Markdown exporter, created once per process since its template setup is expensive."""
+    return MarkdownExporter()
+
+
+def truncate_text(text: str, max_lines: int, max_chars: int) -> str:
+    """Keep the beginning and the end of a text exceeding the given number of lines or characters."""
+
+    lines = text.splitlines()
+    if len(lines) <= max_lines and len(text) <= max_chars:
+        return text
+
+    # Keep the first and last lines, each within half of the characters allowed
+    if len(lines) > max_lines:
+        head = '\n'.join(lines[:max_lines // 2])
+        tail = '\n'.join(lines[len(lines) - (max_lines - max_lines // 2):])
+    else:
+        head, tail = text, text
+
+    head, tail = head[:max_chars // 2], tail[len(tail) - max_chars // 2:]
+
+    return f"{head}\n... [output truncated] ...\n{tail}"
 
 
-def convert_ipynb_to_md(ipynb_path, md_path):
+def truncate_outputs(notebook_node, max_lines: int = MAX_OUTPUT_LINES, max_chars: int = MAX_OUTPUT_CHARS, strip_images: bool = True) -> None:
+    """
+    Shrink the cell outputs of a notebook in place: long texts (streams, tracebacks, results) are truncated,
+    embedded images are stripped if `strip_images`, and rich representations exceeding `max_chars`
+    (e.g. HTML tables) are dropped in favour of their plain text representation.
+    """
+
+    for cell in notebook_node.cells:
+        if cell.cell_type != 'code':
+            continue
+
+        outputs = []
+        for output in cell.get('outputs', []):
+            if output.output_type == 'stream':
+                output.text = truncate_text(output.text, max_lines, max_chars)
+
+            elif output.output_type == 'error':
+                output.traceback = truncate_text('\n'.join(output.traceback), max_lines, max_chars).split('\n')
+
+            elif output.output_type in ('execute_result', 'display_data'):
+                data = output.get('data', {})
+
+                for mime_type in list(data):
+                    if strip_images and mime_type.startswith('image/'):
+                        del data[mime_type]
+                    elif mime_type == 'text/plain':
+                        data[mime_type] = truncate_text(data[mime_type], max_lines, max_chars)
+                    elif len(str(data[mime_type])) > max_chars and 'text/plain' in data:
+                        del data[mime_type]
+
+                # Drop outputs left empty
+                if not data:
+                    continue
+
+            outputs.append(output)
+
+        cell.outputs = outputs
+
+
+def resolve_image(ipynb_path, src) -> Optional[str]:
+    """Path of an image referenced from a notebook, relative to the notebook folder. None if not an existing file."""
+
+    # Plain strings, as the notebook can be inside an archive (see `rag_etl.utils.archives`)
+    path = posixpath.normpath(posixpath.join(posixpath.dirname(os.path.abspath(ipynb_path)), src))
+    return path if exists(path) and not os.path.isdir(path) else None
+
+
+def convert_ipynb_to_md(
+    ipynb_path,
+    md_path,
+    max_output_lines: int = MAX_OUTPUT_LINES,
+    max_output_chars: int = MAX_OUTPUT_CHARS,
+    strip_output_images: bool = True,
+    alt_texts: Optional[Dict[str, str]] = None,
+):
     """
     Convert a Jupyter Notebook (.ipynb) to a Markdown (.md) file.
+    The notebook and its images can be inside an archive, they are read without unpacking it.
 
     Parameters:
         ipynb_path (str or Path): Path to the input Jupyter notebook file.
         md_path (str or Path): Path for the output Markdown file.
+        max_output_lines, max_output_chars, strip_output_images: Limits on cell outputs, see `truncate_outputs`.
+        alt_texts (dict): ALT texts already generated, by image path (see `find_notebook_images`).
+            Those of the other images are generated here.
     """
 
     ################################################################
@@ -22,49 +120,76 @@ def convert_ipynb_to_md(ipynb_path, md_path):
     ################################################################
 
     # Normalise to pathlib Paths
-    ipynb_path = Path(ipynb_path)
     md_path = Path(md_path)
 
     # Read notebook
-    with open(ipynb_path, "r", encoding="utf-8") as f:
+    with open_text(ipynb_path) as f:
         notebook_node = nbformat.read(f, as_version=4)
 
-    # Export to markdown
-    markdown_exporter = MarkdownExporter()
-    text, _ = markdown_exporter.from_notebook_node(notebook_node)
+    # Shrink outputs, then export to markdown
+    truncate_outputs(notebook_node, max_output_lines, max_output_chars, strip_output_images)
+    text, _ = get_markdown_exporter().from_notebook_node(notebook_node)
 
     ################################################################
     # Replace images with ALT texts                                #
     ################################################################
 
-    # Replace Markdown images (![alt](src))
-    def md_image_replace(match):
-        alt, src = match.group(1), match.group(2)
-        p = (md_path.parent / src).resolve()
-
-        if p.exists():
-            alt = generate_alt_text(str(p))
-
-        return f"![{alt}]({src})"
-
-    md_image_re = re.compile(r'!\[(.*?)\]\((.*?)\)')
-    text = md_image_re.sub(md_image_replace, text)
+    # Collect all local images, and generate the missing ALT texts at once
+    srcs = {match.group(2) if match.group(2) is not None else match.group(3) for match in IMAGE_RE.finditer(text)}
+    image_paths = {src: resolve_image(ipynb_path, src) for src in srcs}
 
-    # Replace HTML images (<img...)
-    def html_image_replace(m):
-        tag, src = m.group(0), m.group(1)
-        p = (md_path.parent / src).resolve()
+    alt_texts = dict(alt_texts or {})
+    missing = [path for path in image_paths.values() if path is not None and path not in alt_texts]
+    if missing:
+        alt_texts.update(generate_alt_texts(missing))
 
-        if p.exists():
-            alt = generate_alt_text(str(p))
+    # Replace both Markdown images (![alt](src)) and HTML images (<img...) in a single pass
+    def image_replace(match):
+        if match.group(2) is not None:
+            alt, src = match.group(1), match.group(2)
         else:
-            alt_match = re.search(r'alt="([^"]*)"', tag, re.IGNORECASE)
+            src = match.group(3)
+            alt_match = re.search(r'alt="([^"]*)"', match.group(0), re.IGNORECASE)
             alt = alt_match.group(1) if alt_match else ""
 
+        if image_paths[src] is not None:
+            alt = alt_texts[image_paths[src]]
+
         return f"![{alt}]({src})"
 
-    html_image_re = re.compile(r'<img\s+[^>]*src="([^"]+)"[^>]*>', re.IGNORECASE)
-    text = html_image_re.sub(html_image_replace, text)
+    text = IMAGE_RE.sub(image_replace, text)
 
     # Write md file
     md_path.write_text(text, encoding="utf-8")
+
+
+def find_notebook_images(ipynb_path) -> List[str]:
+    """
+    List the local image files referenced from the Markdown cells of a Jupyter Notebook, i.e. the
+    images `convert_ipynb_to_md` would generate an ALT text for. The notebook is not exported.
+
+    Parameters:
+        ipynb_path (str or Path): Path to the input Jupyter notebook file.
+    """
+
+    # Read notebook
+    with open_text(ipynb_path) as f:
+        notebook_node = nbformat.read(f, as_version=4)
+
+    # Keep only existing files, each once as in `convert_ipynb_to_md`
+    paths = [resolve_image(ipynb_path, src) for src in notebook_image_srcs(notebook_node)]
+    return list(dict.fromkeys(p for p in paths if p is not None))
+
+
+def notebook_image_srcs(notebook_node) -> List[str]:
+    """Sources of the images in the Markdown cells of a notebook, each once, whether local files or not."""
+
+    # Gather sources of both Markdown images (![alt](src)) and HTML images (<img...)
+    srcs = []
+    for cell in notebook_node.cells:
+        if cell.cell_type != 'markdown':
+            continue
+
+        srcs.extend(match.group(2) if match.group(2) is not None else match.group(3) for match in IMAGE_RE.finditer(cell.source))
+
+    return list(dict.fromkeys(srcs))
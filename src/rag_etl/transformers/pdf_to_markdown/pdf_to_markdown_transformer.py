@@ -1,16 +1,24 @@
 from __future__ import annotations
 
-from typing import List, Sequence
-from pathlib import Path
+from typing import List, Sequence, Tuple
 
 import logging
+import time
 
 from rag_etl.transformers import BaseTransformer
 from rag_etl.resources import BaseResource
 
-from rag_etl.transformers.pdf_to_markdown.utils import convert_pdf_to_md
+from rag_etl.transformers.pdf_to_markdown.utils import convert_pdf_to_md, get_pdf_page_sizes
 
 import rag_etl.utils.mime_types as mt
+from rag_etl.utils.archives import local_path, mirror_path
+from rag_etl.utils.planning import (
+    StageEstimate,
+    estimate_image_tokens,
+    estimate_png_bytes,
+    MD_TOKENS_PER_PAGE,
+    PROMPT_TOKENS,
+)
 
 
 class PDFToMarkdownTransformer(BaseTransformer):
@@ -23,6 +31,17 @@ class PDFToMarkdownTransformer(BaseTransformer):
     def __init__(self, type_subtypes=None) -> None:
         self.type_subtypes = type_subtypes
 
+    def _is_convertible(self, resource: BaseResource) -> bool:
+        # Skip if resource is not in the specified list of types and subtypes
+        if self.type_subtypes and (resource.type, resource.subtype) not in self.type_subtypes:
+            return False
+
+        # Skip if resource is not a PDF
+        if resource.mime_type != mt.PDF:
+            return False
+
+        return True
+
     def transform(self, resources: Sequence[BaseResource]) -> List[BaseResource]:
         """
         Convert PDF resources into Markdown text.
@@ -33,24 +52,20 @@ class PDFToMarkdownTransformer(BaseTransformer):
         transformed_resources: List[BaseResource] = []
 
         for resource in resources:
-            # Skip if resource is not in the specified list of types and subtypes
-            if self.type_subtypes and (resource.type, resource.subtype) not in self.type_subtypes:
+            if not self._is_convertible(resource):
                 transformed_resources.append(resource)
                 continue
 
-            # Skip if resource is not a PDF
-            if resource.mime_type != mt.PDF:
-                transformed_resources.append(resource)
-                continue
-
-            # Build paths of PDF file and md file
-            pdf_path = Path(resource.path)
-            md_path = pdf_path.with_suffix(".md")
+            # Build path of md file. PDFs inside archives are only unpacked if they need to be converted
+            md_path = mirror_path(resource.path).with_suffix(".md")
 
             # Only convert if not cached
             if not md_path.exists():
+                pdf_path = local_path(resource.path)
                 logging.debug(f"Converting {resource.path} → {md_path.name}")
+                start = time.perf_counter()
                 convert_pdf_to_md(pdf_path, md_path)
+                self.record_throughput(len(get_pdf_page_sizes(pdf_path)), time.perf_counter() - start)
 
             # Build transformed resource and append it
             new_resource = resource.copy_with(
@@ -61,3 +76,50 @@ class PDFToMarkdownTransformer(BaseTransformer):
             transformed_resources.append(new_resource)
 
         return transformed_resources
+
+    def plan(self, resources: Sequence[BaseResource]) -> Tuple[List[BaseResource], StageEstimate]:
+        """
+        Count the pages that would be rendered and sent to the VLM, plus one stitching request per PDF.
+        PDFs already converted to Markdown count as cache hits.
+        """
+
+        estimate = StageEstimate(stage=self.__class__.__name__, resources_in=len(resources))
+
+        transformed_resources: List[BaseResource] = []
+
+        for resource in resources:
+            if not self._is_convertible(resource):
+                transformed_resources.append(resource)
+                continue
+
+            md_path = mirror_path(resource.path).with_suffix(".md")
+
+            if md_path.exists():
+                estimate.cache_hits += 1
+            else:
+                page_sizes = get_pdf_page_sizes(resource.path)
+
+                # One VLM request per page, with the same clamp as in `downscale_if_needed`
+                for width, height in page_sizes:
+                    scale = min(1.0, 2048 / width, 3072 / height)
+                    estimate.input_tokens += PROMPT_TOKENS + estimate_image_tokens(width * scale, height * scale)
+                    estimate.upload_bytes += estimate_png_bytes(width * scale, height * scale)
+
+                # One stitching request with all page Markdown snippets
+                estimate.input_tokens += PROMPT_TOKENS + MD_TOKENS_PER_PAGE * len(page_sizes)
+
+                estimate.pdf_pages += len(page_sizes)
+                estimate.vlm_requests += len(page_sizes)
+                estimate.llm_requests += 1
+                estimate.work_units += len(page_sizes)
+
+            transformed_resources.append(resource.copy_with(
+                path=str(md_path),
+                mime_type=mt.MARKDOWN,
+                processing_method=None,
+            ))
+
+        estimate.resources_out = len(transformed_resources)
+        estimate.seconds = self.estimate_seconds(estimate.work_units)
+
+        return transformed_resources, estimate
@@ -1,13 +1,13 @@
-import io
 import asyncio
-import base64
 
-from typing import Optional, List
+from typing import Optional, List, Tuple
 
 import pymupdf
 from PIL import Image
 
 from rag_etl.utils.llms import send_llm_request
+from rag_etl.utils.archives import open_binary, split_member_path
+from rag_etl.utils.images import downscale_if_needed, to_data_uri
 
 
 def render_pdf_pages(pdf_path: str, dpi: Optional[int] = None) -> List[Image.Image]:
@@ -38,25 +38,26 @@ def render_pdf_pages(pdf_path: str, dpi: Optional[int] = None) -> List[Image.Ima
     return pages
 
 
-def downscale_if_needed(img: Image.Image, max_w: int = 2048, max_h: int = 3072) -> Image.Image:
-    """Downscale only if image exceeds given bounds; preserve sharpness with LANCZOS."""
-
-    w, h = img.size
-    if w <= max_w and h <= max_h:
-        return img
-
-    scale = min(max_w / w, max_h / h)
-    new_size = (int(w * scale), int(h * scale))
+def get_pdf_page_sizes(pdf_path: str, dpi: Optional[int] = None) -> List[Tuple[float, float]]:
+    """
+    Return the (width, height) in pixels each PDF page would have once rendered, without rendering them.
+    If dpi is provided, scale accordingly; otherwise use default (~72 DPI).
+    The PDF can be inside an archive, it is then read in memory rather than unpacked.
+    """
 
-    return img.resize(new_size, Image.LANCZOS)
+    zoom = (dpi / 72.0) if dpi else 1.0
 
+    if split_member_path(pdf_path)[1] is None:
+        doc = pymupdf.open(pdf_path)
+    else:
+        with open_binary(pdf_path) as f:
+            doc = pymupdf.open(stream=f.read(), filetype='pdf')
+    try:
+        sizes = [(page.rect.width * zoom, page.rect.height * zoom) for page in doc]
+    finally:
+        doc.close()
 
-def to_data_uri(img: Image.Image) -> str:
-    """Encode a PIL Image as base64 data URI."""
-    buf = io.BytesIO()
-    img.save(buf, format="PNG")
-    b64 = base64.b64encode(buf.getvalue()).decode("utf-8")
-    return f"data:image/png;base64,{b64}"
+    return sizes
 
 
 def convert_page_pdf_to_md(pil_page):
@@ -1,16 +1,28 @@
 from __future__ import annotations
 
-from typing import List, Sequence
+from typing import List, Sequence, Tuple
 from pathlib import Path
 
 import logging
+import time
 
 from rag_etl.transformers import BaseTransformer
 from rag_etl.resources import BaseResource
 
-from rag_etl.transformers.split_exercises.utils import split_md_into_exercises
+from rag_etl.transformers.split_exercises.utils import (
+    split_md_into_exercises,
+    find_heading_boundaries,
+    score_boundaries,
+    make_windows,
+    MIN_CONFIDENCE,
+    WINDOW_TOKENS,
+    WINDOW_OVERLAP_TOKENS,
+    SPLIT_CONCURRENCY,
+)
 
 import rag_etl.utils.mime_types as mt
+from rag_etl.utils.archives import exists, local_path, mirror_path, read_text
+from rag_etl.utils.planning import StageEstimate, estimate_text_tokens, DEFAULT_DOCUMENT_TOKENS, PROMPT_TOKENS
 
 
 class SplitExercisesTransformer(BaseTransformer):
@@ -18,10 +30,48 @@ class SplitExercisesTransformer(BaseTransformer):
     Transformer that splits resources containing exercises into a resource per exercise.
 
     Only Markdown resources are considered. Any PDF should first be converted to Markdown before splitting.
+    Exercises are split by their headings, and the LLM is only asked for the boundaries of the documents
+    whose headings score below `min_confidence` (see `score_boundaries`). Documents longer than `window_tokens`
+    are sent in windows overlapping by `overlap_tokens`, with at most `max_concurrency` requests at a time.
     """
 
-    def __init__(self, type_subtypes=None) -> None:
+    def __init__(
+        self,
+        type_subtypes=None,
+        min_confidence: float = MIN_CONFIDENCE,
+        window_tokens: int = WINDOW_TOKENS,
+        overlap_tokens: int = WINDOW_OVERLAP_TOKENS,
+        max_concurrency: int = SPLIT_CONCURRENCY,
+    ) -> None:
         self.type_subtypes = type_subtypes
+        self.min_confidence = min_confidence
+        self.window_tokens = window_tokens
+        self.overlap_tokens = overlap_tokens
+        self.max_concurrency = max_concurrency
+
+    def _is_splittable(self, resource: BaseResource) -> bool:
+        # Skip if resource is not in the specified list of types and subtypes
+        if self.type_subtypes and (resource.type, resource.subtype) not in self.type_subtypes:
+            return False
+
+        # Skip if resource is not Markdown
+        if resource.mime_type != mt.MARKDOWN:
+            return False
+
+        return True
+
+    def _exercise_resources(self, resource: BaseResource, exercises_path: Path) -> List[BaseResource]:
+        # Build resource for each exercise file
+        return [
+            resource.copy_with(
+                title=f"{resource.title} > Exercise {exercise_md_path.stem}",
+                path=str(exercise_md_path),
+                sub_number=exercise_md_path.stem,
+                processing_method=None,
+                one_chunk_per_doc=True,
+            )
+            for exercise_md_path in sorted(exercises_path.glob("*.md"))
+        ]
 
     def transform(self, resources: Sequence[BaseResource]) -> List[BaseResource]:
         """
@@ -32,34 +82,80 @@ class SplitExercisesTransformer(BaseTransformer):
         transformed_resources: List[BaseResource] = []
 
         for resource in resources:
-            # Skip if resource is not in the specified list of types and subtypes
-            if self.type_subtypes and (resource.type, resource.subtype) not in self.type_subtypes:
-                transformed_resources.append(resource)
-                continue
-
-            # Skip if resource is not Markdown
-            if resource.mime_type != mt.MARKDOWN:
+            if not self._is_splittable(resource):
                 transformed_resources.append(resource)
                 continue
 
             # Build paths of md file and exercises folder
-            md_path = Path(resource.path)
-            exercises_path = md_path.parent / 'exercises'
+            exercises_path = mirror_path(resource.path).parent / 'exercises'
 
             # Only split if not cached
             if not exercises_path.exists():
+                md_path = local_path(resource.path)
                 logging.debug(f"Splitting {resource.path} into exercises")
-                split_md_into_exercises(md_path, exercises_path)
-
-            # Build resource for each exercise file
-            for exercise_md_path in sorted(exercises_path.glob("*.md")):
-                new_resource = resource.copy_with(
-                    title=f"{resource.title} > Exercise {exercise_md_path.stem}",
-                    path=str(exercise_md_path),
-                    sub_number=exercise_md_path.stem,
-                    processing_method=None,
-                    one_chunk_per_doc=True,
+                start = time.perf_counter()
+                used_llm = split_md_into_exercises(
+                    md_path, exercises_path, self.min_confidence, self.window_tokens, self.overlap_tokens, self.max_concurrency
                 )
-                transformed_resources.append(new_resource)
+
+                # Only LLM segmentation takes significant time, splitting by headings is immediate
+                if used_llm:
+                    self.record_throughput(estimate_text_tokens(md_path.read_text(encoding='utf-8')), time.perf_counter() - start)
+
+            transformed_resources.extend(self._exercise_resources(resource, exercises_path))
 
         return transformed_resources
+
+    def plan(self, resources: Sequence[BaseResource]) -> Tuple[List[BaseResource], StageEstimate]:
+        """
+        Count the documents that would be sent to the LLM to be split, and their size in tokens.
+        Documents already split count as cache hits, and documents with unambiguous headings are split locally.
+
+        The number of exercises of a document is only known once split, so documents not split yet are passed through.
+        Markdown files that do not exist yet (e.g. PDFs still to be converted) are assumed to have a default size.
+        """
+
+        estimate = StageEstimate(stage=self.__class__.__name__, resources_in=len(resources))
+
+        transformed_resources: List[BaseResource] = []
+
+        for resource in resources:
+            if not self._is_splittable(resource):
+                transformed_resources.append(resource)
+                continue
+
+            md_path = resource.path
+            exercises_path = mirror_path(md_path).parent / 'exercises'
+
+            if exercises_path.exists():
+                estimate.cache_hits += 1
+                transformed_resources.extend(self._exercise_resources(resource, exercises_path))
+                continue
+
+            if exists(md_path):
+                md_text = read_text(md_path)
+                lines = md_text.splitlines(keepends=True)
+
+                _, confidence = score_boundaries(find_heading_boundaries(lines))
+                if confidence >= self.min_confidence:
+                    transformed_resources.append(resource)
+                    continue
+
+                # One request per window, overlaps being sent twice
+                windows = make_windows(lines, self.window_tokens, self.overlap_tokens)
+                tokens = estimate_text_tokens(md_text)
+                estimate.input_tokens += sum(PROMPT_TOKENS + estimate_text_tokens(''.join(lines[start:end])) for start, end in windows)
+                estimate.llm_requests += len(windows)
+            else:
+                tokens = DEFAULT_DOCUMENT_TOKENS
+                estimate.input_tokens += PROMPT_TOKENS + tokens
+                estimate.llm_requests += 1
+
+            estimate.work_units += tokens
+
+            transformed_resources.append(resource)
+
+        estimate.resources_out = len(transformed_resources)
+        estimate.seconds = self.estimate_seconds(estimate.work_units)
+
+        return transformed_resources, estimate
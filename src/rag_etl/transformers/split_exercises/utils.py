@@ -1,81 +1,433 @@
+import re
+import bisect
+import asyncio
+import logging
+
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Iterator, List, Optional, Sequence, Tuple
 
-from typing import List
 from pydantic import BaseModel, Field
 
 from rag_etl.utils.llms import send_llm_request
+from rag_etl.utils.planning import estimate_text_tokens
 
 
-def split_md_into_exercises(md_path, exercises_path):
-    # Normalise to Paths
-    md_path = Path(md_path)
-    exercises_path = Path(exercises_path)
+# Model asked for the exercise boundaries when the headings are ambiguous
+SPLIT_MODEL = 'Qwen/Qwen3-30B-A3B-Instruct-2507'
 
-    # Read Markdown file to be split
-    md_text = md_path.read_text(encoding='utf-8')
+# Documents whose heading-based boundaries score below this confidence are segmented by the LLM
+MIN_CONFIDENCE = 0.75
+
+# Size of the windows documents are segmented in by the LLM, and of their overlap, in tokens
+WINDOW_TOKENS = 8000
+WINDOW_OVERLAP_TOKENS = 1000
+
+# Maximum number of concurrent LLM requests when segmenting a document in windows
+SPLIT_CONCURRENCY = 8
+
+_EXERCISE = r"(?:exercises?|exercices?|problems?|probl[eè]mes?)"
+_SOLUTION = r"(?:solutions?|corrig[eé]s?|corrections?)"
+
+# Line starting an exercise or a solution: a Markdown heading, a bold line or a plain line, followed by
+# a keyword and a number, e.g. "## Exercise 3", "**Problem 2.1**", "Solution to exercise 4", "Corrigé de l'exercice 1"
+EXERCISE_HEADING_RE = re.compile(
+    r"^ {0,3}(?P<atx>#{1,6}[ \t]+)?(?P<bold>\*\*|__)?[ \t]*"
+    rf"(?:(?P<solution>{_SOLUTION})(?:[ \t]+(?:to|of|for|de|du|des|de l'|à l')?[ \t]*(?:the[ \t]+)?{_EXERCISE})?|{_EXERCISE})"
+    r"[ \t]+(?:n[°o]\.?[ \t]*)?(?P<number>\d+(?:\.\d+)*[a-z]?)\b(?P<rest>.*)$",
+    re.IGNORECASE,
+)
+
+SOLUTION_RE = re.compile(rf"\b{_SOLUTION}\b", re.IGNORECASE)
+
+# Plain lines only count as headings if short and the number is followed by punctuation, not by a sentence
+PLAIN_HEADING_REST_RE = re.compile(r"^(?:[ \t]*[.:)\-–—(].{0,80})?[ \t]*$")
+
+FENCE_RE = re.compile(r"^ {0,3}(`{3,}|~{3,})")
+FOOTNOTE_DEF_RE = re.compile(r"^\[\^([^\]]+)\]:")
+FOOTNOTE_REF_RE = re.compile(r"\[\^([^\]]+)\](?!:)")
+
+# Confidence of a single boundary, by heading style
+STYLE_CONFIDENCE = {'atx': 1.0, 'bold': 0.8, 'plain': 0.5}
+
+
+@dataclass
+class ExerciseBoundary:
+    """Line (0-based) where an exercise or solution starts, with its number."""
+
+    line: int
+    number: str
+    is_solution: bool = False
+    style: str = 'atx'
+    level: int = 0
+
+
+def _parse_heading(line: str):
+    """Boundary style, heading level, number and whether it is a solution, for a line starting an exercise. None otherwise."""
+
+    match = EXERCISE_HEADING_RE.match(line)
+    if match is None:
+        return None
+
+    rest = match.group('rest')
+    level = 0
+    if match.group('atx'):
+        level = match.group('atx').count('#')
+        style = 'atx'
+    elif match.group('bold'):
+        style = 'bold'
+    elif PLAIN_HEADING_REST_RE.match(rest):
+        style = 'plain'
+    else:
+        return None
+
+    is_solution = bool(match.group('solution')) or bool(SOLUTION_RE.search(rest))
+
+    return style, level, match.group('number'), is_solution
+
+
+def _number_key(number: str) -> Tuple:
+    parts = number.lower().split('.')
+    return tuple((int(re.sub(r'\D', '', part) or 0), re.sub(r'\d', '', part)) for part in parts)
+
+
+def _prose_lines(lines: Sequence[str]) -> Iterator[Tuple[int, str]]:
+    """Yield the index and text of the lines outside of fenced code blocks and display math blocks."""
+
+    fence = None
+    in_math = False
+    for i, line in enumerate(lines):
+        # Skip fenced code blocks, which can contain anything
+        fence_match = FENCE_RE.match(line)
+        if fence_match:
+            marker = fence_match.group(1)
+            if fence is None:
+                fence = marker
+            elif marker[0] == fence[0] and len(marker) >= len(fence):
+                fence = None
+            continue
+        if fence is not None:
+            continue
+
+        # Skip display math blocks
+        if line.strip().startswith('$$'):
+            if not (line.strip() != '$$' and line.strip().endswith('$$')):
+                in_math = not in_math
+            continue
+        if in_math:
+            continue
+
+        yield i, line
+
+
+def find_heading_boundaries(lines: Sequence[str]) -> List[ExerciseBoundary]:
+    """
+    Find the lines starting an exercise or a solution, ignoring code blocks and display math.
+
+    Args:
+        lines: Lines of the Markdown document.
+
+    Returns:
+        List[ExerciseBoundary]: Candidate boundaries, in order, of any heading style.
+    """
+
+    boundaries = []
+    for i, line in _prose_lines(lines):
+        heading = _parse_heading(line)
+        if heading is not None:
+            style, level, number, is_solution = heading
+            boundaries.append(ExerciseBoundary(line=i, number=number, is_solution=is_solution, style=style, level=level))
+
+    return boundaries
+
+
+def safe_break_lines(lines: Sequence[str]) -> List[int]:
+    """
+    Lines a window can start at without cutting through a block: headings, and lines following a blank line,
+    outside of code and display math blocks.
+    """
+
+    breaks = []
+    previous = -1
+    for i, line in _prose_lines(lines):
+        if line.lstrip(' ').startswith('#') or (previous == i - 1 and i > 0 and not lines[i - 1].strip() and line.strip()):
+            breaks.append(i)
+        previous = i
+
+    return breaks
+
+
+def make_windows(lines: Sequence[str], window_tokens: int = WINDOW_TOKENS, overlap_tokens: int = WINDOW_OVERLAP_TOKENS) -> List[Tuple[int, int]]:
+    """
+    Cut a document into windows of at most about `window_tokens` tokens, overlapping by about `overlap_tokens`.
+    Windows start and end at safe breaks (see `safe_break_lines`) whenever there is one, and at any line otherwise.
+
+    Returns:
+        List[Tuple[int, int]]: Start (inclusive) and end (exclusive) line of each window, covering the whole document.
+    """
+
+    # Cumulative number of tokens before each line
+    offsets = [0]
+    for line in lines:
+        offsets.append(offsets[-1] + estimate_text_tokens(line))
+
+    breaks = safe_break_lines(lines)
+
+    windows = []
+    start = 0
+    while start < len(lines):
+        # Furthest line the window can reach, always at least one line
+        limit = max(bisect.bisect_right(offsets, offsets[start] + window_tokens) - 1, start + 1)
+        if limit >= len(lines):
+            windows.append((start, len(lines)))
+            break
+
+        # End at the last safe break after the overlap of the next window, if any
+        overlap_lines = bisect.bisect_left(offsets, offsets[start] + overlap_tokens) - start
+        candidates = breaks[bisect.bisect_right(breaks, start + overlap_lines):bisect.bisect_right(breaks, limit)]
+        end = candidates[-1] if candidates else limit
+        windows.append((start, end))
+
+        # Start the next window at the last safe break at least `overlap_tokens` before the end, if any
+        overlap_start = bisect.bisect_right(offsets, offsets[end] - overlap_tokens) - 1
+        candidates = breaks[bisect.bisect_left(breaks, max(overlap_start, start + 1)):bisect.bisect_left(breaks, end)]
+        start = candidates[0] if candidates else max(overlap_start, start + 1)
+
+    return windows
+
+
+def score_boundaries(boundaries: Sequence[ExerciseBoundary]) -> Tuple[List[ExerciseBoundary], float]:
+    """
+    Keep the boundaries of the most reliable heading style and score how confident they are.
+
+    The confidence is the one of the heading style (see STYLE_CONFIDENCE), lowered if headings of other
+    styles were found too, if statements are at several heading levels (e.g. sub-exercises), if the same
+    exercise starts twice, or if the numbers are not increasing.
+
+    Returns:
+        Tuple[List[ExerciseBoundary], float]: The kept boundaries and their confidence, between 0 and 1.
+    """
+
+    if not boundaries:
+        return [], 0.0
+
+    # Headings of the strongest style present are kept, the others are likely mentions in the text
+    style = max((boundary.style for boundary in boundaries), key=STYLE_CONFIDENCE.get)
+    kept = [boundary for boundary in boundaries if boundary.style == style]
+    confidence = STYLE_CONFIDENCE[style]
+
+    # Bold lines competing with the headings are more likely missed boundaries than plain lines are
+    dropped_styles = {boundary.style for boundary in boundaries if boundary.style != style}
+    if 'bold' in dropped_styles:
+        confidence *= 0.7
+    elif dropped_styles:
+        confidence *= 0.9
+
+    if len({boundary.level for boundary in kept if not boundary.is_solution}) > 1:
+        confidence *= 0.7
+
+    # Statements and solutions are numbered separately, each once and in increasing order
+    for is_solution in (False, True):
+        keys = [_number_key(boundary.number) for boundary in kept if boundary.is_solution == is_solution]
+        if len(set(keys)) < len(keys):
+            confidence *= 0.5
+        elif keys != sorted(keys):
+            confidence *= 0.7
+
+    return kept, confidence
+
+
+def find_llm_boundaries(lines: Sequence[str], start: int = 0, end: Optional[int] = None) -> List[ExerciseBoundary]:
+    """
+    Ask the LLM for the lines where exercises start, between lines `start` and `end` of the document.
+    Only line numbers are returned, never the text itself, which keeps the response short whatever the size of the document.
+    """
+
+    end = len(lines) if end is None else end
 
-    # Prepare prompts
     system_prompt = """
 You are a careful Markdown document segmenter.
-Your task is to read a long Markdown file containing multiple exercises and split it into separate snippets, one per exercise.
-You also need to identify the exercise numbers as well as whether the snippets correspond to the exercise statement or the solution.  
+Your task is to read a Markdown file containing multiple exercises, given with a number in front of each line, and find where each exercise starts.
+You also need to identify the exercise numbers as well as whether each exercise is the exercise statement or the solution.
 
 Rules:
 - Infer exercise boundaries according to headings. Typically, exercises start with a heading containing the text "Exercise N", "Problem N" or even "Solution N".
 - Ignore any introductory or preface material that appears before the first exercise.
-- If an exercise (e.g. "Exercise 1") appears more than once (for instance, this can happen with the exercise statement and solution), produce a snippet for each occurrence.
-- Preserve all Markdown exactly as written.
-  - Keep code blocks, math, images, tables, and formatting intact.
-  - Do not modify or reformat text within each exercise.
-  - Keep footnotes in the exercise they are referenced in, even if they appear later in the document.
-- Ensure each snippet is self-contained and logically complete.
-- Each exercise should include its title, text, and any associated content.
-- The goal is to produce clean, coherent exercise segments suitable for saving as individual Markdown files.
+- If an exercise (e.g. "Exercise 1") appears more than once (for instance, this can happen with the exercise statement and solution), report each occurrence.
+- Report the number of the line where each exercise starts, typically its title. Do not repeat the text of the exercises.
 """
 
+    # Lines are numbered as in the whole document, so that boundaries need no translation
+    numbered_text = ''.join(f"{i + 1}: {line}" if line.endswith('\n') else f"{i + 1}: {line}\n" for i, line in enumerate(lines[start:end], start))
+
     user_prompt = f"""
-Here's a Markdown file containing multiple exercises.
-Split it into separate snippets (one per exercise) following the system instructions.
+Here's a Markdown file containing multiple exercises, with line numbers.
+It may be an excerpt of a longer file, starting or ending in the middle of an exercise.
+Find where each exercise starts following the system instructions.
 
 ---
 
-{md_text}
+{numbered_text}
 """
 
-    # Prepare messages
     messages = [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": user_prompt},
     ]
 
     # Prepare response format
-    class Exercise(BaseModel):
-        snippet: str = Field(..., description="The Markdown snippet of one exercise. Nothing else.")
-        number: str = Field(..., description="The exercise number, as referenced in its Markdown snippet. Typically an integer.")
-        is_solution: bool = Field(..., description="Whether the Markdown snippet contains the solution of the exercise, as opposed to only the .")
+    class Boundary(BaseModel):
+        line: int = Field(..., description="The number of the line where the exercise starts.")
+        number: str = Field(..., description="The exercise number, as referenced in the exercise. Typically an integer.")
+        is_solution: bool = Field(..., description="Whether the exercise is the solution, as opposed to only the statement.")
+
+    class BoundaryList(BaseModel):
+        boundaries: List[Boundary]
+
+    boundary_list = send_llm_request(SPLIT_MODEL, messages, response_format=BoundaryList)
+
+    # Discard lines out of range, and keep a single boundary per line
+    boundaries = {}
+    for boundary in boundary_list.boundaries:
+        if start < boundary.line <= end and boundary.line - 1 not in boundaries:
+            boundaries[boundary.line - 1] = ExerciseBoundary(line=boundary.line - 1, number=boundary.number.strip(), is_solution=boundary.is_solution, style='llm')
+
+    return sorted(boundaries.values(), key=lambda boundary: boundary.line)
+
+
+def reconcile_windows(windows: Sequence[Tuple[int, int]], window_boundaries: Sequence[List[ExerciseBoundary]]) -> List[ExerciseBoundary]:
+    """
+    Merge the boundaries found in overlapping windows. Each overlap is split at its middle line: boundaries
+    before it are taken from the earlier window and the others from the later one, so that every boundary
+    comes from the window that saw the most context around it. The same exercise found on both sides of
+    the middle line (e.g. at slightly different lines) is only kept once.
+    """
+
+    boundaries: List[ExerciseBoundary] = []
+    for i, ((start, end), found) in enumerate(zip(windows, window_boundaries)):
+        owned_start = 0 if i == 0 else (start + windows[i - 1][1]) // 2
+        owned_end = end if i == len(windows) - 1 else (windows[i + 1][0] + end) // 2
+
+        for boundary in found:
+            if not owned_start <= boundary.line < owned_end:
+                continue
+
+            # Same exercise as the last one of the previous window, found again in the overlap
+            previous = boundaries[-1] if boundaries else None
+            if previous is not None and previous.line >= start and (previous.number, previous.is_solution) == (boundary.number, boundary.is_solution):
+                continue
+
+            boundaries.append(boundary)
+
+    return boundaries
 
-    class ExerciseList(BaseModel):
-        exercises: List[Exercise]
 
-    # Call LLM to split into exercises
-    rcp_model = 'Qwen/Qwen3-30B-A3B-Instruct-2507'
-    exercise_list = send_llm_request(rcp_model, messages, response_format=ExerciseList)
+def find_windowed_llm_boundaries(
+    lines: Sequence[str],
+    window_tokens: int = WINDOW_TOKENS,
+    overlap_tokens: int = WINDOW_OVERLAP_TOKENS,
+    max_concurrency: int = SPLIT_CONCURRENCY,
+) -> List[ExerciseBoundary]:
+    """
+    Ask the LLM for the lines where exercises start, in overlapping windows (see `make_windows`) segmented
+    concurrently, with at most `max_concurrency` requests at a time, and then reconciled (see `reconcile_windows`).
+    Requests are bounded in size and the latency barely depends on the size of the document.
+    """
+
+    windows = make_windows(lines, window_tokens, overlap_tokens)
+    if len(windows) == 1:
+        return find_llm_boundaries(lines)
+
+    logging.debug(f"Segmenting {len(lines)} lines in {len(windows)} windows")
+
+    async def run_all():
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def run(start, end):
+            async with semaphore:
+                return await asyncio.to_thread(find_llm_boundaries, lines, start, end)
+
+        return await asyncio.gather(*(run(start, end) for start, end in windows))
+
+    return reconcile_windows(windows, asyncio.run(run_all()))
+
+
+def cut_exercises(lines: Sequence[str], boundaries: Sequence[ExerciseBoundary]) -> List[Tuple[ExerciseBoundary, str]]:
+    """
+    Cut the document into a snippet per boundary, running until the next one. Any preface before the first
+    boundary is dropped. Footnote definitions are moved to the snippets referencing them.
+    """
+
+    # Footnote definitions usually come at the end of the document, whichever exercise refers to them
+    footnotes = {}
+    for line in lines:
+        match = FOOTNOTE_DEF_RE.match(line)
+        if match:
+            footnotes.setdefault(match.group(1), line if line.endswith('\n') else line + '\n')
+
+    snippets = []
+    for i, boundary in enumerate(boundaries):
+        end = boundaries[i + 1].line if i + 1 < len(boundaries) else len(lines)
+        body = [line for line in lines[boundary.line:end] if not FOOTNOTE_DEF_RE.match(line)]
+
+        references = dict.fromkeys(label for line in body for label in FOOTNOTE_REF_RE.findall(line) if label in footnotes)
+        if references:
+            body.append('\n')
+            body.extend(footnotes[label] for label in references)
+
+        snippets.append((boundary, ''.join(body)))
+
+    return snippets
+
+
+def split_md_into_exercises(
+    md_path,
+    exercises_path,
+    min_confidence: float = MIN_CONFIDENCE,
+    window_tokens: int = WINDOW_TOKENS,
+    overlap_tokens: int = WINDOW_OVERLAP_TOKENS,
+    max_concurrency: int = SPLIT_CONCURRENCY,
+) -> bool:
+    """
+    Split a Markdown file containing exercises into a Markdown file per exercise, named after its number.
+
+    Boundaries are found from the "Exercise N", "Problem N" or "Solution N" headings. The LLM is only
+    asked for them if the headings are ambiguous (see `score_boundaries`), and then only for the line numbers.
+    Documents longer than `window_tokens` are segmented by the LLM in overlapping windows, in parallel
+    (see `find_windowed_llm_boundaries`). If both the statement and the solution of an exercise are found,
+    the solution is kept.
+
+    Returns:
+        bool: Whether the LLM was used.
+    """
+
+    # Normalise to Paths
+    md_path = Path(md_path)
+    exercises_path = Path(exercises_path)
+
+    # Read Markdown file to be split
+    lines = md_path.read_text(encoding='utf-8').splitlines(keepends=True)
+
+    # Find boundaries from headings, falling back to the LLM if not confident enough
+    boundaries, confidence = score_boundaries(find_heading_boundaries(lines))
+    used_llm = confidence < min_confidence
+    if used_llm:
+        logging.debug(f"Heading boundaries of {md_path} have confidence {confidence:.2f}, asking the LLM")
+        boundaries = find_windowed_llm_boundaries(lines, window_tokens, overlap_tokens, max_concurrency)
 
     # Exercises could be repeated (statement and solution). Make unique by number by prioritising the solution
     exercises = {}
-    for exercise in exercise_list.exercises:
-        if not exercise.number:
+    for boundary, snippet in cut_exercises(lines, boundaries):
+        if not boundary.number:
             continue
 
-        if exercise.is_solution or exercise.number not in exercises:
-            exercises[exercise.number] = exercise
-
-    exercises = list(exercises.values())
+        if boundary.is_solution or boundary.number not in exercises:
+            exercises[boundary.number] = snippet
 
     # Store exercises as individual Markdown files
     exercises_path.mkdir(parents=True, exist_ok=True)
-    for exercise in exercises:
-        exercise_path = exercises_path / exercise.number
-        exercise_path = exercise_path.with_suffix('.md')
+    for number, snippet in exercises.items():
+        exercise_path = exercises_path / f"{number.replace('/', '-')}.md"
+        exercise_path.write_text(snippet, encoding="utf-8")
 
-        exercise_path.write_text(exercise.snippet, encoding="utf-8")
+    return used_llm
@@ -1,5 +1,6 @@
-from rag_etl.utils.llms import send_llm_request
+from rag_etl.utils.llms import send_llm_request, send_embedding_request
 
 __all__ = [
     "send_llm_request",
+    "send_embedding_request",
 ]
@@ -0,0 +1,308 @@
+from __future__ import annotations
+
+import io
+import os
+import time
+import shutil
+import tarfile
+import zipfile
+import threading
+
+from functools import lru_cache
+from pathlib import Path
+from typing import IO, Dict, List, NamedTuple, Optional, Tuple, Union
+
+
+PathLike = Union[str, Path]
+
+# A file inside an archive is referred to by the path of the archive followed by '!' and the path of the member
+# inside it, e.g. '/data/moodle.zip!/File_1/content/slides.pdf'. Such paths can be joined with `pathlib` like
+# regular paths (`Path('/data/moodle.zip!') / 'index.html'`) and read with the functions of this module, which
+# also accept regular paths. Members are never unpacked to disk unless `local_path` is called on them.
+# Archives inside archives are supported as well, e.g. '/data/moodle.zip!/File_1/content/hw.zip!/hw/hw.ipynb'.
+MEMBER_SEPARATOR = '!'
+
+ARCHIVE_SUFFIXES = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+
+class MemberStat(NamedTuple):
+    """Subset of `os.stat_result` available for archive members."""
+    st_size: int
+    st_mtime_ns: int
+
+
+def is_archive(path: PathLike) -> bool:
+    """Whether `path` is an existing archive file (possibly inside another archive) supported by this module."""
+    if not str(path).lower().endswith(ARCHIVE_SUFFIXES):
+        return False
+    archive_path, member = split_member_path(path)
+    return os.path.isfile(archive_path) if member is None else exists(path)
+
+
+def archive_stem(path: PathLike) -> str:
+    """Name of the archive without its archive suffix, e.g. 'moodle' for 'moodle.tar.gz'."""
+    name = Path(path).name
+    for suffix in ARCHIVE_SUFFIXES:
+        if name.lower().endswith(suffix):
+            return name[:-len(suffix)]
+    return name
+
+
+def split_member_path(path: PathLike) -> Tuple[str, Optional[str]]:
+    """
+    Split a path into the archive path and the member path inside it. For nested archives,
+    the archive path is the path of the innermost archive, itself inside other archives.
+    Regular paths are returned as is, with None as member path.
+    """
+
+    path = str(path)
+
+    # The separator is the last character of an archive path component
+    index = path.rfind(MEMBER_SEPARATOR + '/')
+    if index == -1:
+        if path.endswith(MEMBER_SEPARATOR):
+            return path[:-1], ''
+        return path, None
+
+    return path[:index], path[index + 2:]
+
+
+def member_path(archive_path: PathLike, member: str = '') -> str:
+    """Build the path of a member inside an archive."""
+    return f"{archive_path}{MEMBER_SEPARATOR}/{member}" if member else f"{archive_path}{MEMBER_SEPARATOR}"
+
+
+################################################################
+
+
+class _TarMemberReader(io.RawIOBase):
+    """
+    Binary file object reading the data of a member of an uncompressed tar archive, stored contiguously
+    from `start`, through the file object of the archive shared with other readers under `lock`.
+    """
+
+    def __init__(self, fileobj: IO[bytes], lock: threading.Lock, start: int, size: int):
+        super().__init__()
+        self._fileobj = fileobj
+        self._lock = lock
+        self._start = start
+        self._size = size
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: self._size}[whence]
+        self._position = max(base + offset, 0)
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        size = min(len(buffer), self._size - self._position)
+        if size <= 0:
+            return 0
+
+        # The position of the shared file object is only meaningful while holding the lock
+        with self._lock:
+            self._fileobj.seek(self._start + self._position)
+            read = self._fileobj.readinto(memoryview(buffer)[:size])
+
+        self._position += read
+        return read
+
+
+class Archive:
+    """
+    Read-only zip or tar archive, whose members can be opened concurrently from several threads.
+
+    Members of zip and uncompressed tar archives are streamed. Members of compressed tar archives are read
+    whole into memory when opened, and since they can only be reached by decompressing the archive up to
+    them, opening them out of order decompresses the archive again from its start: prefer zip or uncompressed
+    tar archives for large dumps.
+    """
+
+    def __init__(self, path: PathLike, fileobj: Optional[IO[bytes]] = None):
+        self.path = str(path)
+        self._lock = threading.Lock()
+
+        source = fileobj if fileobj is not None else self.path
+
+        self._members: Dict[str, MemberStat] = {}
+        if zipfile.is_zipfile(source):
+            self._zip = zipfile.ZipFile(source)
+            self._tar = None
+            for info in self._zip.infolist():
+                if not info.is_dir():
+                    mtime = time.mktime(info.date_time + (0, 0, -1))
+                    self._members[info.filename] = MemberStat(info.file_size, int(mtime * 1e9))
+        else:
+            self._zip = None
+            tar_path = self.path if fileobj is None else None
+            try:
+                if fileobj is not None:
+                    fileobj.seek(0)
+                self._tar = tarfile.open(tar_path, mode='r:', fileobj=fileobj)
+                self._compressed = False
+            except tarfile.ReadError:
+                if fileobj is not None:
+                    fileobj.seek(0)
+                self._tar = tarfile.open(tar_path, mode='r:*', fileobj=fileobj)
+                self._compressed = True
+            self._tar_infos = {}
+            for info in self._tar.getmembers():
+                if info.isfile():
+                    name = info.name[2:] if info.name.startswith('./') else info.name
+                    self._tar_infos[name] = info
+                    self._members[name] = MemberStat(info.size, int(info.mtime * 1e9))
+
+    @property
+    def members(self) -> List[str]:
+        """Paths of all the files in the archive."""
+        return list(self._members)
+
+    def infolist(self) -> List[zipfile.ZipInfo]:
+        """Central directory of zip archives, as in `zipfile.ZipFile.infolist`."""
+        if self._zip is None:
+            raise TypeError(f"{self.path} is not a zip archive")
+        return self._zip.infolist()
+
+    def stat(self, member: str) -> MemberStat:
+        if member not in self._members:
+            raise FileNotFoundError(member_path(self.path, member))
+        return self._members[member]
+
+    def open(self, member: str) -> IO[bytes]:
+        """Open a member as a binary file object."""
+
+        self.stat(member)
+
+        # Members of zip archives are read through independent file handles
+        if self._zip is not None:
+            return self._zip.open(member)
+
+        # Members of uncompressed tar archives are stored contiguously, and streamed from the shared file handle
+        info = self._tar_infos[member]
+        if not self._compressed and not info.issparse():
+            return io.BufferedReader(_TarMemberReader(self._tar.fileobj, self._lock, info.offset_data, info.size))
+
+        # Other tar archives can only be read sequentially, so members are read at once
+        with self._lock:
+            return io.BytesIO(self._tar.extractfile(info).read())
+
+
+@lru_cache(maxsize=16)
+def _open_archive(path: str, size: int, mtime_ns: int) -> Archive:
+    container_path, member = split_member_path(path)
+    if member is None:
+        return Archive(path)
+
+    # Archives inside archives are read in memory
+    with get_archive(container_path).open(member) as f:
+        return Archive(path, io.BytesIO(f.read()))
+
+
+def get_archive(path: PathLike) -> Archive:
+    """
+    Open an archive, possibly inside another archive, reusing the previously opened one if the
+    file (or the outermost archive) did not change.
+    """
+    outermost_path = str(path).split(MEMBER_SEPARATOR + '/', 1)[0].removesuffix(MEMBER_SEPARATOR)
+    stat = os.stat(outermost_path)
+    return _open_archive(str(path), stat.st_size, stat.st_mtime_ns)
+
+
+################################################################
+
+
+def exists(path: PathLike) -> bool:
+    """Whether the file at `path` (a regular path or an archive member) exists."""
+    archive_path, member = split_member_path(path)
+    if member is None:
+        return os.path.exists(archive_path)
+    return is_archive(archive_path) and member in get_archive(archive_path).members
+
+
+def stat(path: PathLike) -> Union[os.stat_result, MemberStat]:
+    """Size and modification time of the file at `path`. Raises FileNotFoundError if it does not exist."""
+    archive_path, member = split_member_path(path)
+    if member is None:
+        return os.stat(archive_path)
+    return get_archive(archive_path).stat(member)
+
+
+def open_binary(path: PathLike) -> IO[bytes]:
+    """Open the file at `path` for reading, as a binary file object."""
+    archive_path, member = split_member_path(path)
+    if member is None:
+        return open(archive_path, 'rb')
+    return get_archive(archive_path).open(member)
+
+
+def open_text(path: PathLike, encoding: str = 'utf-8') -> IO[str]:
+    """Open the file at `path` for reading, as a text file object."""
+    return io.TextIOWrapper(open_binary(path), encoding=encoding)
+
+
+def read_text(path: PathLike, encoding: str = 'utf-8') -> str:
+    """Read the whole file at `path` as text."""
+    with open_text(path, encoding) as f:
+        return f.read()
+
+
+def mirror_path(path: PathLike) -> Path:
+    """
+    Path on disk corresponding to `path`. For archive members, it is the path they would have if
+    the archive was unpacked in a folder next to it, named after the archive (see `archive_stem`),
+    recursively for nested archives. Regular paths are returned as is.
+    """
+    archive_path, member = split_member_path(path)
+    if member is None:
+        return Path(archive_path)
+
+    # Never write outside of the mirror folder
+    if Path(member).is_absolute() or '..' in Path(member).parts:
+        raise ValueError(f"Unsafe archive member path {path}")
+
+    return mirror_path(archive_path).parent / archive_stem(archive_path) / member
+
+
+def local_path(path: PathLike) -> Path:
+    """
+    Path of an actual file on disk with the content of the file at `path`.
+    Archive members are unpacked to their `mirror_path`, unless already there.
+    """
+
+    archive_path, member = split_member_path(path)
+    if member is None:
+        return Path(archive_path)
+
+    destination = mirror_path(path)
+    if destination.exists() and destination.stat().st_size == stat(path).st_size:
+        return destination
+
+    # Unpack into a temporary file first, so that concurrent readers never see a partial file
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = destination.with_name(f".{destination.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open_binary(path) as src, open(tmp_path, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.replace(tmp_path, destination)
+
+    return destination
+
+
+def copy_file(path: PathLike, destination: PathLike) -> None:
+    """Copy the file at `path` to the file `destination`, streaming archive members without unpacking them."""
+
+    archive_path, member = split_member_path(path)
+    if member is None:
+        shutil.copy(archive_path, destination)
+        return
+
+    with open_binary(path) as src, open(destination, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
@@ -0,0 +1,287 @@
+import io
+import os
+import json
+import time
+import zlib
+import struct
+import tarfile
+import zipfile
+
+from pathlib import Path
+from typing import IO, Dict, List, Optional
+
+from rag_etl.utils.archives import PathLike, open_binary, stat
+
+
+BUNDLE_FORMATS = ('tar', 'tar.zst', 'zip')
+
+# Uncompressed bytes per zstd frame of 'tar.zst' bundles. A single file is read by decompressing its frame only
+FRAME_BYTES = 4 * 1024 * 1024
+
+MANIFEST_NAME = 'manifest.json'
+
+# Fixed-size part of the local file header of a zip member, see the zip APPNOTE (section 4.3.7)
+ZIP_LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+
+
+def bundle_format(path: PathLike) -> str:
+    """Format of a bundle, from the suffix of its path, e.g. 'tar.zst' for 'corpus.tar.zst'."""
+
+    name = Path(path).name
+    for fmt in sorted(BUNDLE_FORMATS, key=len, reverse=True):
+        if name.endswith(f".{fmt}"):
+            return fmt
+
+    raise ValueError(f"Unknown bundle format for {path}. Available: {BUNDLE_FORMATS}")
+
+
+def manifest_path(bundle_path: PathLike) -> Path:
+    """Path of the manifest written next to a bundle, so that it can be read without opening the bundle."""
+    bundle_path = Path(bundle_path)
+    return bundle_path.with_name(f"{bundle_path.name}.{MANIFEST_NAME}")
+
+
+class _ZstdFrameWriter:
+    """
+    Binary file-like object compressing what is written into independent zstd frames, streamed to `file` as
+    they are compressed. A frame is ended on demand with `end_frame`, or once it holds FRAME_BYTES, so that
+    large files span several frames. The concatenated frames decompress as a single stream, e.g. with `zstd -d`.
+    """
+
+    def __init__(self, file: IO[bytes], level: int):
+        # Imported here so that zstandard is only required for 'tar.zst' bundles
+        import zstandard
+
+        self.file = file
+        self._flush_frame = zstandard.FLUSH_FRAME
+        self._stream = zstandard.ZstdCompressor(level=level).stream_writer(file, closefd=False)
+
+        self.frame_start = 0                # uncompressed position of the start of the current frame
+        self.frame_offset = file.tell()     # compressed offset of the current frame
+        self.frame_size = 0                 # uncompressed bytes written to the current frame
+
+    def write(self, data: bytes) -> int:
+        size = len(data)
+        view = memoryview(data)
+        while view:
+            chunk = view[:FRAME_BYTES - self.frame_size]
+            self._stream.write(chunk)
+            self.frame_size += len(chunk)
+            view = view[len(chunk):]
+            if self.frame_size >= FRAME_BYTES:
+                self.end_frame()
+
+        return size
+
+    def tell(self) -> int:
+        return self.frame_start + self.frame_size
+
+    def end_frame(self) -> None:
+        if self.frame_size == 0:
+            return
+
+        self._stream.flush(self._flush_frame)
+
+        self.frame_start += self.frame_size
+        self.frame_offset = self.file.tell()
+        self.frame_size = 0
+
+
+class BundleWriter:
+    """
+    Writer of a bundle: a single tar, zstd-compressed tar or zip file, with a manifest locating each of its files.
+
+    Files are streamed into the bundle as they are added, straight from their source (which can be an archive
+    member), without being staged on disk. Once closed, the manifest is added as the last file of the bundle,
+    and written next to it too (see `manifest_path`), with an entry per file:
+
+        {"files": {name: {"bundle": ..., "sha256": ..., "size": ..., "offset": ..., ...}, ...}, ...}
+
+    `offset` is where the file starts in the bundle, for random access. In 'tar.zst' bundles, files are grouped
+    into independent zstd frames of at most FRAME_BYTES, `frame` is the offset of the frame where the file
+    starts, and `offset` where the file starts once decompressed from that frame. Files larger than a frame
+    continue into the following ones. In zip bundles, files are deflated, and `compressed_size` is the number
+    of bytes to inflate from `offset`.
+
+    The bundle is written to a temporary file, and only moved into place once closed.
+    """
+
+    def __init__(self, path: PathLike, fmt: Optional[str] = None, level: int = 3):
+        self.path = Path(path)
+        self.format = fmt or bundle_format(path)
+        if self.format not in BUNDLE_FORMATS:
+            raise ValueError(f"Unknown bundle format '{self.format}'. Available: {BUNDLE_FORMATS}")
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.tmp_path = self.path.with_name(f".{self.path.name}.tmp")
+        self.files: Dict[str, dict] = {}
+
+        self._file = open(self.tmp_path, 'wb')
+        self._frames = None
+        if self.format == 'zip':
+            self._archive = zipfile.ZipFile(self._file, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=6)
+        else:
+            if self.format == 'tar.zst':
+                self._frames = _ZstdFrameWriter(self._file, level)
+            self._archive = tarfile.open(fileobj=self._frames or self._file, mode='w', format=tarfile.PAX_FORMAT)
+
+    def _add(self, name: str, f: IO[bytes], size: int, mtime: float) -> dict:
+        if self.format == 'zip':
+            info = zipfile.ZipInfo(name, date_time=time.localtime(max(mtime, 315532800))[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.file_size = size
+            with self._archive.open(info, 'w') as member:
+                while chunk := f.read(1024 * 1024):
+                    member.write(chunk)
+
+            # The data offset is only known once the local header is written, see `close`
+            return {'header_offset': info.header_offset, 'compressed_size': info.compress_size}
+
+        # Files that fit in a frame, with their header, start a new one rather than being split across two
+        if self._frames is not None:
+            if self._frames.frame_size + size + 2 * tarfile.BLOCKSIZE > FRAME_BYTES:
+                self._frames.end_frame()
+            frame_offset, frame_start = self._frames.frame_offset, self._frames.frame_start
+
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mtime = mtime
+        self._archive.addfile(info, f)
+
+        # Data is padded to whole blocks, and ends where the archive is now
+        padded_size = -(-size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+        offset = self._archive.offset - padded_size
+        if self._frames is not None:
+            return {'frame': frame_offset, 'offset': offset - frame_start}
+
+        return {'offset': offset}
+
+    def add_file(self, name: str, path: PathLike, sha256: Optional[str] = None) -> None:
+        """Add the file at `path` (possibly an archive member) to the bundle, as `name`."""
+
+        file_stat = stat(path)
+        with open_binary(path) as f:
+            location = self._add(name, f, file_stat.st_size, file_stat.st_mtime_ns / 1e9)
+
+        self.files[name] = {'bundle': self.path.name, 'sha256': sha256, 'size': file_stat.st_size, **location}
+
+    def add_bytes(self, name: str, data: bytes, sha256: Optional[str] = None) -> None:
+        """Add the given bytes to the bundle, as `name`."""
+
+        location = self._add(name, io.BytesIO(data), len(data), time.time())
+        self.files[name] = {'bundle': self.path.name, 'sha256': sha256, 'size': len(data), **location}
+
+    def _locate_zip_data(self) -> None:
+        """Turn the header offsets of zip members into data offsets, reading back their local headers."""
+
+        with open(self.tmp_path, 'rb') as f:
+            for entry in self.files.values():
+                if 'header_offset' not in entry:
+                    continue
+                f.seek(entry['header_offset'])
+                header = ZIP_LOCAL_HEADER.unpack(f.read(ZIP_LOCAL_HEADER.size))
+                name_length, extra_length = header[-2:]
+                entry['offset'] = entry.pop('header_offset') + ZIP_LOCAL_HEADER.size + name_length + extra_length
+
+    def close(self, manifest: Optional[dict] = None) -> dict:
+        """
+        Finish the bundle, adding the manifest as its last file and next to it, and move it into place.
+
+        Args:
+            manifest: Fields of the manifest besides `format` and `files`, e.g. the course info.
+                Entries of its `files` field are added as they are, e.g. for files held by other bundles.
+
+        Returns:
+            dict: The manifest.
+        """
+
+        manifest = dict(manifest or {})
+        files = {**manifest.pop('files', {}), **self.files}
+
+        # Written before the manifest, so that the manifest locates its files
+        if self.format == 'zip':
+            self._file.flush()
+            self._locate_zip_data()
+        manifest = {'format': self.format, 'bundle': self.path.name, **manifest, 'files': files}
+
+        data = json.dumps(manifest, ensure_ascii=False).encode('utf-8')
+        self._add(MANIFEST_NAME, io.BytesIO(data), len(data), time.time())
+
+        self._archive.close()
+        if self._frames is not None:
+            self._frames.end_frame()
+        self._file.close()
+
+        tmp_manifest_path = manifest_path(self.tmp_path)
+        tmp_manifest_path.write_bytes(data)
+        os.replace(self.tmp_path, self.path)
+        os.replace(tmp_manifest_path, manifest_path(self.path))
+
+        return manifest
+
+    def abort(self) -> None:
+        """Discard the bundle being written."""
+
+        self._file.close()
+        self.tmp_path.unlink(missing_ok=True)
+
+    def __enter__(self) -> 'BundleWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            self.abort()
+
+
+def _read_exactly(f: IO[bytes], size: int) -> bytes:
+    """Read `size` bytes, as decompressing streams may return fewer bytes per read."""
+
+    chunks = []
+    while size > 0:
+        chunk = f.read(min(size, 1024 * 1024))
+        if not chunk:
+            raise EOFError("Bundle ended before the end of the file")
+        chunks.append(chunk)
+        size -= len(chunk)
+
+    return b''.join(chunks)
+
+
+class BundleReader:
+    """
+    Reader of the files of a bundle written by `BundleWriter`, by random access from its manifest. Files held
+    by other bundles, i.e. unchanged files of delta bundles, are read from the bundles next to this one.
+    """
+
+    def __init__(self, path: PathLike):
+        self.path = Path(path)
+        self.manifest = json.loads(manifest_path(self.path).read_text(encoding='utf-8'))
+        self._readers = {self.path.name: self}
+
+    def names(self) -> List[str]:
+        return list(self.manifest['files'])
+
+    def read(self, name: str) -> bytes:
+        """Content of the given file."""
+
+        entry = self.manifest['files'][name]
+        if entry['bundle'] != self.path.name:
+            if entry['bundle'] not in self._readers:
+                self._readers[entry['bundle']] = BundleReader(self.path.with_name(entry['bundle']))
+            return self._readers[entry['bundle']].read(name)
+
+        with open(self.path, 'rb') as f:
+            if self.manifest['format'] == 'tar.zst':
+                import zstandard
+
+                # Large files continue into the following frames
+                f.seek(entry['frame'])
+                with zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True) as frames:
+                    _read_exactly(frames, entry['offset'])
+                    return _read_exactly(frames, entry['size'])
+
+            f.seek(entry['offset'])
+            if self.manifest['format'] == 'zip':
+                return zlib.decompressobj(-zlib.MAX_WBITS).decompress(f.read(entry['compressed_size']))
+
+            return f.read(entry['size'])
@@ -4,6 +4,7 @@ import shutil
 from pathlib import Path
 
 from rag_etl.config import CONFIG
+from rag_etl.utils.archives import open_binary
 
 
 cache_path = Path(CONFIG['CACHE_DIR'])
@@ -12,15 +13,32 @@ if not cache_path.exists():
     raise ValueError(f"Cache path {cache_path} does not exist.")
 
 
-def _hash_file(path: Path) -> str:
-    """Return the SHA256 hex digest of the file bytes."""
+def hash_file(path: Path) -> str:
+    """Return the SHA256 hex digest of the file bytes. The file can be an archive member."""
     h = hashlib.sha256()
-    with path.open("rb") as f:
+    with open_binary(path) as f:
         for chunk in iter(lambda: f.read(8192), b""):
             h.update(chunk)
     return h.hexdigest()
 
 
+def is_cached(scope: str, key_path: str, value_path: str) -> bool:
+    """
+    Hashes the bytes of the file `key_path` and checks whether a value for `value_path` is stored in
+    the cache for the given `scope`, without copying anything.
+    """
+
+    # If no cache for this scope, return False
+    scope_path = cache_path / scope
+    if not scope_path.exists():
+        return False
+
+    # Hash file and check if cached file exists
+    hash = hash_file(Path(key_path))
+    cached_file_path = scope_path / hash / Path(value_path).name
+    return cached_file_path.exists()
+
+
 def get_from_cache(scope: str, key_path: str, value_path: str) -> bool:
     """
     Hashes the bytes of the file `key_path`, then looks it up in the cache for the given `scope`.
@@ -34,7 +52,7 @@ def get_from_cache(scope: str, key_path: str, value_path: str) -> bool:
         return False
 
     # Hash file
-    hash = _hash_file(Path(key_path))
+    hash = hash_file(Path(key_path))
 
     # If hash not in cache, return False
     cached_file_path = scope_path / hash / Path(value_path).name
@@ -57,7 +75,7 @@ def set_to_cache(scope: str, key_path: str, value_path: str):
     scope_path.mkdir(parents=True, exist_ok=True)
 
     # Hash file
-    hash = _hash_file(Path(key_path))
+    hash = hash_file(Path(key_path))
 
     # Build file path and create parent folder if needed
     cached_file_path = scope_path / hash / Path(value_path).name
@@ -0,0 +1,139 @@
+import re
+
+from dataclasses import dataclass
+from typing import List, Optional
+
+import rag_etl.utils.mime_types as mt
+from rag_etl.utils.archives import PathLike, local_path, read_text
+
+
+# Maximum size of a chunk, in characters, unless a single line is longer
+CHUNK_CHARS = 2000
+
+# Mime types whose content can be chunked
+CHUNKABLE_MIME_TYPES = (mt.MARKDOWN, mt.PDF, mt.TEXT)
+
+# Page breaks in Markdown files: form feeds, or "<!-- page -->" comments (e.g. "<!-- page 3 -->")
+PAGE_BREAK_RE = re.compile(r"\f|^<!--\s*page\b[^>]*-->[ \t]*$", re.MULTILINE | re.IGNORECASE)
+
+HEADING_RE = re.compile(r"^ {0,3}#{1,6}[ \t]")
+FENCE_RE = re.compile(r"^ {0,3}(`{3,}|~{3,})")
+
+
+@dataclass
+class Chunk:
+    """Piece of the text content of a resource, with its page (1-based) if the content has pages."""
+
+    text: str
+    page: Optional[int] = None
+
+
+def read_pages(path: PathLike, mime_type: str) -> Optional[List[str]]:
+    """
+    Text content of a file, page by page. PDF files are split by their pages, and Markdown and plain
+    text files by their page breaks (see PAGE_BREAK_RE), if any.
+
+    Returns:
+        Optional[List[str]]: The text of each page, or None if the mime type cannot be chunked.
+    """
+
+    if mime_type not in CHUNKABLE_MIME_TYPES:
+        return None
+
+    if mime_type == mt.PDF:
+        # Imported here so that PyMuPDF is only required for PDF files
+        import pymupdf
+
+        with pymupdf.open(local_path(path)) as doc:
+            return [page.get_text() for page in doc]
+
+    return PAGE_BREAK_RE.split(read_text(path))
+
+
+def _blocks(text: str) -> List[str]:
+    """Split Markdown into blocks: paragraphs and whole code blocks, with headings starting their own block."""
+
+    blocks = []
+    current: List[str] = []
+    fence = None
+
+    for line in text.splitlines(keepends=True):
+        fence_match = FENCE_RE.match(line)
+
+        if fence is None:
+            # Blank lines and headings end the current block, outside of code blocks
+            if not line.strip() or HEADING_RE.match(line):
+                if current:
+                    blocks.append(''.join(current).rstrip())
+                current = [] if not line.strip() else [line]
+                continue
+
+            if fence_match:
+                fence = fence_match.group(1)
+        elif fence_match and fence_match.group(1)[0] == fence[0] and len(fence_match.group(1)) >= len(fence):
+            fence = None
+
+        current.append(line)
+
+    if current:
+        blocks.append(''.join(current).rstrip())
+
+    return blocks
+
+
+def chunk_markdown(text: str, max_chars: int = CHUNK_CHARS) -> List[str]:
+    """
+    Split Markdown into chunks of at most `max_chars` characters, packing whole blocks (see `_blocks`) together.
+    Headings always start a new chunk if the current one is at least half full. Blocks longer than `max_chars`
+    are split by lines.
+    """
+
+    chunks = []
+    current = ''
+
+    def flush():
+        nonlocal current
+        if current.strip():
+            chunks.append(current.strip())
+        current = ''
+
+    for block in _blocks(text):
+        if HEADING_RE.match(block) and len(current) >= max_chars // 2:
+            flush()
+
+        if len(current) + len(block) + 2 <= max_chars:
+            current = f"{current}\n\n{block}" if current else block
+            continue
+
+        flush()
+
+        # Long blocks are split by lines, keeping lines whole
+        while len(block) > max_chars:
+            cut = block.rfind('\n', 0, max_chars) + 1 or max_chars
+            chunks.append(block[:cut].strip())
+            block = block[cut:]
+
+        current = block
+
+    flush()
+
+    return [chunk for chunk in chunks if chunk]
+
+
+def chunk_pages(pages: List[str], one_chunk_per_doc: bool = False, one_chunk_per_page: bool = False, max_chars: int = CHUNK_CHARS) -> List[Chunk]:
+    """
+    Chunk the content of a resource, following its `one_chunk_per_doc` and `one_chunk_per_page` flags.
+    Otherwise, each page is chunked separately (see `chunk_markdown`). Pages are only numbered if there are several.
+    """
+
+    def page_number(i):
+        return i + 1 if len(pages) > 1 else None
+
+    if one_chunk_per_doc:
+        text = '\n\n'.join(page.strip() for page in pages).strip()
+        return [Chunk(text)] if text else []
+
+    if one_chunk_per_page:
+        return [Chunk(page.strip(), page_number(i)) for i, page in enumerate(pages) if page.strip()]
+
+    return [Chunk(text, page_number(i)) for i, page in enumerate(pages) for text in chunk_markdown(page, max_chars)]
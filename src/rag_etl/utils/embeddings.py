@@ -0,0 +1,118 @@
+import re
+import asyncio
+import hashlib
+
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import List, Sequence
+
+import numpy as np
+
+
+# Dimension of the vectors of the hashing embedder
+HASHING_DIM = 384
+
+# Maximum number of texts per embedding request, and number of concurrent requests
+EMBEDDING_BATCH_SIZE = 128
+EMBEDDING_CONCURRENCY = 4
+
+WORD_RE = re.compile(r"\w+")
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Scale each row to unit length, so that dot products are cosine similarities. Zero rows are left as is."""
+
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+@lru_cache(maxsize=1 << 20)
+def _feature_hash(feature: str) -> int:
+    """Stable 64-bit hash of a feature. Words repeat a lot across chunks, so hashes are cached."""
+    return int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class BaseEmbedder(ABC):
+    """
+    Base class for embedders, turning texts into unit-length float32 vectors of dimension `dim`.
+
+    Embedders are identified by their `name`, so that indexes built with another embedder are rebuilt.
+    """
+
+    name: str
+    dim: int
+
+    @abstractmethod
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Embed the given texts.
+
+        Returns:
+            np.ndarray: Matrix of shape (len(texts), dim), one unit-length row per text.
+        """
+        raise NotImplementedError
+
+
+class HashingEmbedder(BaseEmbedder):
+    """
+    Deterministic local embedder, hashing the lowercase words and word bigrams of a text into `dim` signed
+    buckets (the "hashing trick"). Texts sharing words get similar vectors, which is enough to test retrieval
+    without any model or network access.
+    """
+
+    def __init__(self, dim: int = HASHING_DIM):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text: str) -> List[str]:
+        words = WORD_RE.findall(text.lower())
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        cells, signs = [], []
+        for i, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = _feature_hash(feature)
+                cells.append(i * self.dim + (digest >> 1) % self.dim)
+                signs.append(1.0 if digest & 1 else -1.0)
+
+        # Accumulate all features at once, repeated ones adding up
+        vectors = np.bincount(cells, weights=signs, minlength=len(texts) * self.dim).astype(np.float32)
+
+        return normalize(vectors.reshape(len(texts), self.dim))
+
+
+class OpenAIEmbedder(BaseEmbedder):
+    """
+    Embedder using an OpenAI-compatible embeddings endpoint, the one configured for LLM requests
+    (see `rag_etl.utils.llms`). Texts are sent in batches of `batch_size`, at most `max_concurrency`
+    requests at a time.
+    """
+
+    def __init__(self, model: str, dim: int, batch_size: int = EMBEDDING_BATCH_SIZE, max_concurrency: int = EMBEDDING_CONCURRENCY):
+        self.model = model
+        self.dim = dim
+        self.name = f"openai-{model}-{dim}"
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        # Imported here so that the OpenAI client is only required when actually used
+        from rag_etl.utils.llms import send_embedding_request
+
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+
+        async def run_all():
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+
+            async def run(batch):
+                async with semaphore:
+                    return await asyncio.to_thread(send_embedding_request, self.model, batch)
+
+            return await asyncio.gather(*(run(batch) for batch in batches))
+
+        embeddings = [embedding for batch in asyncio.run(run_all()) for embedding in batch] if batches else []
+
+        vectors = np.array(embeddings, dtype=np.float32).reshape(len(texts), self.dim)
+
+        return normalize(vectors)
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import os
+import json
+import hashlib
+import logging
+
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from rag_etl.utils.cache import cache_path, hash_file
+from rag_etl.utils.archives import stat as archive_stat
+
+
+class ExtractionIndex:
+    """
+    On-disk index of the results of parsing the files under a root folder, to avoid re-parsing unchanged files.
+
+    For each file, given by its path relative to `root`, the index stores its size, modification time
+    and SHA256 hash together with the parsed result, which must be JSON-serializable. A file is
+    unchanged if its size and modification time match, which only costs a `stat` call. Otherwise its
+    bytes are hashed, so that files that were only touched (e.g. copied again) are not re-parsed either.
+
+    The root folder can be inside an archive (see `rag_etl.utils.archives`), in which case the size
+    and modification time of the members are read from the archive directory.
+
+    Indices are stored in the cache for the given `scope`, one per root folder and `variant` (e.g. the
+    options the files are parsed with).
+
+    Example:
+        index = ExtractionIndex('MoodleExtractor', dump_path)
+        result = index.get('File_1/index.html')
+        if result is None:
+            result = parse(dump_path / 'File_1/index.html')
+            index.set('File_1/index.html', result)
+        index.save()
+    """
+
+    def __init__(self, scope: str, root: Path, variant: str = ''):
+        self.root = str(root)
+
+        key = hashlib.sha256(f"{Path(root).resolve()}\n{variant}".encode('utf-8')).hexdigest()
+        self.path = cache_path / scope / 'extraction_index' / f"{key}.json"
+
+        self.entries: Dict[str, dict] = {}
+        self.modified = False
+
+        if self.path.exists():
+            try:
+                self.entries = json.loads(self.path.read_text(encoding='utf-8'))
+            except json.JSONDecodeError:
+                logging.warning(f"Ignoring corrupted extraction index {self.path}")
+
+    def get(self, relative_path: str) -> Optional[Any]:
+        """Return the stored result for the file at `relative_path`, or None if it is unknown or has changed."""
+
+        entry = self.entries.get(relative_path)
+        if entry is None:
+            return None
+
+        # Plain strings rather than Path objects, as this is called once per file on every run
+        path = os.path.join(self.root, relative_path)
+
+        try:
+            stat = archive_stat(path)
+        except FileNotFoundError:
+            return None
+
+        # Same size and modification time, assume unchanged
+        if entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return entry['result']
+
+        # Same size but touched, check the content
+        if entry['size'] == stat.st_size and entry['sha256'] == hash_file(Path(path)):
+            entry['mtime_ns'] = stat.st_mtime_ns
+            self.modified = True
+            return entry['result']
+
+        return None
+
+    def set(self, relative_path: str, result: Any) -> None:
+        """Store the result of parsing the file at `relative_path`, in its current state."""
+
+        path = os.path.join(self.root, relative_path)
+        stat = archive_stat(path)
+        self.entries[relative_path] = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': hash_file(Path(path)),
+            'result': result,
+        }
+        self.modified = True
+
+    def save(self) -> None:
+        """Write the index to the cache if it changed. The previous index is replaced atomically."""
+
+        if not self.modified:
+            return
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(self.entries), encoding='utf-8')
+        os.replace(tmp_path, self.path)
+
+        self.modified = False
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import json
+import time
+import logging
+import traceback
+
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple, Type
+
+
+@dataclass
+class RetryPolicy:
+    """
+    How many times, and how patiently, a failing call is retried before it is considered a permanent failure.
+    """
+
+    max_attempts: int = 3
+    backoff_seconds: float = 1.0
+    backoff_factor: float = 2.0
+    retry_on: Tuple[Type[BaseException], ...] = (Exception,)
+
+    def call(self, fn: Callable, *args, **kwargs):
+        """Call `fn` with the given arguments, retrying with exponential backoff. Re-raises the last error."""
+
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                return fn(*args, **kwargs)
+            except self.retry_on as e:
+                if attempt >= self.max_attempts:
+                    raise
+
+                delay = self.backoff_seconds * self.backoff_factor ** (attempt - 1)
+                logging.warning(f"Attempt {attempt}/{self.max_attempts} failed with {e!r}. Retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+
+@dataclass
+class DeadLetter:
+    """A permanent failure of a pipeline stage, on a single item if known."""
+
+    step: str                   # 'extract', 'transform' or 'load'
+    stage_index: int            # position of the stage within the course extractors, transformers or loaders
+    stage: str                  # class name of the stage, e.g. 'SplitExercisesTransformer'
+    item: Optional[dict]        # serialized resource (or raw extractor item) the stage failed on, None if the whole stage failed
+    error: str
+    traceback: str
+
+    @classmethod
+    def from_exception(cls, step: str, stage_index: int, stage: str, item: Optional[dict], error: BaseException, formatted_traceback: Optional[str] = None) -> DeadLetter:
+        # Errors raised in worker processes come back without their traceback, which is then formatted in the worker
+        return cls(
+            step=step,
+            stage_index=stage_index,
+            stage=stage,
+            item=item,
+            error=repr(error),
+            traceback=formatted_traceback or ''.join(traceback.format_exception(error)),
+        )
+
+
+def write_dead_letters(path: Path, dead_letters: List[DeadLetter]) -> None:
+    """Write dead letters as JSON lines, overwriting any existing file."""
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    with path.open('w', encoding='utf-8') as f:
+        for dead_letter in dead_letters:
+            f.write(json.dumps(asdict(dead_letter), ensure_ascii=False) + '\n')
+
+
+def read_dead_letters(path: Path) -> List[DeadLetter]:
+    """Read dead letters written by `write_dead_letters`. Returns an empty list if the file does not exist."""
+
+    path = Path(path)
+    if not path.exists():
+        return []
+
+    with path.open('r', encoding='utf-8') as f:
+        return [DeadLetter(**json.loads(line)) for line in f if line.strip()]
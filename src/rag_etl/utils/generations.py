@@ -0,0 +1,106 @@
+import os
+import shutil
+import logging
+
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Sequence
+
+
+# Layout of an output folder written in generations:
+#
+#   <output>/generations/<id>/...        complete generations, the newest ones
+#   <output>/generations/.staging-<id>/  generation being written, or left by a failed write
+#   <output>/current -> generations/<id> symlink to the published generation, flipped atomically
+#   <output>/<name> -> current/<name>    symlinks to each folder of the generation (e.g. content, metadata)
+GENERATIONS_DIR = 'generations'
+CURRENT_LINK = 'current'
+STAGING_PREFIX = '.staging-'
+
+
+def current_generation(output_path) -> Optional[Path]:
+    """Folder of the published generation, if any."""
+
+    current_path = Path(output_path) / CURRENT_LINK
+    if not current_path.is_symlink():
+        return None
+
+    return current_path.resolve()
+
+
+def start_generation(output_path) -> Path:
+    """Create the staging folder of a new generation, removing any left by failed writes."""
+
+    generations_path = Path(output_path) / GENERATIONS_DIR
+    generations_path.mkdir(parents=True, exist_ok=True)
+
+    for stale_path in generations_path.glob(f"{STAGING_PREFIX}*"):
+        logging.debug(f"Removing {stale_path}, left by a failed write")
+        shutil.rmtree(stale_path)
+
+    staging_path = generations_path / f"{STAGING_PREFIX}{datetime.now().strftime('%Y%m%dT%H%M%S%f')}"
+    staging_path.mkdir()
+
+    return staging_path
+
+
+def _replace_with_symlink(path: Path, target: str) -> None:
+    """Atomically make `path` a symlink to `target`, replacing any symlink already there."""
+
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    tmp_path.unlink(missing_ok=True)
+    os.symlink(target, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def publish_generation(output_path, staging_path: Path, names: Sequence[str], keep: int = 2) -> Path:
+    """
+    Publish a staged generation, atomically flipping the `current` symlink to it, and remove the
+    generations older than the `keep` newest ones.
+
+    Folders of the output in the previous layout, i.e. real folders instead of symlinks to the
+    current generation, are moved into the generations folder and replaced by symlinks.
+
+    Args:
+        output_path: Output folder.
+        staging_path: Staging folder of the generation (see `start_generation`).
+        names: Folders of the generation to link from the output folder, e.g. ['content', 'metadata'].
+        keep: Number of generations to keep, including the new one.
+
+    Returns:
+        Path: Folder of the published generation.
+    """
+
+    output_path = Path(output_path)
+    generations_path = output_path / GENERATIONS_DIR
+
+    # Staging folder names only differ by their prefix
+    generation_path = generations_path / staging_path.name[len(STAGING_PREFIX):]
+    os.replace(staging_path, generation_path)
+
+    # Flip the current generation
+    _replace_with_symlink(output_path / CURRENT_LINK, os.path.join(GENERATIONS_DIR, generation_path.name))
+
+    for name in names:
+        link_path = output_path / name
+        if link_path.is_symlink():
+            continue
+
+        # Folders from before generations are moved aside once
+        if link_path.exists():
+            legacy_path = generations_path / f"legacy-{generation_path.name}"
+            legacy_path.mkdir(exist_ok=True)
+            os.replace(link_path, legacy_path / name)
+
+        _replace_with_symlink(link_path, os.path.join(CURRENT_LINK, name))
+
+    # Remove the oldest generations, folders from before generations being older than any
+    generations = sorted(
+        (path for path in generations_path.iterdir() if not path.name.startswith('.') and path != generation_path),
+        key=lambda path: (not path.name.startswith('legacy-'), path.name),
+    )
+    for old_path in generations[:max(len(generations) - (keep - 1), 0)]:
+        logging.debug(f"Removing old generation {old_path}")
+        shutil.rmtree(old_path)
+
+    return generation_path
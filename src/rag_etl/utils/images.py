@@ -0,0 +1,30 @@
+import io
+import base64
+
+from PIL import Image
+
+
+def downscale_if_needed(img: Image.Image, max_w: int = 2048, max_h: int = 3072) -> Image.Image:
+    """Downscale only if image exceeds given bounds; preserve sharpness with LANCZOS."""
+
+    w, h = img.size
+    if w <= max_w and h <= max_h:
+        return img
+
+    scale = min(max_w / w, max_h / h)
+    new_size = (int(w * scale), int(h * scale))
+
+    return img.resize(new_size, Image.LANCZOS)
+
+
+def to_data_uri(img: Image.Image, format: str = "PNG") -> str:
+    """Encode a PIL Image as base64 data URI, in the given format (PNG or JPEG)."""
+
+    # JPEG has no alpha channel
+    if format == "JPEG" and img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+
+    buf = io.BytesIO()
+    img.save(buf, format=format)
+    b64 = base64.b64encode(buf.getvalue()).decode("utf-8")
+    return f"data:image/{format.lower()};base64,{b64}"
@@ -0,0 +1,217 @@
+import os
+import re
+import json
+import gzip
+
+from pathlib import Path
+from typing import Any, Callable, Iterator, List, Optional
+
+
+# Documents per shard
+SHARD_DOCUMENTS = 10000
+
+# Documents per gzip member of compressed shards. A single document is read by decompressing its member only
+BLOCK_DOCUMENTS = 64
+
+COMPRESSIONS = (None, 'gzip')
+
+
+def get_encoder(encoder: str = 'json') -> Callable[[Any], bytes]:
+    """
+    Function encoding an object as a single line of JSON bytes.
+
+    Args:
+        encoder: 'json' for the standard library, or 'orjson', considerably faster (requires orjson).
+    """
+
+    if encoder == 'json':
+        return lambda obj: json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+    if encoder == 'orjson':
+        import orjson
+        return orjson.dumps
+
+    raise ValueError(f"Unknown encoder '{encoder}'. Available: json, orjson")
+
+
+def index_path(path, name: str) -> Path:
+    """Path of the index file of the shards with the given name."""
+    return Path(path) / f"{name}.index.json"
+
+
+def shard_paths(path, name: str) -> List[Path]:
+    """Paths of the shards with the given name, of any write, whether listed in the index or not."""
+
+    # Shards are named <name>-<write>-<shard>, and <name>-<shard> before writes were numbered
+    pattern = re.compile(rf"{re.escape(name)}(-\d+)?-\d{{5}}\.jsonl(\.gz)?")
+    return [shard_path for shard_path in Path(path).glob(f"{name}-*.jsonl*") if pattern.fullmatch(shard_path.name)]
+
+
+def remove_shards(path, name: str) -> None:
+    """Remove the index and the shards with the given name, e.g. when the metadata is written in another format."""
+
+    index_path(path, name).unlink(missing_ok=True)
+    for shard_path in shard_paths(path, name):
+        shard_path.unlink()
+
+
+class ShardedJSONLWriter:
+    """
+    Writer of documents as JSON lines, split into shards of `shard_documents` documents, optionally gzip-compressed.
+
+    Documents are written as they come, so memory stays flat however many there are. Once closed, an index
+    file (see `index_path`) lists the shards and where each document starts, along with the fields of `header`:
+
+        {**header, "compression": ..., "shards": [...], "documents": [[shard, offset, skip], ...]}
+
+    A document starts at byte `offset` of its shard. Compressed shards are sequences of gzip members of up
+    to `block_documents` documents each, in which case `offset` is where the member starts and `skip` the
+    number of lines to skip after decompressing from there (see `ShardedJSONLReader`).
+
+    Each write numbers its shards after the `write` of the previous index, so that the shards it lists are
+    left untouched until the new index replaces it. They are only removed then.
+    """
+
+    def __init__(
+        self,
+        path,
+        name: str,
+        header: Optional[dict] = None,
+        shard_documents: int = SHARD_DOCUMENTS,
+        compression: Optional[str] = None,
+        encoder: str = 'json',
+        block_documents: int = BLOCK_DOCUMENTS,
+    ) -> None:
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression '{compression}'. Available: {COMPRESSIONS}")
+
+        self.path = Path(path)
+        self.name = name
+        self.header = header or {}
+        self.shard_documents = shard_documents
+        self.compression = compression
+        self.encode = get_encoder(encoder)
+        self.block_documents = block_documents
+
+        self.shards: List[str] = []
+        self.documents: List[List[int]] = []
+
+        # Number of this write, following the one of the current index
+        previous_index_path = index_path(self.path, self.name)
+        self.write_id = json.loads(previous_index_path.read_bytes()).get('write', -1) + 1 if previous_index_path.exists() else 0
+
+        self._file = None
+        self._shard_count = 0
+        self._block: List[bytes] = []
+
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def _shard_name(self, i: int) -> str:
+        suffix = '.jsonl.gz' if self.compression == 'gzip' else '.jsonl'
+        return f"{self.name}-{self.write_id}-{i:05d}{suffix}"
+
+    def _flush_block(self) -> None:
+        if self._block:
+            self._file.write(gzip.compress(b''.join(self._block), compresslevel=6))
+            self._block = []
+
+    def _close_shard(self) -> None:
+        if self._file is not None:
+            self._flush_block()
+            self._file.close()
+            self._file = None
+
+    def write(self, document: Any) -> None:
+        """Append a document, starting a new shard if the current one is full."""
+
+        # Start new shard if needed
+        if self._file is None or self._shard_count == self.shard_documents:
+            self._close_shard()
+            self.shards.append(self._shard_name(len(self.shards)))
+            self._file = open(self.path / self.shards[-1], 'wb')
+            self._shard_count = 0
+
+        line = self.encode(document) + b'\n'
+        shard = len(self.shards) - 1
+
+        if self.compression == 'gzip':
+            # Documents of the block all start at the member, and are told apart by their line
+            if len(self._block) == self.block_documents:
+                self._flush_block()
+            self.documents.append([shard, self._file.tell(), len(self._block)])
+            self._block.append(line)
+        else:
+            self.documents.append([shard, self._file.tell(), 0])
+            self._file.write(line)
+
+        self._shard_count += 1
+
+    def close(self) -> Path:
+        """Finish the last shard, write the index atomically, and only then remove the shards of previous writes."""
+
+        self._close_shard()
+
+        index = {**self.header, 'compression': self.compression, 'write': self.write_id, 'shards': self.shards, 'documents': self.documents}
+
+        path = index_path(self.path, self.name)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        tmp_path.write_bytes(self.encode(index))
+        os.replace(tmp_path, path)
+
+        # Shards of previous writes, including failed ones
+        written = set(self.shards)
+        for stale_path in shard_paths(self.path, self.name):
+            if stale_path.name not in written:
+                stale_path.unlink()
+
+        return path
+
+    def abort(self) -> None:
+        """Discard the shards written so far, leaving the current index and its shards in place."""
+
+        self._close_shard()
+        for shard in self.shards:
+            (self.path / shard).unlink(missing_ok=True)
+
+    def __enter__(self) -> 'ShardedJSONLWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class ShardedJSONLReader:
+    """
+    Reader of the documents written by `ShardedJSONLWriter`, from their index file. Documents can be
+    iterated over, shard by shard, or read individually by position, seeking straight to them.
+    """
+
+    def __init__(self, index_path) -> None:
+        self.index_path = Path(index_path)
+        self.index = json.loads(self.index_path.read_text(encoding='utf-8'))
+
+    def __len__(self) -> int:
+        return len(self.index['documents'])
+
+    def _open(self, shard: int):
+        return open(self.index_path.parent / self.index['shards'][shard], 'rb')
+
+    def __getitem__(self, i: int) -> Any:
+        shard, offset, skip = self.index['documents'][i]
+
+        with self._open(shard) as f:
+            f.seek(offset)
+            lines = gzip.GzipFile(fileobj=f) if self.index['compression'] == 'gzip' else f
+            for _ in range(skip):
+                lines.readline()
+            return json.loads(lines.readline())
+
+    def __iter__(self) -> Iterator[Any]:
+        for shard in range(len(self.index['shards'])):
+            with self._open(shard) as f:
+                lines = gzip.GzipFile(fileobj=f) if self.index['compression'] == 'gzip' else f
+                for line in lines:
+                    yield json.loads(line)
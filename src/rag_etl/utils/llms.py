@@ -1,10 +1,26 @@
+import io
+import os
 import base64
+import asyncio
+
+from typing import Dict, Sequence
+from pathlib import Path
 
 from openai import OpenAI
+from PIL import Image, UnidentifiedImageError
 
 import rag_etl.utils.mime_types as mt
 
 from rag_etl.config import CONFIG
+from rag_etl.utils.archives import open_binary
+from rag_etl.utils.images import downscale_if_needed, to_data_uri
+
+
+# Images are downscaled to fit these bounds before being sent for an ALT text
+ALT_TEXT_MAX_SIZE = (1024, 1024)
+
+# Maximum number of concurrent ALT text requests in `generate_alt_texts`
+ALT_TEXT_CONCURRENCY = 8
 
 
 def send_llm_request(model, messages, response_format=None):
@@ -18,6 +34,33 @@ def send_llm_request(model, messages, response_format=None):
         return response.choices[0].message.content.strip()
 
 
+def send_embedding_request(model, texts):
+    """Embeddings of the given texts, in the same order, as lists of floats."""
+
+    rcp_client = OpenAI(base_url=CONFIG['RCP_BASE_URL'], api_key=CONFIG['RCP_API_KEY'])
+
+    response = rcp_client.embeddings.create(model=model, input=list(texts))
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+def image_data_url(path: str, mime_type: str) -> str:
+    """Data URL of an image, downscaled to ALT_TEXT_MAX_SIZE if larger. Images PIL cannot read (e.g. SVG) are sent as is."""
+
+    with open_binary(path) as f:
+        data = f.read()
+
+    try:
+        img = Image.open(io.BytesIO(data))
+        downscaled_img = downscale_if_needed(img, *ALT_TEXT_MAX_SIZE)
+        if downscaled_img is not img:
+            return to_data_uri(downscaled_img, "JPEG" if mime_type == "image/jpeg" else "PNG")
+    except UnidentifiedImageError:
+        pass
+
+    b64 = base64.b64encode(data).decode("utf-8")
+    return f"data:{mime_type};base64,{b64}"
+
+
 def generate_alt_text(path: str) -> str:
     # Guess MIME type from extension
     mime_type = mt.guess_mime_type(path)
@@ -25,12 +68,8 @@ def generate_alt_text(path: str) -> str:
     if mime_type is None:
         raise ValueError(f"Could not determine MIME type for {path}")
 
-    # Encode file to base64
-    with open(path, "rb") as f:
-        b64 = base64.b64encode(f.read()).decode("utf-8")
-
     # Build data URL
-    data_url = f"data:{mime_type};base64,{b64}"
+    data_url = image_data_url(path, mime_type)
 
     messages = [{'role': 'user', 'content': [
         {"type": "text", "text": "Generate the ALT text for this image. If prominent text exists, include it briefly."},
@@ -42,3 +81,63 @@ def generate_alt_text(path: str) -> str:
     message = send_llm_request(rcp_model, messages)
 
     return message
+
+
+def alt_text_cache_path(image_hash: str) -> Path:
+    """Path of the cached ALT text of the image with the given content hash."""
+
+    # Imported here so that the cache folder is only required when actually used
+    from rag_etl.utils.cache import cache_path
+
+    return cache_path / 'alt_texts' / f"{image_hash}.txt"
+
+
+def generate_alt_texts(paths: Sequence[str], max_concurrency: int = ALT_TEXT_CONCURRENCY) -> Dict[str, str]:
+    """
+    Generate the ALT texts of several images, returning a dictionary from path to ALT text.
+
+    Images are identified by the hash of their content, so that identical images (e.g. a logo used
+    in every notebook) are only described once. ALT texts are kept in the cache across runs, and
+    the missing ones are requested concurrently, with at most `max_concurrency` requests at a time.
+    """
+
+    from rag_etl.utils.cache import hash_file
+
+    # Deduplicate images by content, and look them up in the cache
+    hashes = {path: hash_file(path) for path in dict.fromkeys(paths)}
+
+    alt_texts: Dict[str, str] = {}
+    missing: Dict[str, str] = {}
+    for path, image_hash in hashes.items():
+        if image_hash in alt_texts or image_hash in missing:
+            continue
+
+        cached_path = alt_text_cache_path(image_hash)
+        if cached_path.exists():
+            alt_texts[image_hash] = cached_path.read_text(encoding='utf-8')
+        else:
+            missing[image_hash] = path
+
+    # Generate the missing ones concurrently, caching each one as soon as it is available
+    async def run_all():
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def run(image_hash, path):
+            async with semaphore:
+                alt_text = await asyncio.to_thread(generate_alt_text, path)
+
+            # Written to a temporary file first, so that concurrent readers never see a partial ALT text
+            cached_path = alt_text_cache_path(image_hash)
+            tmp_path = cached_path.with_name(f".{cached_path.name}.{os.getpid()}.tmp")
+            tmp_path.write_text(alt_text, encoding='utf-8')
+            os.replace(tmp_path, cached_path)
+
+            alt_texts[image_hash] = alt_text
+
+        await asyncio.gather(*(run(image_hash, path) for image_hash, path in missing.items()))
+
+    if missing:
+        alt_text_cache_path('').parent.mkdir(parents=True, exist_ok=True)
+        asyncio.run(run_all())
+
+    return {path: alt_texts[image_hash] for path, image_hash in hashes.items()}
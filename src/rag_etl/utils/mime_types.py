@@ -1,6 +1,7 @@
 import mimetypes
 
 MARKDOWN = "text/markdown"
+TEXT = "text/plain"
 PDF = "application/pdf"
 ZIP = "application/zip"
 IPYNB = "application/x-ipynb+json"
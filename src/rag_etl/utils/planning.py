@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import json
+import math
+
+from dataclasses import dataclass, fields
+from typing import List, Optional, Sequence
+
+from rag_etl.utils.cache import cache_path
+
+
+# Rough number of characters per token for the text models we use
+CHARS_PER_TOKEN = 4
+
+# Qwen2.5-VL turns every 28x28 pixel patch into one input token
+IMAGE_PATCH_SIZE = 28
+
+# Average PNG size of a rendered text page, in bytes per pixel
+PNG_BYTES_PER_PIXEL = 0.35
+
+# Average number of Markdown tokens produced per converted PDF page
+MD_TOKENS_PER_PAGE = 600
+
+# Average number of tokens of the system and user prompts of a request
+PROMPT_TOKENS = 500
+
+# Fallback size for documents that do not exist yet at planning time
+DEFAULT_DOCUMENT_TOKENS = 8000
+
+throughput_path = cache_path / 'throughput.json'
+
+
+@dataclass
+class StageEstimate:
+    """Predicted cost of running a single pipeline stage, as returned by `BaseTransformer.plan`."""
+
+    stage: str
+    resources_in: int = 0
+    resources_out: int = 0
+
+    work_units: float = 0       # stage-specific unit of work (e.g. PDF pages, notebooks, tokens) not served from cache
+    cache_hits: int = 0
+
+    pdf_pages: int = 0
+    vlm_requests: int = 0
+    alt_text_images: int = 0
+    llm_requests: int = 0       # text-only requests, e.g. stitching pages or splitting exercises
+
+    input_tokens: int = 0
+    upload_bytes: int = 0
+
+    seconds: Optional[float] = None
+
+
+def estimate_text_tokens(text: str) -> int:
+    """Estimate the number of tokens of the given text."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def estimate_image_tokens(width: float, height: float) -> int:
+    """Estimate the number of input tokens of an image of the given size sent to a VLM."""
+    return math.ceil(width / IMAGE_PATCH_SIZE) * math.ceil(height / IMAGE_PATCH_SIZE)
+
+
+def estimate_png_bytes(width: float, height: float) -> int:
+    """Estimate the size of a rendered page once PNG- and base64-encoded."""
+    return math.ceil(width * height * PNG_BYTES_PER_PIXEL * 4 / 3)
+
+
+def _read_throughput() -> dict:
+    if not throughput_path.exists():
+        return {}
+
+    return json.loads(throughput_path.read_text())
+
+
+def record_throughput(scope: str, units: float, seconds: float) -> None:
+    """
+    Accumulates the time spent processing the given number of work units for the given `scope`,
+    so that future plans can estimate the running time of that scope.
+    """
+
+    if units <= 0:
+        return
+
+    throughput = _read_throughput()
+
+    scope_throughput = throughput.setdefault(scope, {'units': 0, 'seconds': 0})
+    scope_throughput['units'] += units
+    scope_throughput['seconds'] += seconds
+
+    throughput_path.write_text(json.dumps(throughput, indent=2))
+
+
+def get_seconds_per_unit(scope: str) -> Optional[float]:
+    """Returns the recorded average time per work unit for the given `scope`, or None if never recorded."""
+
+    scope_throughput = _read_throughput().get(scope)
+    if not scope_throughput or not scope_throughput['units']:
+        return None
+
+    return scope_throughput['seconds'] / scope_throughput['units']
+
+
+def format_plan(estimates: Sequence[StageEstimate]) -> str:
+    """Render a list of stage estimates, plus their totals, as a plain-text table."""
+
+    columns = [f.name for f in fields(StageEstimate)]
+
+    # Build totals row. Resource counts are taken from the ends of the pipeline, and work units are not
+    # summed since they differ between stages. Time is only known if it is known for every stage doing actual work
+    total = StageEstimate(stage='TOTAL')
+    if estimates:
+        total.resources_in = estimates[0].resources_in
+        total.resources_out = estimates[-1].resources_out
+
+    for estimate in estimates:
+        for column in columns[4:-1]:
+            setattr(total, column, getattr(total, column) + getattr(estimate, column))
+
+    stage_seconds = [e.seconds for e in estimates if e.work_units]
+    if all(s is not None for s in stage_seconds):
+        total.seconds = sum(stage_seconds)
+
+    def fmt(value):
+        if value is None:
+            return '?'
+        if isinstance(value, float):
+            return f"{value:.1f}"
+        return str(value)
+
+    rows: List[List[str]] = [columns]
+    for estimate in [*estimates, total]:
+        rows.append([fmt(getattr(estimate, column)) for column in columns])
+
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+
+    return '\n'.join('  '.join(cell.ljust(width) for cell, width in zip(row, widths)) for row in rows)
@@ -0,0 +1,181 @@
+import os
+import errno
+import shutil
+import logging
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Collection, Iterable, Tuple
+
+from rag_etl.utils.archives import PathLike, copy_file, split_member_path, stat
+
+
+# How files are placed at their destination: copied, hard linked (sharing the same inode), or reflinked
+# (sharing the same blocks until either is modified, on copy-on-write filesystems like Btrfs or XFS)
+SYNC_MODES = ('copy', 'hardlink', 'reflink')
+
+# ioctl cloning a whole file on Linux, see ioctl_ficlone(2)
+FICLONE = 0x40049409
+
+
+def is_up_to_date(path: PathLike, destination: Path, checksum: bool = False) -> bool:
+    """
+    Whether `destination` already holds the file at `path`, i.e. it has the same size and modification time,
+    as left by `sync_file`. If `checksum`, the contents are compared by hash instead of the modification time.
+    """
+
+    try:
+        destination_stat = destination.stat()
+    except FileNotFoundError:
+        return False
+
+    source_stat = stat(path)
+    if destination_stat.st_size != source_stat.st_size:
+        return False
+
+    if checksum:
+        # Imported here so that the cache folder is only required when actually used
+        from rag_etl.utils.cache import hash_file
+
+        return hash_file(destination) == hash_file(path)
+
+    return destination_stat.st_mtime_ns == source_stat.st_mtime_ns
+
+
+def _reflink(path: Path, destination: Path) -> None:
+    import fcntl
+
+    with open(path, 'rb') as src, open(destination, 'wb') as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+
+def sync_file(path: PathLike, destination: Path, mode: str = 'copy', checksum: bool = False) -> bool:
+    """
+    Place the file at `path` at `destination`, unless it is already there (see `is_up_to_date`).
+
+    Regular files are copied, hard linked or reflinked according to `mode`, falling back to a copy if not
+    supported (e.g. across filesystems). Archive members are always streamed out of their archive.
+    The destination is replaced atomically and keeps the modification time of the source.
+
+    Returns:
+        bool: Whether the file was placed, False if it was up to date.
+    """
+
+    if is_up_to_date(path, destination, checksum):
+        return False
+
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = destination.with_name(f".{destination.name}.sync")
+
+    archive_path, member = split_member_path(path)
+    try:
+        if member is not None:
+            copy_file(path, tmp_path)
+            source_stat = stat(path)
+            os.utime(tmp_path, ns=(source_stat.st_mtime_ns, source_stat.st_mtime_ns))
+        elif mode == 'hardlink':
+            tmp_path.unlink(missing_ok=True)
+            os.link(archive_path, tmp_path)
+        elif mode == 'reflink':
+            _reflink(Path(archive_path), tmp_path)
+            shutil.copystat(archive_path, tmp_path)
+        else:
+            shutil.copy2(archive_path, tmp_path)
+    except OSError as e:
+        if member is not None or mode == 'copy' or e.errno not in (errno.EXDEV, errno.EPERM, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.EMLINK):
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+        logging.debug(f"Could not {mode} {path}, copying it instead: {e}")
+        tmp_path.unlink(missing_ok=True)
+        shutil.copy2(archive_path, tmp_path)
+
+    os.replace(tmp_path, destination)
+
+    return True
+
+
+def sync_files(pairs: Iterable[Tuple[PathLike, Path]], mode: str = 'copy', checksum: bool = False, max_workers: int = 8) -> Tuple[int, int]:
+    """
+    Sync files to their destinations (see `sync_file`), in a pool of `max_workers` threads.
+
+    Args:
+        pairs: Source path and destination of each file.
+
+    Returns:
+        Tuple[int, int]: Number of files placed, and number of files up to date.
+    """
+
+    if mode not in SYNC_MODES:
+        raise ValueError(f"Unknown sync mode {mode}, expected one of {SYNC_MODES}")
+
+    # Every destination is synced once
+    sources = {destination: path for path, destination in pairs}
+    total = len(sources)
+
+    # Comparing sizes and modification times is cheap, so only files to place (or to hash) go to the pool
+    if not checksum:
+        sources = {destination: path for destination, path in sources.items() if not is_up_to_date(path, destination)}
+
+    if max_workers > 1 and len(sources) > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            placed = sum(executor.map(lambda destination: sync_file(sources[destination], destination, mode, checksum), sources))
+    else:
+        placed = sum(sync_file(path, destination, mode, checksum) for destination, path in sources.items())
+
+    return placed, total - placed
+
+
+def reuse_unchanged(pairs: Iterable[Tuple[PathLike, Path]], root: Path, previous_root: Path, checksum: bool = False) -> int:
+    """
+    Hard link into `root` the files of `previous_root` (e.g. the previous generation of the output) still
+    up to date with their source (see `is_up_to_date`), so that `sync_files` skips them afterwards.
+
+    Args:
+        pairs: Source path and destination of each file, under `root`.
+
+    Returns:
+        int: Number of files reused.
+    """
+
+    reused = 0
+    for path, destination in pairs:
+        previous_path = previous_root / destination.relative_to(root)
+        if destination.exists() or not is_up_to_date(path, previous_path, checksum):
+            continue
+
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(previous_path, destination)
+        except OSError as e:
+            # Files are synced as usual if they cannot be linked, e.g. across filesystems
+            logging.debug(f"Could not reuse {previous_path}: {e}")
+            continue
+
+        reused += 1
+
+    return reused
+
+
+def delete_orphans(root: Path, keep: Collection[Path]) -> int:
+    """
+    Delete the files under `root` not in `keep`, and the folders left empty.
+
+    Returns:
+        int: Number of files deleted.
+    """
+
+    keep = {os.path.normpath(path) for path in keep}
+
+    deleted = 0
+    for folder, _, filenames in os.walk(root, topdown=False):
+        for filename in filenames:
+            path = os.path.join(folder, filename)
+            if os.path.normpath(path) not in keep:
+                os.remove(path)
+                deleted += 1
+
+        if folder != str(root) and not os.listdir(folder):
+            os.rmdir(folder)
+
+    return deleted